@@ -1,95 +1,28 @@
+import time
+
 import streamlit as st
-import sqlite3
 import folium
 from streamlit_folium import st_folium
-import requests
-import base64
-import os
 from streamlit_js_eval import streamlit_js_eval
-
-# OSRM API URL (No API Key Required)
-OSRM_URL = "http://router.project-osrm.org/route/v1/driving"
-
-# --- Database Connection ---
-conn = sqlite3.connect("accident_reporting.db", check_same_thread=False, timeout=5)
-c = conn.cursor()
-
-# Create a table for Ambulance Driver 
-c.execute('''
-    CREATE TABLE IF NOT EXISTS ambulance_drivers (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        phone TEXT UNIQUE,
-        name TEXT,
-        pin TEXT,
-        status TEXT,
-        latitude REAL,
-        longitude REAL
-    )
-''')
-
-# Create a table for Upload details of the victim after reached the spot
-c.execute('''
-    CREATE TABLE IF NOT EXISTS patient_medical_info (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        accident_id INTEGER,  -- Foreign key to link with accident report
-        driver_id INTEGER,   -- Foreign key to link with ambulance driver
-        pulse_rate INTEGER,
-        oxygen_saturation INTEGER,
-        bp TEXT,
-        fractures_detected TEXT,
-        blood_clotting_rate INTEGER,
-        head_injury INTEGER,
-        burns_external_wounds TEXT,
-        remarks TEXT,
-        photos BLOB,  -- Store photos as binary data
-        videos BLOB,  -- Store videos as binary data
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (accident_id) REFERENCES reports (id),
-        FOREIGN KEY (driver_id) REFERENCES ambulance_drivers (id)
-    )
-''')
-
-# Create a table for link ambulance and hospital
-c.execute('''
-    CREATE TABLE IF NOT EXISTS ambulance_hospital_links (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        ambulance_id INTEGER,
-        hospital_id INTEGER,
-        FOREIGN KEY (ambulance_id) REFERENCES ambulance_drivers (id),
-        FOREIGN KEY (hospital_id) REFERENCES hospitals (id)
-    )
-''')
-
-conn.commit()
+from geocoding import get_place_name, get_place_names
+from faces import store_victim_encoding
+import events
+from routing import get_route
+from map_render import Marker, show_route_map  # Read-only route maps, rendered once
+import db  # Shared database access (pooled connections, schema migrations)
+import media_pipeline  # Renditions (and the face-detection copy) are made in the background
+import media_store  # Photos and videos live on disk, rows only hold references
+import lifecycle
+import tracking  # Live GPS pings, written in batches
+import triage
+import profiling  # Per-rerun timing, enabled with PROFILING=1
+import auth  # Per-role login state (this page is the "driver" role)
+from sound import play_sound
 
 # --- Initialize Session State ---
 if "logged_in_driver" not in st.session_state:
     st.session_state.logged_in_driver = None
 
-# --- Function to Play Sound ---
-def play_sound():
-    # HTML audio element to play a sound
-    audio_path = "notification/notification.mp3"  # Replace with the path to your sound file
-    if os.path.exists(audio_path):
-        audio_bytes = open(audio_path, "rb").read()
-        audio_base64 = base64.b64encode(audio_bytes).decode("utf-8")
-        audio_html = f"""
-            <audio autoplay="true">
-                <source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3">
-            </audio>
-        """
-        st.components.v1.html(audio_html, height=0)
-    else:
-        st.warning("Notification sound file not found!")
-
-# --- Funtion to Convert latitude and longitude into place name            
-def get_place_name(lat, lon): 
-    """Convert latitude and longitude to a human-readable place name.""" 
-    url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json" 
-    headers = {"User-Agent": "AccidentReportApp/1.0"} 
-    response = requests.get(url, headers=headers).json() 
-    return response.get("display_name", "Location not found") 
-
 # --- Driver Authentication ---
 if st.session_state.logged_in_driver is None:
     st.title("🚑 Ambulance Driver System")
@@ -116,45 +49,23 @@ if st.session_state.logged_in_driver is None:
                     st.error("PIN must be exactly 4 digits.")
                 else:
                     # Check if the phone number already exists
-                    c.execute("SELECT * FROM ambulance_drivers WHERE phone = ?", (phone,))
-                    existing_user = c.fetchone()
+                    existing_user = db.get_driver_by_phone(phone)
 
                     if existing_user:
                         st.error("User already exists! Try logging in.")
                     else:
                         # Insert new user into the database
-                        c.execute(
-                            "INSERT INTO ambulance_drivers (phone, name, pin, status) VALUES (?, ?, ?, ?)",
-                            (phone, name, pin, "Not Ready"),
-                        )
-                        conn.commit()
+                        db.insert_driver(phone, name, pin)
                         st.success("Registration successful! Please log in.")
     
     # Based on the login the driver
     elif choice == "Login":
-        with st.form("login_form"):
-            phone = st.text_input("Phone Number")
-            pin = st.text_input("4-digit PIN", type="password")
-            submitted = st.form_submit_button("Login")
-
-            if submitted:
-                # Input validations
-                if not phone.isdigit() or len(phone) != 10:
-                    st.error("Phone number must be exactly 10 digits.")
-                elif not pin.isdigit() or len(pin) != 4:
-                    st.error("PIN must be exactly 4 digits.")
-                else:
-                    # Fetch the driver with the given phone number and PIN
-                    c.execute("SELECT * FROM ambulance_drivers WHERE phone = ? AND pin = ?", (phone, pin))
-                    driver = c.fetchone()
-
-                    if driver:
-                        st.session_state.logged_in_driver = driver[0]  # Store driver ID in session state
-                        st.toast(f"Welcome back, {driver[2]}!", icon="🚑")
-                        play_sound()  # Play sound on login
-                        st.rerun()  # Refresh the page to show the dashboard
-                    else:
-                        st.error("Invalid credentials! Try again.")
+        driver = auth.login_form(db.authenticate_driver)
+        if driver:
+            auth.login("driver", driver[0])  # Store driver ID in session state
+            st.toast(f"Welcome back, {driver[2]}!", icon="🚑")
+            play_sound()  # Play sound on login
+            st.rerun()  # Refresh the page to show the dashboard
 
 # --- Driver Dashboard ---
 if st.session_state.logged_in_driver:
@@ -163,22 +74,20 @@ if st.session_state.logged_in_driver:
 
     # Sidebar
     if st.sidebar.button("Logout", key="logout_button"):
-        st.session_state.update({"logged_in_driver": None})
+        auth.logout("driver")
         st.rerun()
 
     st.title("🚑 Ambulance Dashboard")
 
     # Fetch details from the Database of the current ambulance details
-    c.execute("SELECT * FROM ambulance_drivers WHERE id = ?", (driver_id,))
-    driver = c.fetchone()
+    driver = db.get_driver(driver_id)
 
     # Update the status of the ambulance 
     st.write(f"**Status:** {driver[4]}")
     status = st.radio("Update Status", ["Ready", "Not Ready"], index=0 if driver[4] == "Ready" else 1)
 
     if st.button("Update Status", key="update_status_button"):
-        c.execute("UPDATE ambulance_drivers SET status = ? WHERE id = ?", (status, driver_id))
-        conn.commit()
+        db.set_driver_status(driver_id, status)
 
         st.success("Status updated successfully!")
         st.rerun()
@@ -219,7 +128,8 @@ if st.session_state.logged_in_driver:
     m.add_child(marker)
 
     # Display the map
-    map_data = st_folium(m, height=400, width=700)
+    with profiling.span("folium.render"):
+        map_data = st_folium(m, height=400, width=700)
 
     # Extract the latest selected coordinates
     if map_data and map_data.get("last_clicked"):
@@ -231,51 +141,77 @@ if st.session_state.logged_in_driver:
 
     # Save updated location to database when the button is clicked
     if st.button("Update Location", key="update_location_button"):
-        c.execute("UPDATE ambulance_drivers SET latitude = ?, longitude = ? WHERE id = ?", (lat, lon, driver_id))
-        conn.commit()
+        tracking.ping(driver_id, lat, lon)
+        db.set_driver_location(driver_id, lat, lon)  # written now, and wakes the dispatcher
         st.success("Location updated successfully!")
 
-    # --- Assign Nearest Accident ---
+    # --- Live GPS tracking: the browser's position is sent every PING_SECONDS while the page is open ---
+    PING_SECONDS = 5
+
+    @st.fragment(run_every=PING_SECONDS)
+    def track_location(driver_id):
+        # A new key per interval makes the component ask the browser again
+        fix = streamlit_js_eval(
+            js_expressions="""
+            new Promise((resolve, reject) =>
+                navigator.geolocation.getCurrentPosition(
+                    (pos) => resolve({latitude: pos.coords.latitude, longitude: pos.coords.longitude, accuracy: pos.coords.accuracy}),
+                    (err) => reject(err),
+                    { enableHighAccuracy: true, timeout: 4000, maximumAge: 2000 }
+                )
+            )
+            """,
+            key=f"driver_ping_{int(time.time() // PING_SECONDS)}",
+        )
+        if fix:
+            tracking.ping(driver_id, fix["latitude"], fix["longitude"], fix.get("accuracy"))
+        latest = tracking.get_tracker().latest(driver_id)
+        if latest:
+            st.caption(f"📡 Live tracking: last fix {time.time() - latest.recorded_at:.0f} s ago")
+
+    track_location(driver_id)
+
+    # --- Assigned Accident (matched by the dispatch engine) ---
     st.subheader("Assigned Accident Location")
-    c.execute("""SELECT id, location FROM reports WHERE (ambulance_status = ? 
-              AND assigned_to IS NULL) OR (ambulance_status = ? AND assigned_to = ?) 
-              ORDER BY timestamp DESC LIMIT 1 """, ("Waiting", "Waiting", driver_id))
-    accident = c.fetchone()
-    
+    # Matching is left to the dispatch loop (dispatch.py); the page only reads its own
+    # assignment and reruns when the change feed reports one (see below)
+    accident = db.get_active_assignment(driver_id)
 
-    if accident and driver[4] == "Ready":
-        acc_lat, acc_lon = map(float, accident[1].split(", "))
+    if accident is None and driver[4] == "Ready":
+        if (driver[5] is None or driver[6] is None) and tracking.get_tracker().latest(driver_id) is None:
+            st.warning("Update your location so the dispatcher can assign you the nearest accident.")
 
-        # Assign the accident to this driver
-        c.execute("UPDATE reports SET assigned_to = ? WHERE id = ?", (driver_id, accident[0]))
-        conn.commit()
+    if accident and accident[3] != lifecycle.TRANSPORTING and driver[4] == "Ready":
+        acc_lat, acc_lon = accident[1], accident[2]
 
-        # Fetch route from OSRM (OpenStreetMap)
-        response = requests.get(f"{OSRM_URL}/{lon},{lat};{acc_lon},{acc_lat}?overview=full&geometries=geojson")
-        route_data = response.json()
-        route_coords = [(point[1], point[0]) for point in route_data["routes"][0]["geometry"]["coordinates"]]
-        eta = route_data["routes"][0]["duration"] / 60  # Convert seconds to minutes
+        # Fetch route (cached per snapped origin/destination)
+        route = get_route((lat, lon), (acc_lat, acc_lon))
+        eta = route.duration_s / 60  # Convert seconds to minutes
         eta_with_delay = eta * 1.2  # Adding a 20% delay factor
 
         st.write(f"**Accident Location:** {get_place_name(acc_lat, acc_lon)}")
+        if route.source == "estimate":
+            st.warning("Road routing is unavailable, showing a straight-line estimate.")
         st.write(f"**Estimated Time of Arrival (ETA):** {eta_with_delay:.2f} minutes (including possible delays)")
 
         # Notification for accident assignment
         st.toast(f"🚨 Accident assigned! ETA: {eta_with_delay:.2f} minutes.", icon="🚨")
         play_sound()  # Play sound on accident assignment
 
-        accident_map = folium.Map(location=[acc_lat, acc_lon], zoom_start=14)
-        folium.Marker([acc_lat, acc_lon], tooltip="Accident", icon=folium.Icon(icon="exclamation-triangle", prefix="fa", color="orange")).add_to(accident_map)
-        folium.Marker([lat, lon], tooltip="Ambulance", icon=folium.Icon(icon="ambulance", prefix="fa", color="red")).add_to(accident_map)
-
         # Draw actual road path
-        folium.PolyLine(route_coords, color="blue", weight=5, opacity=0.8).add_to(accident_map)
-
-        st_folium(accident_map, height=400, width=700)
+        show_route_map((acc_lat, acc_lon),
+                       [Marker(acc_lat, acc_lon, "Accident", "exclamation-triangle", "orange"),
+                        Marker(lat, lon, "Ambulance", "ambulance", "red")],
+                       route.polyline, color="blue")
 
-        current_ambulance_status = st.radio("Accident location: ", ["Reached", "Not Reached"], index=1)
+        reached_scene = accident[3] != lifecycle.ASSIGNED
+        current_ambulance_status = st.radio("Accident location: ", ["Reached", "Not Reached"],
+                                            index=0 if reached_scene else 1)
 
         if current_ambulance_status == "Reached":
+            if not reached_scene:
+                db.advance_report(accident[0], lifecycle.ON_SCENE, current=accident[3])
+
             # --- Add Medical Information Form (Only after accident is assigned) ---
             st.subheader("Patient Medical Information")
 
@@ -296,110 +232,101 @@ if st.session_state.logged_in_driver:
                 submitted = st.form_submit_button("Submit Medical Information")
 
                 
-                # Identify the nearest hospital
-                c.execute("""SELECT h.id, h.latitude, h.longitude
-                        FROM hospitals h JOIN reports r ON 1=1
-                        WHERE h.status = 'Ready' ORDER BY 
-                        ((h.latitude - CAST(SUBSTR(r.location, 1, INSTR(r.location, ',') - 1) AS REAL)) * 
-                        (h.latitude - CAST(SUBSTR(r.location, 1, INSTR(r.location, ',') - 1) AS REAL)) +
-                        (h.longitude - CAST(SUBSTR(r.location, INSTR(r.location, ',') + 1, LENGTH(r.location)) AS REAL)) * 
-                        (h.longitude - CAST(SUBSTR(r.location, INSTR(r.location, ',') + 1, LENGTH(r.location)) AS REAL))) ASC
-                        LIMIT 1""")
-                
-                hospital = c.fetchone()
+                # Identify the nearest ready hospital to this accident (spatial index, haversine distance)
+                nearest = db.nearest_ready_hospitals(acc_lat, acc_lon, k=1)
+                hospital = nearest[0] if nearest else None
                 if hospital is None:
-                    print("Sorry Can't find hospital")
+                    st.error("No ready hospital found near the accident. Please contact the control room.")
                 else:
                     hospital_id = hospital[0]
 
-                #print("Hospital ID:", hospital_id)
-                
 
-            if hospital:
-                c.execute("UPDATE reports SET hospital_assigned_to = ? WHERE id = ?", (hospital[0], accident[0]))
-                c.execute("INSERT INTO ambulance_hospital_links (ambulance_id, hospital_id) VALUES (?, ?)", (driver_id, hospital_id))
-                conn.commit()
+            # Written once; later reruns find the same hospital already assigned
+            if hospital and hospital_id != accident[4]:
+                db.assign_hospital(accident[0], hospital_id, driver_id)
 
 
-            if submitted:
-                    
-                c.execute("UPDATE reports SET ambulance_status = ? WHERE id = ?", ("Done", accident[0]))
-                conn.commit()
-
-                # Convert uploaded files to binary data
-                photos_data = [photo.read() for photo in uploaded_photos] if uploaded_photos else None
-                videos_data = uploaded_videos.read() if uploaded_videos else None
+            if submitted and hospital is None:
+                st.error("The medical information can only be submitted once a hospital is assigned. "
+                         "Please submit again when one is ready.")
+            elif submitted:
+                # Stream uploads into the media store; the database only keeps references
+                stored_media = [media_store.put_upload(photo) for photo in uploaded_photos or []]
+                if uploaded_videos:
+                    stored_media.append(media_store.put_upload(uploaded_videos))
 
                 # Insert medical information
-                c.execute(
-                    '''
-                    INSERT INTO patient_medical_info (
-                        accident_id, driver_id, pulse_rate, oxygen_saturation, bp, fractures_detected,
-                        blood_clotting_rate, head_injury, burns_external_wounds, remarks,
-                        photos, videos
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''',
-                    (
-                        accident[0],
-                        driver_id,
-                        pulse_rate,
-                        oxygen_saturation,
-                        bp,
-                        fractures_detected,
-                        blood_clotting_rate,
-                        head_injury,
-                        burns_external_wounds,
-                        remarks,
-                        sqlite3.Binary(b"".join(photos_data)) if photos_data else None,
-                        sqlite3.Binary(videos_data) if videos_data else None,
-                    ),
+                medical_info_id = db.insert_medical_info(
+                    accident[0],
+                    driver_id,
+                    pulse_rate,
+                    oxygen_saturation,
+                    bp,
+                    fractures_detected,
+                    blood_clotting_rate,
+                    head_injury,
+                    burns_external_wounds,
+                    remarks,
+                    stored_media,
+                )
+
+                # Render the uploads, then encode the victim's face from the detection-size copies,
+                # all in the background so the hospital never has to
+                photo_hashes = [item.sha256 for item in stored_media if item.kind == "photo"]
+                media_pipeline.process_async(
+                    stored_media,
+                    then=(lambda: store_victim_encoding(medical_info_id, media_pipeline.detection_images(photo_hashes)))
+                    if photo_hashes else None,
                 )
-                conn.commit()
-                st.success("✅ Medical information submitted successfully!")
-                play_sound()
 
-                with st.form("data"):
+                # Start the hospital's AI triage report now (keyed on the stored vitals, as the hospital reads them)
+                triage.prefetch(triage.vitals_from_row(db.get_medical_info(accident[0])))
 
-                    # Fetch route from OSRM (OpenStreetMap)
-                    response = requests.get(f"{OSRM_URL}/{acc_lon},{acc_lat};{hospital[2]},{hospital[1]}?overview=full&geometries=geojson")
-                    route_data = response.json()
-                    route_coords = [(point[1], point[0]) for point in route_data["routes"][0]["geometry"]["coordinates"]]
-                    eta = route_data["routes"][0]["duration"] / 60  # Convert seconds to minutes
-                    eta_with_delay = eta * 1.2  # Adding a 20% delay factor
+                # Patient on board: the hospital was assigned above, so the report moves to Transporting
+                db.start_transport(accident[0])
+                st.success("✅ Medical information submitted successfully!")
+                play_sound()
+                accident = db.get_active_assignment(driver_id)
 
-                    st.write(f"**Estimated Time of Reach Hospital (ETA):** {eta_with_delay:.2f} minutes (including possible delays)")
-                    accident_map = folium.Map(location=[acc_lat, acc_lon], zoom_start=14)
-                    folium.Marker([acc_lat, acc_lon], tooltip="Ambulance", icon=folium.Icon(icon="ambulance", prefix="fa", color="red")).add_to(accident_map)
-                    folium.Marker([hospital[1], hospital[2]], tooltip="Hospital", icon=folium.Icon(icon="hospital", prefix="fa", color="blue")).add_to(accident_map)
+    # --- Transport to Hospital (read from the report, so it survives reloads and new logins) ---
+    if accident and accident[3] == lifecycle.TRANSPORTING:
+        report_id, scene_lat, scene_lon = accident[0], accident[1], accident[2]
+        hospital = (accident[4], accident[5], accident[6])
+        st.subheader("Transport to Hospital")
 
-                    # Draw actual road path
-                    folium.PolyLine(route_coords, color="green", weight=5, opacity=0.8).add_to(accident_map)
+        # Fetch route (cached per snapped origin/destination)
+        route = get_route((scene_lat, scene_lon), (hospital[1], hospital[2]))
+        eta = route.duration_s / 60  # Convert seconds to minutes
+        eta_with_delay = eta * 1.2  # Adding a 20% delay factor
 
-                    st_folium(accident_map, height=400, width=700)
+        st.write(f"**Estimated Time of Reach Hospital (ETA):** {eta_with_delay:.2f} minutes (including possible delays)")
+        # Draw actual road path
+        show_route_map((scene_lat, scene_lon),
+                       [Marker(scene_lat, scene_lon, "Ambulance", "ambulance", "red"),
+                        Marker(hospital[1], hospital[2], "Hospital", "hospital", "blue")],
+                       route.polyline, color="green")
 
-                    hospital_status = st.form_submit_button("Reached Hospital")
-                
+        if st.button("Reached Hospital", key="reached_hospital_button"):
+            db.advance_report(report_id, lifecycle.AT_HOSPITAL, current=lifecycle.TRANSPORTING)
+            st.success("Arrival at the hospital recorded.")
 
-    else:
+    elif not (accident and driver[4] == "Ready"):
         st.info("No accident assigned or you're not ready.")
+        if driver[4] == "Ready":
+            # Rerun as soon as the dispatcher assigns this driver (change feed, no DB polling)
+            events.watch("ambulance", lambda after_id: db.list_events_since(
+                after_id, [events.REPORT_ASSIGNED], driver_id=driver_id))
 
     # --- Show Previously Assigned Accidents ---
     if st.button("Show Previously Assigned Accidents", key="show_previous_accidents"):
-        c.execute(
-            '''
-            SELECT r.id, SUBSTR(r.location, 1, INSTR(r.location, ',') - 1) AS latitude,  
-            SUBSTR(r.location, INSTR(r.location, ',') + 1) AS longitude, r.timestamp, 
-            p.pulse_rate, p.oxygen_saturation, p.bp FROM reports r
-            LEFT JOIN patient_medical_info p ON r.id = p.accident_id
-            WHERE r.assigned_to = ? ''',(driver_id,),
-        )
-        previous_accidents = c.fetchall()
+        previous_accidents = db.list_previous_accidents(driver_id)
 
         if previous_accidents:
             st.subheader("Previously Assigned Accidents")
-            for accident in previous_accidents:
+            places = get_place_names([(accident[1], accident[2]) for accident in previous_accidents])
+            for accident, place in zip(previous_accidents, places):
                 st.write(f"**Accident ID:** {accident[0]}")
-                st.write(f"**Location:** {get_place_name(accident[1], accident[2])}")
+                st.write(f"**Location:** {place}")
                 st.write(f"**Timestamp:** {accident[3]}")
                 st.write(f"**Pulse Rate:** {accident[4]}")
                 st.write(f"**Oxygen Saturation:** {accident[5]}")
@@ -408,5 +335,3 @@ if st.session_state.logged_in_driver:
         else:
             st.info("No previously assigned accidents found.")
 
-# --- Close Database Connection ---
-conn.close()
\ No newline at end of file
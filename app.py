@@ -1,54 +1,27 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import sqlite3
-import os
 from streamlit_js_eval import streamlit_js_eval
 from streamlit_folium import folium_static, st_folium
 import folium
 from geopy.distance import geodesic  # To calculate distance
-import requests
 import re
-
-# --- Initialize SQLite Database ---
-conn = sqlite3.connect('accident_reporting.db', check_same_thread=False)
-c = conn.cursor()
-
-# Create tables if they don't exist
-c.execute('''CREATE TABLE IF NOT EXISTS users (
-                phone TEXT PRIMARY KEY,
-                name TEXT,
-                email TEXT,
-                pin TEXT
-            )''')
-
-c.execute('''CREATE TABLE IF NOT EXISTS reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_phone TEXT,
-                name TEXT,
-                location TEXT,
-                media TEXT,
-                place TEXT,
-                description TEXT,
-                timestamp TEXT,
-                ambulance_status TEXT,
-                assigned_to INTEGER DEFAULT NULL,
-                hospital_assigned_to INTEGER DEFAULT NULL,
-                hospital_status TEXT,
-                FOREIGN KEY (assigned_to) REFERENCES ambulance_drivers (id)
-                FOREIGN KEY(user_phone) REFERENCES users(phone)
-            )''')
-conn.commit()
+from geocoding import get_place_name
+import auth  # Per-role login state (this page is the "user" role)
+import db  # Shared database access (pooled connections, schema migrations)
+import media_pipeline  # Thumbnails and display copies are rendered in the background
+import media_store  # Uploads are stored on disk under their content hash
+import media_view
+import profiling  # Per-rerun timing, enabled with PROFILING=1
 
 # --- Initialize Session State ---
 if "logged_in_user" not in st.session_state:
     st.session_state.logged_in_user = None
 
 # Initialize session state for lat and lon
-if "lat" not in st.session_state:
-    st.session_state.lat = 8.5241  # Default latitude for Thiruvananthapuram
-if "lon" not in st.session_state:
-    st.session_state.lon = 76.9366  # Default longitude for Thiruvananthapuram
+if "user_lat" not in st.session_state:
+    st.session_state.user_lat = 8.5241  # Default latitude for Thiruvananthapuram
+if "user_lon" not in st.session_state:
+    st.session_state.user_lon = 76.9366  # Default longitude for Thiruvananthapuram
 
 # --- Function to Display Chat Messages ---
 def display_chat(messages):
@@ -56,14 +29,6 @@ def display_chat(messages):
         with st.chat_message("assistant" if msg["sender"] == "bot" else "user"):
             st.markdown(msg["text"])
 
-# --- Function to Convert latitude and longitude into place name            
-def get_place_name(lat, lon): 
-    """Convert latitude and longitude to a human-readable place name.""" 
-    url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json" 
-    headers = {"User-Agent": "AccidentReportApp/1.0"} 
-    response = requests.get(url, headers=headers).json() 
-    return response.get("display_name", "Location not found") 
-
 # --- User Authentication (Login / Register) ---
 if st.session_state.logged_in_user is None:
     st.title("🚨 Accident Reporting Chatbot")
@@ -91,50 +56,26 @@ if st.session_state.logged_in_user is None:
                     st.error("PIN must be exactly 4 digits.")
                 else:
                     # Check if user already exists
-                    c.execute("SELECT * FROM users WHERE phone = ?", (phone,))
-                    if c.fetchone():
+                    if db.get_user(phone):
                         st.error("User already exists! Try logging in.")
                     else:
-                        c.execute(
-                            "INSERT INTO users (phone, name, email, pin) VALUES (?, ?, ?, ?)", 
-                            (phone, name, email, pin)
-                        )
-                        conn.commit()
+                        db.insert_user(phone, name, email, pin)
                         st.success("Registration successful! Please log in.")
 
     elif choice == "Login":
-        with st.form("login_form"):
-            phone = st.text_input("Phone Number")
-            pin = st.text_input("4-digit PIN", type="password")
-            submitted = st.form_submit_button("Login")
-
-            if submitted:
-                # Input validations
-                if not (phone.isdigit() and len(phone) == 10):
-                    st.error("Phone number must be 10 digits.")
-                elif not (pin.isdigit() and len(pin) == 4):
-                    st.error("PIN must be exactly 4 digits.")
-                else:
-                    c.execute("SELECT * FROM users WHERE phone = ? AND pin = ?", (phone, pin))
-                    user = c.fetchone()
-                    if user:
-                        st.session_state.logged_in_user = phone
-                        st.session_state.username = user[1]  # Store name in session
-                        st.success(f"Welcome back, {user[1]}!")
-                        st.session_state.page = "dashboard"
-                        st.rerun()
-                    else:
-                        st.error("Invalid credentials! Try again.")
+        user = auth.login_form(db.authenticate_user)
+        if user:
+            auth.login("user", user[0])  # users are keyed by phone
+            st.rerun()
 
 
 # --- Dashboard (After Login) ---
 if st.session_state.logged_in_user:
-    st.sidebar.button("Logout", on_click=lambda: st.session_state.update({"logged_in_user": None, "page": "login"}))
+    st.sidebar.button("Logout", on_click=auth.logout, args=("user",))
     st.title("🚨 Accident Reporting Chatbot")
 
     user_phone = st.session_state.logged_in_user
-    c.execute("SELECT * FROM users WHERE phone = ?", (user_phone,))
-    user = c.fetchone()
+    user = db.get_user(user_phone)
     
     messages = [{"sender": "bot", "text": f"Hi {user[1]}, what would you like to do?"}]
     display_chat(messages)
@@ -178,23 +119,24 @@ if st.session_state.logged_in_user:
             lat, lon = default_lat, default_lon
 
         # Update session state with detected or default location
-        st.session_state.lat = lat
-        st.session_state.lon = lon
+        st.session_state.user_lat = lat
+        st.session_state.user_lon = lon
 
         # Display map with marker
-        map_ = folium.Map(location=[st.session_state.lat, st.session_state.lon], zoom_start=15)
-        marker = folium.Marker([st.session_state.lat, st.session_state.lon], tooltip="Move me!", draggable=True, icon=folium.Icon(color="red", icon="map-marker", prefix="fa"))
+        map_ = folium.Map(location=[st.session_state.user_lat, st.session_state.user_lon], zoom_start=15)
+        marker = folium.Marker([st.session_state.user_lat, st.session_state.user_lon], tooltip="Move me!", draggable=True, icon=folium.Icon(color="red", icon="map-marker", prefix="fa"))
         map_.add_child(marker)
 
         # Use st_folium to render the map and get updated data
-        map_data = st_folium(map_, height=400, width=700)
+        with profiling.span("folium.render"):
+            map_data = st_folium(map_, height=400, width=700)
 
         # Update lat and lon if marker is moved or clicked
         if map_data and map_data.get("last_clicked"):
-            st.session_state.lat = map_data["last_clicked"]["lat"]
-            st.session_state.lon = map_data["last_clicked"]["lng"]
-            place = get_place_name(st.session_state.lat, st.session_state.lon)
-            st.success(f"Selected Location: {st.session_state.lat}, {st.session_state.lon} and Corresponding place is {place}")
+            st.session_state.user_lat = map_data["last_clicked"]["lat"]
+            st.session_state.user_lon = map_data["last_clicked"]["lng"]
+            place = get_place_name(st.session_state.user_lat, st.session_state.user_lon)
+            st.success(f"Selected Location: {st.session_state.user_lat}, {st.session_state.user_lon} and Corresponding place is {place}")
 
         # Report form
         with st.form("report_form"):
@@ -204,25 +146,19 @@ if st.session_state.logged_in_user:
             
             if submit:
                 # Debugging: Print the location before inserting into the database
-                #st.write(f"Debug: Location to be inserted into the database - Latitude: {st.session_state.lat}, Longitude: {st.session_state.lon}")
+                #st.write(f"Debug: Location to be inserted into the database - Latitude: {st.session_state.user_lat}, Longitude: {st.session_state.user_lon}")
 
-                media_filenames = []
-                if media:
-                    for file in media:
-                        file_path = os.path.join("uploads", file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(file.getbuffer())
-                        media_filenames.append(file.name)
+                # Stream uploads into the media store; the report only keeps references
+                stored_media = [media_store.put_upload(file) for file in media] if media else []
 
                 # Insert report into the database
-                c.execute("INSERT INTO reports (user_phone, name, location, media, place, description, timestamp, ambulance_status, hospital_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                          (user_phone, user[1], f"{st.session_state.lat}, {st.session_state.lon}", ",".join(media_filenames), place, description, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "Waiting", "Waiting"))
-                conn.commit()
+                db.insert_report(user_phone, user[1], st.session_state.user_lat, st.session_state.user_lon,
+                                 stored_media, place, description)
+                media_pipeline.process_async(stored_media)
                 st.success("Report submitted successfully!")
     
     elif choice == "View Previous Reports":
-        c.execute("SELECT * FROM reports WHERE user_phone = ?", (user_phone,))
-        user_reports = c.fetchall()
+        user_reports = db.list_reports_by_user(user_phone)
         
         if not user_reports:
             st.info("No previous reports found.")
@@ -230,15 +166,5 @@ if st.session_state.logged_in_user:
             for report in user_reports:
                 with st.expander(f"📍 {report[5]} ({report[7]})"):
                     st.write(f"**Description:** {report[6]}")
-                    if report[4]:
-                        media_files = report[4].split(',')
-                        for media in media_files:
-                            if media.lower().endswith(('png', 'jpg', 'jpeg')):
-                                st.image(os.path.join("uploads", media), caption=media)
-                            elif media.lower().endswith(('mp4', 'mov', 'avi')):
-                                st.video(os.path.join("uploads", media))
-                            else:
-                                st.write(f"File: {media}")
-
-# --- Close Database Connection ---
-conn.close()
\ No newline at end of file
+                    for sha256, kind, filename, _ in db.list_report_media(report[0]):
+                        media_view.show_media(sha256, kind, filename, key=f"user_media_{report[0]}_{sha256}")
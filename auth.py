@@ -0,0 +1,54 @@
+"""Login state and the phone/PIN login form shared by the role pages.
+
+All roles run in one server (main.py) and a browser session can visit every
+page, so each role keeps its state under its own session keys: the login in
+logged_in_<role> and everything else prefixed with "<role>_" (for example
+hospital_selected_accident). logout() clears exactly those keys.
+"""
+import streamlit as st
+
+ROLES = ("user", "driver", "hospital", "police")
+
+
+def current(role):
+    """The logged-in account of `role` in this session (phone or row id), or None."""
+    return st.session_state.get(f"logged_in_{role}")
+
+
+def login(role, account):
+    st.session_state[f"logged_in_{role}"] = account
+
+
+def logout(role):
+    """Log `role` out and drop its page state, leaving the other roles' sessions alone."""
+    st.session_state[f"logged_in_{role}"] = None
+    for key in [key for key in st.session_state if key.startswith(f"{role}_")]:
+        del st.session_state[key]
+
+
+def credential_error(phone, pin):
+    """Validation message for a phone number and PIN, or None when both are well-formed."""
+    if not (phone.isdigit() and len(phone) == 10):
+        return "Phone number must be 10 digits."
+    if not (pin.isdigit() and len(pin) == 4):
+        return "PIN must be exactly 4 digits."
+    return None
+
+
+def login_form(authenticate):
+    """Phone + PIN form; returns the account row once `authenticate(phone, pin)` accepts it."""
+    with st.form("login_form"):
+        phone = st.text_input("Phone Number")
+        pin = st.text_input("4-digit PIN", type="password")
+        submitted = st.form_submit_button("Login")
+
+        if submitted:
+            error = credential_error(phone, pin)
+            if error:
+                st.error(error)
+                return None
+            account = authenticate(phone, pin)
+            if account:
+                return account
+            st.error("Invalid credentials! Try again.")
+    return None
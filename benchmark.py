@@ -0,0 +1,399 @@
+"""Benchmarks of the hot paths against a synthetic database (see synthetic.py).
+
+Each benchmark calls the real code the pages and the dispatcher run, with
+random but seeded arguments, and reports latency percentiles. Results are
+written as JSON (with the git commit and the dataset size) so two runs can be
+compared; `compare` exits non-zero when a benchmark got slower than the
+threshold, which makes it usable as a CI gate.
+
+    python synthetic.py /tmp/bench.db
+    python benchmark.py run /tmp/bench.db [--iterations 200] [--output results.json]
+    python benchmark.py compare old.json new.json [--threshold 0.2]
+
+`startup` measures the Streamlit pages instead: each run is a fresh Python
+process that renders one page with streamlit's AppTest, so it includes every
+module import a server pays for on its first rerun (cold first paint), then
+reruns it (warm). It also lists which heavy libraries the page loaded. Point
+--root at a checkout of another commit to compare the two:
+
+    git worktree add /tmp/before <commit>
+    python benchmark.py startup --root /tmp/before --output before.json
+    python benchmark.py startup --output after.json
+    python benchmark.py compare before.json after.json
+
+`maps` compares a route map drawn with the full route geometry, as the pages
+used to, with map_render.py (simplified route, cached HTML): HTML bytes sent
+to the browser and render time.
+
+    python benchmark.py maps [--points 3000]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+import db
+import lifecycle
+from metrics import percentile
+
+RESULTS_DIR = "bench_results"
+WARMUP = 5
+
+
+def _dataset(conn):
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("reports", "users", "ambulance_drivers", "hospitals", "patient_medical_info",
+                            "old_patient_records")}
+    first, last = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM reports").fetchone()
+    return counts, first, last
+
+
+def _git_commit(root=None):
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=root or os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_ms": sum(samples) / len(samples),
+        "min_ms": samples[0],
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": samples[-1],
+    }
+
+
+def _time(func, args_list, warmup=WARMUP):
+    for args in args_list[:warmup]:
+        func(*args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return _stats(samples)
+
+
+def benchmarks(path, iterations, seed=1):
+    """[(name, function, [args per iteration])] over the database at `path`."""
+    import dispatch
+    import hotspots
+    from face_index import FaceIndex
+    from synthetic import another_photo
+
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    drivers = [row[0] for row in conn.execute("SELECT id FROM ambulance_drivers")]
+    busy_drivers = [row[0] for row in conn.execute(
+        f"SELECT assigned_to FROM reports WHERE state IN ({lifecycle.BUSY_STATES_SQL}) AND assigned_to IS NOT NULL")]
+    hospitals = [row[0] for row in conn.execute("SELECT id FROM hospitals")]
+    first, last = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM reports").fetchone()
+    first_day, last_day = date.fromisoformat(first[:10]), date.fromisoformat(last[:10])
+    patients = conn.execute("SELECT id, face_encodings FROM old_patient_records ORDER BY random() LIMIT ?",
+                            (iterations,)).fetchall()
+    points = conn.execute("SELECT lat, lon FROM reports ORDER BY random() LIMIT ?", (iterations,)).fetchall()
+    conn.close()
+
+    def day():
+        return first_day + timedelta(days=rng.randrange((last_day - first_day).days + 1))
+
+    def month_start():
+        return day().replace(day=1)
+
+    def dispatch_plan():
+        # One dispatcher round up to the claim (which would change the data)
+        with db.connection() as conn:
+            reports = dispatch.load_unassigned_reports(conn)
+            available = dispatch.load_available_drivers(conn)
+        if reports and available:
+            costs = dispatch.cost_matrix(reports, available)
+            if min(len(reports), len(available)) <= dispatch.OPTIMAL_MAX:
+                dispatch.match_optimal(costs)
+            else:
+                dispatch.match_greedy(costs)
+
+    def hotspots_year():
+        # As on the first dashboard render after a restart: month tiles from the database, not memory
+        hotspots._cache.clear()
+        hotspots.analyze(last_day - timedelta(days=364), last_day + timedelta(days=1))
+
+    index_dir = tempfile.mkdtemp(prefix="bench-face-index-")
+    start = time.perf_counter()
+    face_index = FaceIndex(index_dir=index_dir)
+    build_ms = (time.perf_counter() - start) * 1000
+    queries = [another_photo(np_rng, np.frombuffer(blob, dtype=np.float64)).tobytes() for _, blob in patients]
+
+    return build_ms, [
+        ("driver_pull", db.get_active_assignment, [(rng.choice(busy_drivers or drivers),) for _ in range(iterations)]),
+        ("nearest_hospital", db.nearest_ready_hospitals, [(lat, lon, 1) for lat, lon in points]),
+        ("police_date_listing", db.list_reports_on_date, [(day(),) for _ in range(iterations)]),
+        ("hospital_date_listing", db.list_hospital_reports_on_date,
+         [(rng.choice(hospitals), day()) for _ in range(iterations)]),
+        ("previous_accidents", db.list_previous_accidents, [(rng.choice(drivers),) for _ in range(iterations)]),
+        ("face_search", lambda encoding: face_index.search(encoding, k=1), [(query,) for query in queries]),
+        ("dispatch_plan", dispatch_plan, [() for _ in range(max(iterations // 10, 5))]),
+        ("police_hotspots_year", hotspots_year, [() for _ in range(max(iterations // 20, 5))]),
+        ("police_month_stats", db.report_counts,
+         [(start, (start + timedelta(days=32)).replace(day=1)) for start in (month_start() for _ in range(iterations))]),
+    ]
+
+
+def run(path, iterations=200, output=None, only=None):
+    if not os.path.exists(path):
+        raise SystemExit(f"{path} not found; create it with: python synthetic.py {path}")
+    db.DB_PATH = path   # before the pool is created
+    with db.connection() as conn:   # migrates an older synthetic file to the current schema
+        counts, first, last = _dataset(conn)
+    build_ms, cases = benchmarks(path, iterations)
+    results = {}
+    for name, func, args_list in cases:
+        if only and name not in only:
+            continue
+        results[name] = _time(func, args_list)
+        print(f"{name:<24} p50 {results[name]['p50_ms']:8.2f} ms   p95 {results[name]['p95_ms']:8.2f} ms   "
+              f"p99 {results[name]['p99_ms']:8.2f} ms")
+    print(f"{'face_index_build':<24} {build_ms:8.0f} ms")
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "dataset": {"path": os.path.abspath(path), "size_mb": round(os.path.getsize(path) / 1e6, 1),
+                    "rows": counts, "first_report": first, "last_report": last},
+        "setup": {"face_index_build_ms": build_ms},
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    return report
+
+
+# --- Page start-up ---
+HEAVY_MODULES = ("numpy", "face_recognition", "dlib", "cv2", "ollama", "httpx", "pydantic", "folium")
+
+# (name, script, session state set before the first run)
+STARTUP_CASES = (
+    ("hospital_login", "hospitalapp.py", {}),
+    ("hospital_dashboard", "hospitalapp.py", {"logged_in_hospital": 1}),
+)
+
+# Runs in a fresh interpreter inside the tree being measured; prints one JSON line
+_STARTUP_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+import db
+with db.connection() as conn:
+    if not conn.execute("SELECT 1 FROM hospitals WHERE id = 1").fetchone():
+        conn.execute("INSERT INTO hospitals (id, phone, name, pin, status, latitude, longitude) "
+                     "VALUES (1, '8000000000', 'Bench Hospital', '1234', 'Ready', 8.5241, 76.9366)")
+before = set(sys.modules)
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+for key, value in json.loads(sys.argv[2]).items():
+    app.session_state[key] = value
+start = time.perf_counter()
+app.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+app.run()
+warm = time.perf_counter() - start
+loaded = set(sys.modules) - before
+print(json.dumps({"first_paint_ms": first * 1000, "warm_rerun_ms": warm * 1000, "exceptions": len(app.exception),
+                  "heavy": sorted(m for m in json.loads(sys.argv[3]) if m in loaded)}))
+"""
+
+
+def startup(root=None, runs=10, output=None):
+    """Cold first paint and warm rerun of the STARTUP_CASES, each run in a new process."""
+    root = os.path.abspath(root or os.path.dirname(os.path.abspath(__file__)))
+    scratch = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ, ACCIDENT_DB_PATH=os.path.join(scratch, "startup.db"),
+               MEDIA_DIR=os.path.join(scratch, "media"), PYTHONPATH=root)
+    results = {}
+    for name, script, state in STARTUP_CASES:
+        first, warm, heavy = [], [], set()
+        for _ in range(runs):
+            completed = subprocess.run(
+                [sys.executable, "-c", _STARTUP_CHILD, script, json.dumps(state), json.dumps(HEAVY_MODULES)],
+                cwd=root, env=env, capture_output=True, text=True)
+            if completed.returncode:
+                raise SystemExit(f"{name} failed:\n{completed.stderr}")
+            sample = json.loads(completed.stdout.strip().splitlines()[-1])
+            if sample["exceptions"]:
+                print(f"Warning: {name} raised {sample['exceptions']} exception(s) while rendering")
+            first.append(sample["first_paint_ms"])
+            warm.append(sample["warm_rerun_ms"])
+            heavy.update(sample["heavy"])
+        results[f"{name}.first_paint"] = _stats(first)
+        results[f"{name}.warm_rerun"] = _stats(warm)
+        print(f"{name:<24} first paint p50 {results[f'{name}.first_paint']['p50_ms']:8.0f} ms   "
+              f"warm rerun p50 {results[f'{name}.warm_rerun']['p50_ms']:6.0f} ms   "
+              f"heavy: {', '.join(sorted(heavy)) or 'none'}")
+        results[f"{name}.first_paint"]["heavy_modules"] = sorted(heavy)
+    report = {
+        "commit": _git_commit(root),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "dataset": {"path": root, "rows": None},
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-startup-{report['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    return report
+
+
+# --- Route map payload ---
+def _synthetic_route(rng, points, start=(8.5241, 76.9366), step_m=8):
+    """A road-like random walk: OSRM's overview=full has a point every few metres."""
+    lat, lon = start
+    heading = rng.uniform(0, 360)
+    coords = []
+    for _ in range(points):
+        heading += rng.gauss(0, 4) + (rng.choice((-90, 90)) if rng.random() < 0.01 else 0)  # bends, junctions
+        lat += step_m * np.cos(np.radians(heading)) / 111320
+        lon += step_m * np.sin(np.radians(heading)) / (111320 * np.cos(np.radians(lat)))
+        coords.append((float(lat), float(lon)))
+    return coords
+
+
+def maps(points=3000, runs=20, output=None, seed=1):
+    """HTML payload and render time of a route map, full geometry vs map_render.py."""
+    try:
+        import folium
+    except ImportError:
+        raise SystemExit("folium is needed for the map benchmark")
+    import map_render
+    from routing import Route
+
+    rng = random.Random(seed)
+    coords = _synthetic_route(rng, points)
+    markers = (map_render.Marker(*coords[0], "Ambulance", "ambulance", "red"),
+               map_render.Marker(*coords[-1], "Accident", "exclamation-triangle", "orange"))
+    center = coords[0]
+
+    def before():
+        route_map = folium.Map(location=list(center), zoom_start=14)
+        folium.PolyLine(coords, color="blue", weight=5, opacity=0.8).add_to(route_map)
+        for marker in markers:
+            folium.Marker([marker.lat, marker.lon], tooltip=marker.tooltip,
+                          icon=folium.Icon(icon=marker.icon, prefix="fa", color=marker.color)).add_to(route_map)
+        return route_map.get_root().render()
+
+    def after_cold():
+        map_render._cache.clear()
+        return map_render.route_map_html(center, markers, Route.from_coords(coords, 0, 0, "bench").polyline)
+
+    def after_warm():
+        return map_render.route_map_html(center, markers, route.polyline)
+
+    route = Route.from_coords(coords, 0, 0, "bench")
+    results = {}
+    for name, func in (("map.full_geometry", before), ("map.render_cold", after_cold),
+                       ("map.render_cached", after_warm)):
+        results[name] = _time(func, [()] * runs, warmup=1)
+        results[name]["payload_bytes"] = len(func().encode())
+        print(f"{name:<20} p50 {results[name]['p50_ms']:8.2f} ms   {results[name]['payload_bytes'] / 1024:8.1f} KiB of HTML")
+    stored = len(map_render.route_coords(route.polyline, center[0], 14))
+    print(f"Route: {points} points from the router, {len(route.coords)} stored "
+          f"({len(route.polyline)} bytes encoded), {stored} drawn at zoom 14")
+    report = {
+        "commit": _git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "dataset": {"path": None, "rows": {"route_points": points}},
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-maps-{report['commit'] or 'nogit'}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    return report
+
+
+def compare(old_path, new_path, threshold=0.2, metric="p95_ms", min_delta_ms=0.1):
+    """Print the change per benchmark; returns the names that got slower by more than `threshold`.
+
+    Changes under `min_delta_ms` are ignored: sub-millisecond timings jitter by tens of percent.
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["dataset"].get("rows") != new["dataset"].get("rows"):
+        print("Warning: the two runs used different datasets.")
+    regressions = []
+    print(f"{'benchmark':<24}{old.get('commit') or 'old':>12}{new.get('commit') or 'new':>12}   change ({metric})")
+    for name in sorted(set(old["results"]) | set(new["results"])):
+        if name not in old["results"] or name not in new["results"]:
+            print(f"{name:<24}  only in {'new' if name in new['results'] else 'old'} run")
+            continue
+        before, after = old["results"][name][metric], new["results"][name][metric]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold and after - before > min_delta_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24}{before:10.2f}ms{after:10.2f}ms   {change:+7.1%}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hot-path benchmarks on synthetic data")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run")
+    run_parser.add_argument("path", help="database created by synthetic.py")
+    run_parser.add_argument("--iterations", type=int, default=200)
+    run_parser.add_argument("--output")
+    run_parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    startup_parser = sub.add_parser("startup")
+    startup_parser.add_argument("--root", help="tree to measure (default: this one)")
+    startup_parser.add_argument("--runs", type=int, default=10)
+    startup_parser.add_argument("--output")
+    maps_parser = sub.add_parser("maps")
+    maps_parser.add_argument("--points", type=int, default=3000, help="points in the router's route geometry")
+    maps_parser.add_argument("--runs", type=int, default=20)
+    maps_parser.add_argument("--output")
+    compare_parser = sub.add_parser("compare")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown (0.2 = 20%%)")
+    compare_parser.add_argument("--metric", default="p95_ms")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=0.1, help="ignore smaller absolute changes")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args.path, args.iterations, args.output, args.only)
+    elif args.command == "startup":
+        startup(args.root, args.runs, args.output)
+    elif args.command == "maps":
+        maps(args.points, args.runs, args.output)
+    elif compare(args.old, args.new, args.threshold, args.metric, args.min_delta_ms):
+        sys.exit(1)
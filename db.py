@@ -0,0 +1,1064 @@
+"""Shared data access for the reporting, ambulance, hospital and police apps.
+
+- One process-wide pool of SQLite connections, created on first use and kept
+  across Streamlit reruns (imported modules survive reruns).
+- Every connection runs in WAL mode with tuned pragmas, so readers never
+  block the writer.
+- Versioned migrations (tracked in PRAGMA user_version) run once per process
+  when the pool is created, instead of CREATE TABLE on every rerun; the data
+  backfills after them run until each has completed once.
+- Named query functions below are the only place SQL lives for the apps.
+
+Set ACCIDENT_DB_PATH to point the apps (and tools) at another database file.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import events
+import hospital_locator
+import lifecycle
+import media_store
+import metrics
+import profiling
+import stats
+from geo import geohash_encode, parse_location
+
+DB_PATH = os.environ.get("ACCIDENT_DB_PATH", "accident_reporting.db")
+POOL_SIZE = 8
+BACKFILL_BATCH_SIZE = 5000
+GEOHASH_PRECISION = 7
+MEDIA_BACKFILL_BATCH_SIZE = 20   # rows carry whole photos and videos
+LEGACY_UPLOADS_DIR = "uploads"
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # safe with WAL, avoids an fsync per commit
+    "PRAGMA busy_timeout=10000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",      # 16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",    # map up to 256 MB of the file
+)
+
+
+# --- Connection pool ---
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by every thread in the process.
+
+    A connection is only ever used by one thread at a time (between acquire and
+    release), which is what makes check_same_thread=False safe here.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self, timeout=30):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                conn = self._connect()
+                self._created += 1
+                return conn
+        return self._idle.get(timeout=timeout)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it (and migrating) on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ConnectionPool(DB_PATH)
+                conn = pool.acquire()
+                try:
+                    migrate(conn)
+                    backfill(conn)
+                finally:
+                    pool.release(conn)
+                _pool = pool
+    return _pool
+
+
+@contextmanager
+def connection():
+    """Borrow a pooled connection; commits on success and rolls back on error."""
+    # Timed as sqlite.<db function>, including any wait for a free connection
+    name = f"sqlite.{profiling.caller_name(_QUERY_HELPERS)}" if profiling.ENABLED else None
+    with profiling.span(name):
+        pool = get_pool()
+        conn = pool.acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            pool.release(conn)
+
+
+def _fetchone(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(sql, params=()):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _execute(sql, params=()):
+    """Run one write statement and return its cursor (for lastrowid / rowcount)."""
+    with connection() as conn:
+        return conn.execute(sql, params)
+
+
+_QUERY_HELPERS = ("_fetchone", "_fetchall", "_execute", "__enter__")
+
+
+# --- Migrations ---
+def _column_names(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _migration_1_base_schema(conn):
+    """Tables the four apps used to create on every rerun."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                    phone TEXT PRIMARY KEY,
+                    name TEXT,
+                    email TEXT,
+                    pin TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_phone TEXT,
+                    name TEXT,
+                    location TEXT,
+                    media TEXT,
+                    place TEXT,
+                    description TEXT,
+                    timestamp TEXT,
+                    ambulance_status TEXT,
+                    assigned_to INTEGER DEFAULT NULL,
+                    hospital_assigned_to INTEGER DEFAULT NULL,
+                    hospital_status TEXT,
+                    FOREIGN KEY (assigned_to) REFERENCES ambulance_drivers (id)
+                    FOREIGN KEY(user_phone) REFERENCES users(phone)
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS ambulance_drivers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone TEXT UNIQUE,
+                    name TEXT,
+                    pin TEXT,
+                    status TEXT,
+                    latitude REAL,
+                    longitude REAL
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS patient_medical_info (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    accident_id INTEGER,  -- Foreign key to link with accident report
+                    driver_id INTEGER,   -- Foreign key to link with ambulance driver
+                    pulse_rate INTEGER,
+                    oxygen_saturation INTEGER,
+                    bp TEXT,
+                    fractures_detected TEXT,
+                    blood_clotting_rate INTEGER,
+                    head_injury INTEGER,
+                    burns_external_wounds TEXT,
+                    remarks TEXT,
+                    photos BLOB,  -- Store photos as binary data
+                    videos BLOB,  -- Store videos as binary data
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    face_encodings BLOB,  -- Victim face encoding, computed once after submission
+                    FOREIGN KEY (accident_id) REFERENCES reports (id),
+                    FOREIGN KEY (driver_id) REFERENCES ambulance_drivers (id)
+                )''')
+    if "face_encodings" not in _column_names(conn, "patient_medical_info"):
+        conn.execute("ALTER TABLE patient_medical_info ADD COLUMN face_encodings BLOB")
+    conn.execute('''CREATE TABLE IF NOT EXISTS ambulance_hospital_links (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ambulance_id INTEGER,
+                    hospital_id INTEGER,
+                    FOREIGN KEY (ambulance_id) REFERENCES ambulance_drivers (id),
+                    FOREIGN KEY (hospital_id) REFERENCES hospitals (id)
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS hospitals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone TEXT UNIQUE,
+                    name TEXT,
+                    pin TEXT,
+                    status TEXT,
+                    latitude REAL,
+                    longitude REAL
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS old_patient_records (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    age INTEGER,
+                    gender TEXT,
+                    place TEXT,
+                    phone TEXT,
+                    emergency_phone TEXT,
+                    tele_id TEXT,
+                    medical_history TEXT,
+                    treatment TEXT,
+                    lab_reports TEXT,
+                    doctor_notes TEXT,
+                    medical_info TEXT,
+                    image BLOB,
+                    face_encodings BLOB NOT NULL,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )''')
+
+
+def _migration_2_hospital_rtree(conn):
+    hospital_locator.ensure_index(conn)
+
+
+def _migration_3_report_coordinates(conn):
+    """Numeric coordinates (and a geohash) next to the legacy 'lat, lon' text."""
+    columns = _column_names(conn, "reports")
+    for column, decl in (("lat", "REAL"), ("lon", "REAL"), ("geohash", "TEXT")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {decl}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_lat_lon ON reports (lat, lon)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_geohash ON reports (geohash)")
+
+
+def _migration_4_timestamp_indexes(conn):
+    """Canonical sortable timestamps and the indexes behind the dashboard queries."""
+    # 'YYYY-MM-DD HH:MM:SS' compares correctly as text, so date filters can be
+    # plain range predicates; rewrite anything stored in another ISO variant
+    for table in ("reports", "patient_medical_info"):
+        conn.execute(f"""UPDATE {table} SET timestamp = strftime('%Y-%m-%d %H:%M:%S', timestamp)
+                         WHERE typeof(timestamp) = 'text'
+                         AND strftime('%Y-%m-%d %H:%M:%S', timestamp) IS NOT NULL
+                         AND timestamp <> strftime('%Y-%m-%d %H:%M:%S', timestamp)""")
+    # Police date list: covering, so the range scan never touches the table
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_reports_timestamp
+                    ON reports (timestamp, user_phone, name, lat, lon)""")
+    # Hospital date list
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_reports_hospital_timestamp
+                    ON reports (hospital_assigned_to, timestamp, user_phone, name, lat, lon)""")
+    # Ambulance pull query, previous accidents and both dispatcher queries
+    # (assigned_to IS NULL is an equality lookup on the same index)
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_reports_assigned_status_timestamp
+                    ON reports (assigned_to, ambulance_status, timestamp)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medical_info_accident ON patient_medical_info (accident_id)")
+
+
+def _migration_5_media_store(conn):
+    """References to files in media_store; the blobs themselves move out of the database."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS media (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER,
+                    content_type TEXT,
+                    created_at TEXT
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS patient_media (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    medical_info_id INTEGER,
+                    sha256 TEXT,
+                    kind TEXT,        -- photo / video / file
+                    filename TEXT,
+                    position INTEGER,
+                    FOREIGN KEY (medical_info_id) REFERENCES patient_medical_info (id),
+                    FOREIGN KEY (sha256) REFERENCES media (sha256)
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_media (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    report_id INTEGER,
+                    sha256 TEXT,
+                    kind TEXT,
+                    filename TEXT,
+                    position INTEGER,
+                    FOREIGN KEY (report_id) REFERENCES reports (id),
+                    FOREIGN KEY (sha256) REFERENCES media (sha256)
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patient_media_info ON patient_media (medical_info_id, position)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_media_report ON report_media (report_id, position)")
+
+
+def _migration_6_events(conn):
+    events.ensure_schema(conn)
+
+
+def _migration_7_telegram_outbox(conn):
+    """Messages to relatives, delivered by telegram_outbox.Sender."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS telegram_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id TEXT,
+                    text TEXT,
+                    status TEXT,              -- queued / sending / sent / failed
+                    attempts INTEGER DEFAULT 0,
+                    next_attempt_at REAL,     -- unix time; for 'sending' rows the lease expiry
+                    last_error TEXT,
+                    telegram_message_id INTEGER,
+                    created_at TEXT,
+                    sent_at TEXT
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_telegram_outbox_due ON telegram_outbox (status, next_attempt_at)")
+
+
+def _migration_8_triage_reports(conn):
+    """AI triage reports cached by triage.cache_key (vitals + model + prompt version)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS triage_reports (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    prompt_version INTEGER,
+                    status TEXT,              -- generating / done / failed
+                    report TEXT,              -- partial text while generating
+                    error TEXT,
+                    started_at REAL,
+                    updated_at REAL,
+                    generation_ms REAL
+                )''')
+
+
+def _migration_9_report_stats(conn):
+    stats.ensure_schema(conn)
+
+
+def _migration_10_report_transitions(conn):
+    metrics.ensure_schema(conn)
+
+
+def _migration_11_report_lifecycle(conn):
+    """reports.state (lifecycle.py) and one link row per ambulance/hospital pair."""
+    lifecycle.ensure_schema(conn)
+    conn.execute("""DELETE FROM ambulance_hospital_links WHERE id NOT IN
+                    (SELECT MIN(id) FROM ambulance_hospital_links GROUP BY ambulance_id, hospital_id)""")
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_ambulance_hospital_links_pair
+                    ON ambulance_hospital_links (ambulance_id, hospital_id)""")
+
+
+def _migration_12_driver_positions(conn):
+    """GPS track points, written in batches by tracking.Tracker."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS driver_positions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    driver_id INTEGER NOT NULL,
+                    lat REAL NOT NULL,
+                    lon REAL NOT NULL,
+                    accuracy REAL,            -- metres, as reported by the browser
+                    recorded_at REAL NOT NULL -- unix time of the fix
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_driver_positions_track ON driver_positions (driver_id, recorded_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_driver_positions_time ON driver_positions (recorded_at)")
+
+
+def _migration_13_report_tiles(conn):
+    """Per-month hotspot cell aggregates cached by hotspots.py (NumPy arrays as blobs)."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_tiles_monthly (
+                    month TEXT NOT NULL,         -- 'YYYY-MM'
+                    precision INTEGER NOT NULL,  -- geohash length of the cells
+                    report_count INTEGER,        -- reports in the month when built (from the daily counters)
+                    keys BLOB,
+                    counts BLOB,
+                    lat_sums BLOB,
+                    lon_sums BLOB,
+                    built_at REAL,
+                    PRIMARY KEY (month, precision)
+                )''')
+
+
+def _migration_14_assigned_state_index(conn):
+    """Busy-driver checks of the dispatcher (dispatch.AVAILABLE_DRIVERS_SQL, DRIVER_BUSY_SQL)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_assigned_state ON reports (assigned_to, state)")
+
+
+def _migration_15_completed_backfills(conn):
+    """Backfills that have finished, so later pool starts skip their table scans."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS completed_backfills (
+                    name TEXT PRIMARY KEY,
+                    rows INTEGER,
+                    completed_at TEXT
+                )''')
+
+
+def _migration_16_coordinate_changes(conn):
+    """Per-month count of report coordinate edits, part of the hotspot tile cache key.
+
+    The monthly report counts alone miss coordinates filled or corrected later
+    (backfill_report_coordinates), so hotspots.py also compares this counter.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS report_coordinate_changes (
+                    month TEXT PRIMARY KEY,   -- 'YYYY-MM' of the report timestamp
+                    changes INTEGER NOT NULL
+                )''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS reports_coordinates_changed AFTER UPDATE OF lat, lon ON reports
+                    WHEN OLD.lat IS NOT NEW.lat OR OLD.lon IS NOT NEW.lon
+                    BEGIN
+                        INSERT INTO report_coordinate_changes (month, changes) VALUES (substr(NEW.timestamp, 1, 7), 1)
+                        ON CONFLICT (month) DO UPDATE SET changes = changes + 1;
+                    END''')
+    if "coordinate_changes" not in _column_names(conn, "report_tiles_monthly"):
+        conn.execute("ALTER TABLE report_tiles_monthly ADD COLUMN coordinate_changes INTEGER NOT NULL DEFAULT 0")
+    conn.execute("DELETE FROM report_tiles_monthly")  # built before edits were counted
+
+
+def _migration_17_missing_report_uploads(conn):
+    """Legacy uploads that backfill_report_uploads could not find, kept for someone to check."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS missing_report_uploads (
+                    report_id INTEGER NOT NULL,
+                    filename TEXT NOT NULL,   -- as listed in reports.media, which keeps it too
+                    path TEXT,
+                    found_missing_at TEXT,
+                    PRIMARY KEY (report_id, filename),
+                    FOREIGN KEY (report_id) REFERENCES reports (id)
+                )''')
+
+
+# (version, function) pairs; append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, _migration_1_base_schema),
+    (2, _migration_2_hospital_rtree),
+    (3, _migration_3_report_coordinates),
+    (4, _migration_4_timestamp_indexes),
+    (5, _migration_5_media_store),
+    (6, _migration_6_events),
+    (7, _migration_7_telegram_outbox),
+    (8, _migration_8_triage_reports),
+    (9, _migration_9_report_stats),
+    (10, _migration_10_report_transitions),
+    (11, _migration_11_report_lifecycle),
+    (12, _migration_12_driver_positions),
+    (13, _migration_13_report_tiles),
+    (14, _migration_14_assigned_state_index),
+    (15, _migration_15_completed_backfills),
+    (16, _migration_16_coordinate_changes),
+    (17, _migration_17_missing_report_uploads),
+]
+
+
+def migrate(conn):
+    """Apply pending migrations, each in its own write transaction."""
+    for version, apply in MIGRATIONS:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# --- Backfills (data migrations too large for one transaction) ---
+def backfill_report_coordinates(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Fill reports.lat/lon/geohash from the text location, one short transaction per batch.
+
+    Resumable: only rows with lat still NULL are touched. Returns rows updated.
+    """
+    updated, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            """SELECT id, location FROM reports
+               WHERE lat IS NULL AND location IS NOT NULL AND id > ? ORDER BY id LIMIT ?""",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return updated
+        last_id = rows[-1][0]
+        values = []
+        for report_id, location in rows:
+            point = parse_location(location)
+            if point is not None:
+                values.append((point[0], point[1], geohash_encode(*point, GEOHASH_PRECISION), report_id))
+        conn.executemany("UPDATE reports SET lat = ?, lon = ?, geohash = ? WHERE id = ?", values)
+        conn.commit()
+        updated += len(values)
+
+
+def backfill_medical_media(conn, batch_size=MEDIA_BACKFILL_BATCH_SIZE):
+    """Move photos/videos BLOBs from patient_medical_info into the media store.
+
+    Older rows hold every photo concatenated into one blob; that blob is kept
+    as a single photo, which is how the hospital page always displayed it.
+    """
+    moved, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            """SELECT id, photos, videos FROM patient_medical_info
+               WHERE id > ? AND (photos IS NOT NULL OR videos IS NOT NULL) ORDER BY id LIMIT ?""",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return moved
+        for medical_info_id, photos, videos in rows:
+            items = []
+            if photos:
+                items.append(media_store.put_bytes(photos)._replace(kind="photo"))
+            if videos:
+                items.append(media_store.put_bytes(videos)._replace(kind="video"))
+            _insert_media(conn, "patient_media", "medical_info_id", medical_info_id, items)
+            conn.execute("UPDATE patient_medical_info SET photos = NULL, videos = NULL WHERE id = ?",
+                         (medical_info_id,))
+        last_id = rows[-1][0]
+        conn.commit()
+        moved += len(rows)
+
+
+def backfill_report_uploads(conn, batch_size=BACKFILL_BATCH_SIZE):
+    """Import files that app.py used to save as uploads/<client filename>.
+
+    A file that is missing stays listed in reports.media and is recorded in
+    missing_report_uploads; only imported files leave the column.
+    """
+    moved, last_id = 0, 0
+    while True:
+        rows = conn.execute(
+            """SELECT id, media FROM reports WHERE id > ? AND media IS NOT NULL AND media != ''
+               ORDER BY id LIMIT ?""",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return moved
+        for report_id, names in rows:
+            items, missing = [], []
+            for name in names.split(","):
+                file_path = os.path.join(LEGACY_UPLOADS_DIR, name)
+                if not os.path.exists(file_path):
+                    print(f"Report {report_id}: upload {file_path} is missing, kept in missing_report_uploads")
+                    missing.append((report_id, name, file_path, now()))
+                    continue
+                with open(file_path, "rb") as f:
+                    items.append(media_store.put_stream(f, name))
+            _insert_media(conn, "report_media", "report_id", report_id, items)
+            conn.executemany("""INSERT OR IGNORE INTO missing_report_uploads (report_id, filename, path, found_missing_at)
+                                VALUES (?, ?, ?, ?)""", missing)
+            conn.execute("UPDATE reports SET media = ? WHERE id = ?",
+                         (",".join(name for _, name, _, _ in missing) or None, report_id))
+        last_id = rows[-1][0]
+        conn.commit()
+        moved += len(rows)
+
+
+# (name, function) pairs run after the migrations until each has completed once; the
+# writers fill the new columns themselves, so a finished backfill never has work again.
+# Each must be resumable: a run interrupted part way is simply run again.
+BACKFILLS = [
+    ("report coordinates", backfill_report_coordinates),
+    ("medical photos/videos", backfill_medical_media),
+    ("report uploads", backfill_report_uploads),
+]
+
+
+def backfill(conn):
+    """Run the backfills not yet recorded in completed_backfills."""
+    completed = {row[0] for row in conn.execute("SELECT name FROM completed_backfills")}
+    for name, run in BACKFILLS:
+        if name in completed:
+            continue
+        count = run(conn)
+        conn.execute("INSERT OR IGNORE INTO completed_backfills (name, rows, completed_at) VALUES (?, ?, ?)",
+                     (name, count, now()))
+        conn.commit()
+        if count:
+            print(f"Backfilled {name}: {count} rows")
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def now():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def day_range(day):
+    """[start, end) timestamp strings covering one calendar day (a date or 'YYYY-MM-DD')."""
+    if not isinstance(day, date):
+        day = date.fromisoformat(str(day))
+    start = datetime(day.year, day.month, day.day)
+    return start.strftime(TIMESTAMP_FORMAT), (start + timedelta(days=1)).strftime(TIMESTAMP_FORMAT)
+
+
+# --- Users (accident reporters) ---
+def get_user(phone):
+    return _fetchone("SELECT * FROM users WHERE phone = ?", (phone,))
+
+
+def authenticate_user(phone, pin):
+    return _fetchone("SELECT * FROM users WHERE phone = ? AND pin = ?", (phone, pin))
+
+
+def insert_user(phone, name, email, pin):
+    _execute("INSERT INTO users (phone, name, email, pin) VALUES (?, ?, ?, ?)", (phone, name, email, pin))
+
+
+# --- Reports ---
+def insert_report(user_phone, name, lat, lon, media, place, description):
+    """Insert a report; `media` is a list of media_store.StoredMedia already written to the store."""
+    with connection() as conn:
+        cursor = conn.execute(
+            """INSERT INTO reports (user_phone, name, location, lat, lon, geohash, place, description,
+                                    timestamp, ambulance_status, hospital_status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (user_phone, name, f"{lat}, {lon}", lat, lon, geohash_encode(lat, lon, GEOHASH_PRECISION),
+             place, description, now(), "Waiting", "Waiting"),
+        )
+        report_id = cursor.lastrowid
+        _insert_media(conn, "report_media", "report_id", report_id, media)
+        metrics.record(conn, report_id, metrics.CREATED)
+        event_id = events.record(conn, events.REPORT_CREATED, report_id=report_id)
+    events.publish(event_id)
+    return report_id
+
+
+def get_report(report_id):
+    return _fetchone("SELECT * FROM reports WHERE id = ?", (report_id,))
+
+
+def list_reports_by_user(phone):
+    return _fetchall("SELECT * FROM reports WHERE user_phone = ?", (phone,))
+
+
+REPORTS_ON_DATE_SQL = """SELECT id, user_phone, name, lat, lon, timestamp FROM reports
+                          WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp"""
+
+HOSPITAL_REPORTS_ON_DATE_SQL = """SELECT id, user_phone, name, lat, lon, timestamp FROM reports
+                                   WHERE hospital_assigned_to = ? AND timestamp >= ? AND timestamp < ?
+                                   ORDER BY timestamp"""
+
+# The report the driver is busy with until it reaches the hospital (lifecycle.BUSY_STATES);
+# the dispatcher never gives a busy driver a second one (dispatch.claim), so no ORDER BY
+ACTIVE_ASSIGNMENT_SQL = f"""SELECT r.id, r.lat, r.lon, r.state, r.hospital_assigned_to, h.latitude, h.longitude
+                            FROM reports r LEFT JOIN hospitals h ON h.id = r.hospital_assigned_to
+                            WHERE r.assigned_to = ? AND r.state IN ({lifecycle.BUSY_STATES_SQL}) LIMIT 1"""
+
+PREVIOUS_ACCIDENTS_SQL = """SELECT r.id, r.lat, r.lon, r.timestamp,
+                            p.pulse_rate, p.oxygen_saturation, p.bp FROM reports r
+                            LEFT JOIN patient_medical_info p ON r.id = p.accident_id
+                            WHERE r.assigned_to = ?"""
+
+# Explicit columns so the photos/videos BLOB columns are never read on a page view
+MEDICAL_INFO_SQL = """SELECT id, accident_id, driver_id, pulse_rate, oxygen_saturation, bp, fractures_detected,
+                             blood_clotting_rate, head_injury, burns_external_wounds, remarks, timestamp,
+                             face_encodings
+                      FROM patient_medical_info WHERE accident_id = ?"""
+
+
+def list_reports_on_date(day):
+    return _fetchall(REPORTS_ON_DATE_SQL, day_range(day))
+
+
+def list_hospital_reports_on_date(hospital_id, day):
+    return _fetchall(HOSPITAL_REPORTS_ON_DATE_SQL, (hospital_id, *day_range(day)))
+
+
+def get_active_assignment(driver_id):
+    """The report this driver is busy with, as
+    (id, lat, lon, state, hospital_assigned_to, hospital latitude, hospital longitude)."""
+    return _fetchone(ACTIVE_ASSIGNMENT_SQL, (driver_id,))
+
+
+def assign_hospital(report_id, hospital_id, driver_id):
+    """Point the report at `hospital_id`; a no-op (and no write transaction) if it already is."""
+    current = _fetchone("SELECT hospital_assigned_to FROM reports WHERE id = ?", (report_id,))
+    if current is None or current[0] == hospital_id:
+        return False
+    event_id = None
+    with connection() as conn:
+        cursor = conn.execute(
+            "UPDATE reports SET hospital_assigned_to = ? WHERE id = ? AND hospital_assigned_to IS NOT ?",
+            (hospital_id, report_id, hospital_id),
+        )
+        if cursor.rowcount:  # only a real change is news to the hospital
+            conn.execute("""INSERT INTO ambulance_hospital_links (ambulance_id, hospital_id) VALUES (?, ?)
+                            ON CONFLICT (ambulance_id, hospital_id) DO NOTHING""", (driver_id, hospital_id))
+            metrics.record(conn, report_id, metrics.HOSPITAL_ASSIGNED)
+            event_id = events.record(conn, events.HOSPITAL_ASSIGNED, report_id, driver_id, hospital_id)
+    events.publish(event_id)
+    return event_id is not None
+
+
+def get_report_state(report_id):
+    row = _fetchone("SELECT state FROM reports WHERE id = ?", (report_id,))
+    return row[0] if row else None
+
+
+def advance_report(report_id, state, current=None):
+    """Move a report along its lifecycle (lifecycle.py); returns True only if the state changed.
+
+    `current` is the state the caller already read (saves a query). When the
+    move cannot apply from there, nothing is written.
+    """
+    if current is None:
+        current = get_report_state(report_id)
+    if not lifecycle.can_enter(current, state):
+        return False
+    with connection() as conn:
+        return lifecycle.transition(conn, report_id, state)
+
+
+def start_transport(report_id):
+    """Move the report to Transporting, but only once a hospital is assigned; returns True if it moved."""
+    with connection() as conn:
+        row = conn.execute("SELECT state, hospital_assigned_to FROM reports WHERE id = ?", (report_id,)).fetchone()
+        if row is None or row[1] is None or not lifecycle.can_enter(row[0], lifecycle.TRANSPORTING):
+            return False
+        return lifecycle.transition(conn, report_id, lifecycle.TRANSPORTING)
+
+
+def list_previous_accidents(driver_id):
+    return _fetchall(PREVIOUS_ACCIDENTS_SQL, (driver_id,))
+
+
+# --- Media references (files live in media_store) ---
+def _insert_media(conn, table, owner_column, owner_id, items):
+    conn.executemany(
+        "INSERT OR IGNORE INTO media (sha256, size, content_type, created_at) VALUES (?, ?, ?, ?)",
+        [(item.sha256, item.size, item.content_type, now()) for item in items],
+    )
+    conn.executemany(
+        f"INSERT INTO {table} ({owner_column}, sha256, kind, filename, position) VALUES (?, ?, ?, ?, ?)",
+        [(owner_id, item.sha256, item.kind, item.filename, position) for position, item in enumerate(items)],
+    )
+
+
+PATIENT_MEDIA_SQL = """SELECT pm.sha256, pm.kind, pm.filename, m.content_type FROM patient_media pm
+                       LEFT JOIN media m ON m.sha256 = pm.sha256
+                       WHERE pm.medical_info_id = ? ORDER BY pm.position"""
+
+REPORT_MEDIA_SQL = """SELECT rm.sha256, rm.kind, rm.filename, m.content_type FROM report_media rm
+                      LEFT JOIN media m ON m.sha256 = rm.sha256
+                      WHERE rm.report_id = ? ORDER BY rm.position"""
+
+
+def list_patient_media(medical_info_id):
+    """[(sha256, kind, filename, content_type)] in upload order."""
+    return _fetchall(PATIENT_MEDIA_SQL, (medical_info_id,))
+
+
+def list_report_media(report_id):
+    """[(sha256, kind, filename, content_type)] in upload order."""
+    return _fetchall(REPORT_MEDIA_SQL, (report_id,))
+
+
+def list_stored_media():
+    """[(sha256, size, content_type)] of every object in the media store."""
+    return _fetchall("SELECT sha256, size, content_type FROM media")
+
+
+# --- Report statistics (counters maintained by triggers, see stats.py) ---
+def report_counts(start_day, end_day, bucket="day", group_by=None):
+    """[(bucket, count)] or [(bucket, status, count)] over [start_day, end_day)."""
+    with connection() as conn:
+        return stats.counts(conn, start_day, end_day, bucket, group_by)
+
+
+def report_area_counts(start_day, end_day, limit=None):
+    """[(area geohash, count)], busiest first (whole months)."""
+    with connection() as conn:
+        return stats.area_counts(conn, start_day, end_day, limit)
+
+
+def report_hourly_profile(start_day, end_day, by_area=False):
+    """Average reports per day for each hour of the day."""
+    with connection() as conn:
+        return stats.hourly_profile(conn, start_day, end_day, by_area)
+
+
+def report_status_breakdown(start_day, end_day):
+    with connection() as conn:
+        return stats.status_breakdown(conn, start_day, end_day)
+
+
+# --- Time-to-care metrics (see metrics.py) ---
+def report_latencies(start, end):
+    """Percentiles per lifecycle interval for reports created in [start, end)."""
+    with connection() as conn:
+        return metrics.latencies(conn, start, end)
+
+
+def export_report_latencies(start, end, out, fmt="csv"):
+    with connection() as conn:
+        metrics.export(conn, start, end, out, fmt)
+
+
+# --- Change feed ---
+def list_events_since(after_id, kinds=None, driver_id=None, hospital_id=None):
+    """[(id, kind, report_id, driver_id, hospital_id, created_at)] newer than after_id."""
+    with connection() as conn:
+        return events.since(conn, after_id, kinds, driver_id, hospital_id)
+
+
+# --- Telegram outbox (see telegram_outbox.py) ---
+def get_outbox_message(message_id):
+    """(status, attempts, last_error, sent_at) of one queued message, or None."""
+    return _fetchone("SELECT status, attempts, last_error, sent_at FROM telegram_outbox WHERE id = ?", (message_id,))
+
+
+def outbox_status_counts():
+    """{status: number of messages}."""
+    return dict(_fetchall("SELECT status, COUNT(*) FROM telegram_outbox GROUP BY status"))
+
+
+# --- AI triage reports (see triage.py) ---
+def get_triage_row(key):
+    """(status, report, error, started_at) for a triage cache key, or None."""
+    return _fetchone("SELECT status, report, error, started_at FROM triage_reports WHERE key = ?", (key,))
+
+
+# --- GPS tracks (written in batches by tracking.py) ---
+def get_driver_track(driver_id, since, until):
+    """[(lat, lon, recorded_at)] of one driver in [since, until), oldest first."""
+    return _fetchall("""SELECT lat, lon, recorded_at FROM driver_positions
+                        WHERE driver_id = ? AND recorded_at >= ? AND recorded_at < ?
+                        ORDER BY recorded_at""", (driver_id, since, until))
+
+
+def count_driver_positions():
+    return _fetchone("SELECT COUNT(*) FROM driver_positions")[0]
+
+
+# --- Ambulance drivers ---
+def get_driver(driver_id):
+    return _fetchone("SELECT * FROM ambulance_drivers WHERE id = ?", (driver_id,))
+
+
+def get_driver_by_phone(phone):
+    return _fetchone("SELECT * FROM ambulance_drivers WHERE phone = ?", (phone,))
+
+
+def authenticate_driver(phone, pin):
+    return _fetchone("SELECT * FROM ambulance_drivers WHERE phone = ? AND pin = ?", (phone, pin))
+
+
+def insert_driver(phone, name, pin):
+    _execute("INSERT INTO ambulance_drivers (phone, name, pin, status) VALUES (?, ?, ?, ?)",
+             (phone, name, pin, "Not Ready"))
+
+
+def set_driver_status(driver_id, status):
+    with connection() as conn:
+        conn.execute("UPDATE ambulance_drivers SET status = ? WHERE id = ?", (status, driver_id))
+        event_id = events.record(conn, events.DRIVER_UPDATED, driver_id=driver_id)
+    events.publish(event_id)  # wakes the dispatcher when a driver becomes Ready
+
+
+def set_driver_location(driver_id, lat, lon):
+    with connection() as conn:
+        conn.execute("UPDATE ambulance_drivers SET latitude = ?, longitude = ? WHERE id = ?", (lat, lon, driver_id))
+        event_id = events.record(conn, events.DRIVER_UPDATED, driver_id=driver_id)
+    events.publish(event_id)
+
+
+# --- Patient medical info (filled in by the ambulance at the scene) ---
+def insert_medical_info(accident_id, driver_id, pulse_rate, oxygen_saturation, bp, fractures_detected,
+                        blood_clotting_rate, head_injury, burns_external_wounds, remarks, media=()):
+    """Insert the form; `media` is a list of media_store.StoredMedia (one row per photo/video)."""
+    with connection() as conn:
+        cursor = conn.execute(
+            '''INSERT INTO patient_medical_info (
+                   accident_id, driver_id, pulse_rate, oxygen_saturation, bp, fractures_detected,
+                   blood_clotting_rate, head_injury, burns_external_wounds, remarks
+               ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (accident_id, driver_id, pulse_rate, oxygen_saturation, bp, fractures_detected,
+             blood_clotting_rate, head_injury, burns_external_wounds, remarks),
+        )
+        medical_info_id = cursor.lastrowid
+        _insert_media(conn, "patient_media", "medical_info_id", medical_info_id, media)
+        hospital = conn.execute("SELECT hospital_assigned_to FROM reports WHERE id = ?", (accident_id,)).fetchone()
+        event_id = events.record(conn, events.MEDICAL_INFO_SUBMITTED, accident_id, driver_id,
+                                 hospital[0] if hospital else None)
+    events.publish(event_id)
+    return medical_info_id
+
+
+def get_medical_info(accident_id):
+    """Vitals row without media: (id, accident_id, driver_id, pulse_rate, ..., remarks, timestamp, face_encodings)."""
+    return _fetchone(MEDICAL_INFO_SQL, (accident_id,))
+
+
+def set_victim_encoding(medical_info_id, encoding):
+    _execute("UPDATE patient_medical_info SET face_encodings = ? WHERE id = ?", (encoding, medical_info_id))
+
+
+# --- Hospitals ---
+def get_hospital(hospital_id):
+    return _fetchone("SELECT * FROM hospitals WHERE id = ?", (hospital_id,))
+
+
+def get_hospital_by_phone(phone):
+    return _fetchone("SELECT * FROM hospitals WHERE phone = ?", (phone,))
+
+
+def authenticate_hospital(phone, pin):
+    return _fetchone("SELECT * FROM hospitals WHERE phone = ? AND pin = ?", (phone, pin))
+
+
+def insert_hospital(phone, name, pin):
+    _execute("INSERT INTO hospitals (phone, name, pin, status) VALUES (?, ?, ?, ?)", (phone, name, pin, "Not Ready"))
+
+
+def set_hospital_status(hospital_id, status):
+    _execute("UPDATE hospitals SET status = ? WHERE id = ?", (status, hospital_id))
+
+
+def set_hospital_location_by_phone(phone, lat, lon):
+    _execute("UPDATE hospitals SET latitude = ?, longitude = ? WHERE phone = ?", (lat, lon, phone))
+
+
+def nearest_ready_hospitals(lat, lon, k=1):
+    with connection() as conn:
+        return hospital_locator.nearest_ready_hospitals(conn, lat, lon, k)
+
+
+# --- Old patient records ---
+def insert_old_patient(name, age, gender, place, phone, emergency_phone, tele_id, medical_history, treatment,
+                       lab_reports, doctor_notes, medical_info, image, face_encodings):
+    cursor = _execute(
+        """INSERT INTO old_patient_records (name, age, gender, place, phone, emergency_phone, tele_id,
+               medical_history, treatment, lab_reports, doctor_notes, medical_info,
+               image, face_encodings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (name, age, gender, place, phone, emergency_phone, tele_id, medical_history, treatment,
+         lab_reports, doctor_notes, medical_info, image, face_encodings),
+    )
+    return cursor.lastrowid
+
+
+def get_old_patients(patient_ids):
+    """Details of the given patients (no face encodings), in no particular order."""
+    if not patient_ids:
+        return []
+    placeholders = ",".join("?" * len(patient_ids))
+    return _fetchall(
+        f"""SELECT name, age, gender, place, phone, emergency_phone, tele_id, medical_history, treatment,
+                   lab_reports, doctor_notes, medical_info, image, id
+            FROM old_patient_records WHERE id IN ({placeholders})""",
+        list(patient_ids),
+    )
+
+
+def face_encoding_stats():
+    """(count, max id) of old patient rows that have a face encoding."""
+    return _fetchone("SELECT COUNT(*), MAX(id) FROM old_patient_records WHERE face_encodings IS NOT NULL")
+
+
+def iter_face_encodings(after_id=0, batch_size=10_000):
+    """Yield batches of (id, face_encodings) rows with id > after_id, in id order."""
+    with connection() as conn:
+        cursor = conn.execute(
+            "SELECT id, face_encodings FROM old_patient_records WHERE id > ? ORDER BY id", (after_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def list_old_patient_images(after_id=0, limit=64):
+    """(id, image) of old patients with a stored photo and id > after_id, in id order."""
+    return _fetchall(
+        "SELECT id, image FROM old_patient_records WHERE id > ? AND image IS NOT NULL ORDER BY id LIMIT ?",
+        (after_id, limit),
+    )
+
+
+def set_old_patient_encodings(values):
+    """Replace face encodings from (encoding, patient id) pairs in one transaction."""
+    with connection() as conn:
+        conn.executemany("UPDATE old_patient_records SET face_encodings = ? WHERE id = ?", values)
+
+
+# --- Query plan check ---
+# Registration tables stay small (one row per driver or hospital), so scanning
+# them is fine; any other SCAN in a hot query is a regression. Aliases used in
+# the queries are listed too, since the plan reports the alias.
+SMALL_TABLES = ("users", "ambulance_drivers", "d", "hospitals", "h")
+
+
+def hot_queries():
+    """(name, sql, sample params) for every query that runs on a dashboard rerun or dispatch round."""
+    import dispatch  # imported here: dispatch imports db
+
+    start, end = day_range(date.today())
+    return [
+        ("list_reports_on_date", REPORTS_ON_DATE_SQL, (start, end)),
+        ("list_hospital_reports_on_date", HOSPITAL_REPORTS_ON_DATE_SQL, (1, start, end)),
+        ("get_active_assignment", ACTIVE_ASSIGNMENT_SQL, (1,)),
+        ("list_previous_accidents", PREVIOUS_ACCIDENTS_SQL, (1,)),
+        ("get_medical_info", MEDICAL_INFO_SQL, (1,)),
+        ("list_patient_media", PATIENT_MEDIA_SQL, (1,)),
+        ("list_report_media", REPORT_MEDIA_SQL, (1,)),
+        ("dispatch.load_unassigned_reports", dispatch.UNASSIGNED_REPORTS_SQL, ()),
+        ("dispatch.load_available_drivers", dispatch.AVAILABLE_DRIVERS_SQL, ()),
+        ("dispatch.claim", dispatch.DRIVER_BUSY_SQL, (1,)),
+        ("metrics.durations", metrics.WINDOW_TRANSITIONS_SQL, (0, 1)),
+    ]
+
+
+def check_query_plans(conn):
+    """Return [(query name, plan detail)] for every full scan of a large table or temp sort."""
+    problems = []
+    for name, sql, params in hot_queries():
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[-1]
+            words = detail.split()
+            full_scan = len(words) > 1 and words[0] == "SCAN" and words[1] not in SMALL_TABLES
+            if full_scan or "TEMP B-TREE" in detail:
+                problems.append((name, detail))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance tasks")
+    parser.add_argument("command", choices=["migrate", "check-plans", "vacuum"])
+    args = parser.parse_args()
+
+    with connection() as conn:  # the first connection migrates and backfills
+        if args.command == "check-plans":
+            problems = check_query_plans(conn)
+            for name, detail in problems:
+                print(f"FULL SCAN  {name}: {detail}")
+            if problems:
+                raise SystemExit(1)
+            print(f"All {len(hot_queries())} hot queries use an index.")
+        elif args.command == "vacuum":
+            # Gives back the space freed by moving media out of the database
+            before = os.path.getsize(DB_PATH)
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # in WAL mode the file only shrinks here
+            print(f"{DB_PATH}: {before / 1e6:.1f} MB -> {os.path.getsize(DB_PATH) / 1e6:.1f} MB")
+        else:
+            print(f"{DB_PATH} is at schema version {conn.execute('PRAGMA user_version').fetchone()[0]}.")
@@ -0,0 +1,211 @@
+"""Dispatch engine: match waiting accident reports to ready ambulances.
+
+Each round loads every unassigned 'Waiting' report and every 'Ready' driver
+that has a stored location and no open assignment, builds a haversine
+distance matrix and picks the assignment with the minimum total distance:
+  - optimal (Hungarian) when the batch is small enough,
+  - greedy nearest-pair otherwise.
+Assignments are claimed with conditional UPDATEs inside one write
+transaction, so a report or driver claimed concurrently is simply skipped.
+
+The loop wakes on the change feed (new report, driver status change or a
+driver's first GPS fix) and otherwise runs every --interval seconds as a
+safety net. Driver positions come from tracking.py.
+
+Run it as a loop next to the Streamlit apps:
+    python dispatch.py [--interval SECONDS] [--once]
+"""
+import argparse
+import time
+from collections import namedtuple
+
+import db
+import events
+import lifecycle
+import tracking
+from geo import haversine_km
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # optional, speeds up optimal matching for large batches
+    linear_sum_assignment = None
+
+INTERVAL_SECONDS = 10  # fallback only; new reports and driver changes wake the loop
+# Largest batch (min of reports/drivers) solved optimally; beyond this we go greedy
+OPTIMAL_MAX = 1000 if linear_sum_assignment is not None else 60
+
+DispatchResult = namedtuple("DispatchResult", "assignments method reports drivers matching_ms claim_ms")
+
+
+# --- Loading ---
+UNASSIGNED_REPORTS_SQL = """SELECT id, lat, lon FROM reports
+                            WHERE ambulance_status = 'Waiting' AND assigned_to IS NULL
+                            AND lat IS NOT NULL AND lon IS NOT NULL"""
+
+# A driver stays busy until the patient reaches the hospital (lifecycle.BUSY_STATES);
+# both lookups use idx_reports_assigned_state
+AVAILABLE_DRIVERS_SQL = f"""SELECT d.id, d.latitude, d.longitude FROM ambulance_drivers d
+                            WHERE d.status = 'Ready' AND d.latitude IS NOT NULL AND d.longitude IS NOT NULL
+                            AND NOT EXISTS (SELECT 1 FROM reports r
+                                            WHERE r.assigned_to = d.id AND r.state IN ({lifecycle.BUSY_STATES_SQL}))"""
+
+DRIVER_BUSY_SQL = f"SELECT 1 FROM reports WHERE assigned_to = ? AND state IN ({lifecycle.BUSY_STATES_SQL})"
+
+
+def load_unassigned_reports(conn):
+    """Return [(report_id, lat, lon)] for waiting reports with no ambulance."""
+    return conn.execute(UNASSIGNED_REPORTS_SQL).fetchall()
+
+
+def load_available_drivers(conn):
+    """Return [(driver_id, lat, lon)] for ready drivers with a location and no open assignment.
+
+    The stored location is at most tracking.FLUSH_INTERVAL old; fixes this
+    process received since then (the ambulance pages ping it) are newer.
+    """
+    return tracking.with_latest(conn.execute(AVAILABLE_DRIVERS_SQL).fetchall())
+
+
+# --- Matching ---
+def cost_matrix(reports, drivers):
+    return [[haversine_km(r_lat, r_lon, d_lat, d_lon) for _, d_lat, d_lon in drivers]
+            for _, r_lat, r_lon in reports]
+
+
+def match_greedy(costs):
+    """Repeatedly take the cheapest remaining (report, driver) pair."""
+    pairs = sorted(
+        (cost, i, j) for i, row in enumerate(costs) for j, cost in enumerate(row)
+    )
+    used_rows, used_cols, matches = set(), set(), []
+    limit = min(len(costs), len(costs[0]) if costs else 0)
+    for _, i, j in pairs:
+        if i in used_rows or j in used_cols:
+            continue
+        used_rows.add(i)
+        used_cols.add(j)
+        matches.append((i, j))
+        if len(matches) == limit:
+            break
+    return matches
+
+
+def _hungarian(costs):
+    """Minimum-cost assignment for an n x m matrix with n <= m (rows all assigned)."""
+    n, m = len(costs), len(costs[0])
+    inf = float("inf")
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    p, way = [0] * (m + 1), [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0, delta, j1 = p[j0], inf, 0
+            row = costs[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j], way[j] = cur, j0
+                    if minv[j] < delta:
+                        delta, j1 = minv[j], j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+def match_optimal(costs):
+    """Assignment minimising the total distance over all matched pairs."""
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(costs)
+        return list(zip(rows.tolist(), cols.tolist()))
+    if len(costs) <= len(costs[0]):
+        return _hungarian(costs)
+    transposed = [list(col) for col in zip(*costs)]
+    return [(i, j) for j, i in _hungarian(transposed)]
+
+
+# --- Claiming ---
+def claim(conn, pairs):
+    """Atomically assign (report_id, driver_id) pairs; returns the pairs that were applied."""
+    claimed = []
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        event_id = None
+        for report_id, driver_id in pairs:
+            # The write lock is held, so the driver cannot be claimed by another dispatcher in between
+            busy = conn.execute(DRIVER_BUSY_SQL, (driver_id,)).fetchone()
+            if not busy and lifecycle.transition(conn, report_id, lifecycle.ASSIGNED, assigned_to=driver_id):
+                claimed.append((report_id, driver_id))
+                event_id = events.record(conn, events.REPORT_ASSIGNED, report_id, driver_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    events.publish(event_id)
+    return claimed
+
+
+def run_once():
+    """Run one matching round and return a DispatchResult."""
+    with db.connection() as conn:
+        return _run_once(conn)
+
+
+def _run_once(conn):
+    reports = load_unassigned_reports(conn)
+    drivers = load_available_drivers(conn) if reports else []
+    if not reports or not drivers:
+        return DispatchResult([], "none", len(reports), len(drivers), 0.0, 0.0)
+
+    start = time.perf_counter()
+    costs = cost_matrix(reports, drivers)
+    if min(len(reports), len(drivers)) <= OPTIMAL_MAX:
+        method, matches = "optimal", match_optimal(costs)
+    else:
+        method, matches = "greedy", match_greedy(costs)
+    matching_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    assignments = claim(conn, [(reports[i][0], drivers[j][0]) for i, j in matches])
+    claim_ms = (time.perf_counter() - start) * 1000
+    return DispatchResult(assignments, method, len(reports), len(drivers), matching_ms, claim_ms)
+
+
+def run_forever(interval=INTERVAL_SECONDS):
+    """Run a round whenever the change feed reports news, and at least every `interval` seconds."""
+    seen = events.latest_id()
+    while True:
+        result = run_once()
+        if result.assignments:
+            print(f"Dispatched {len(result.assignments)} of {result.reports} reports to "
+                  f"{result.drivers} drivers ({result.method}, match {result.matching_ms:.1f} ms, "
+                  f"claim {result.claim_ms:.1f} ms)")
+        seen = events.wait(seen, timeout=interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Match waiting accident reports to ready ambulances.")
+    parser.add_argument("--interval", type=float, default=INTERVAL_SECONDS)
+    parser.add_argument("--once", action="store_true", help="run a single round and exit")
+    args = parser.parse_args()
+    if args.once:
+        print(run_once())
+    else:
+        run_forever(args.interval)
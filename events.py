@@ -0,0 +1,200 @@
+"""Change feed for the dashboards and the dispatcher.
+
+Writers append a row to the events table inside the same transaction as the
+change itself (new report, ambulance assignment, hospital assignment,
+medical form submitted, driver status or location), then call publish()
+after commit.
+
+publish() rewrites a small signal file with the newest event id. Each process
+runs one watcher thread that stats that file every POLL_INTERVAL seconds, so
+subscribers learn about new events without touching the database; only when
+the id moves do they read the (few) new rows, by primary key. In-process
+subscribers are woken directly.
+
+Streamlit pages call watch() with a loader filtered to their own driver or
+hospital id; the page reruns only for events that concern it.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+SIGNAL_PATH = os.environ.get("EVENTS_SIGNAL_PATH") or (
+    os.environ.get("ACCIDENT_DB_PATH", "accident_reporting.db") + ".events"
+)
+POLL_INTERVAL = 0.05     # seconds between stat() calls of the signal file
+WATCH_INTERVAL = 0.5     # how often a Streamlit page checks the in-memory latest id
+
+# Event kinds
+REPORT_CREATED = "report_created"
+REPORT_ASSIGNED = "report_assigned"            # dispatcher matched a report to a driver
+HOSPITAL_ASSIGNED = "hospital_assigned"        # ambulance picked the destination hospital
+MEDICAL_INFO_SUBMITTED = "medical_info_submitted"
+DRIVER_UPDATED = "driver_updated"          # status or location changed
+TELEGRAM_QUEUED = "telegram_queued"        # wakes the outbox sender
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS events (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           kind TEXT NOT NULL,
+           report_id INTEGER,
+           driver_id INTEGER,
+           hospital_id INTEGER,
+           created_at TEXT
+       )""",
+)
+
+
+def ensure_schema(conn):
+    """Create the events table; runs inside the caller's transaction."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+# --- Writing ---
+def record(conn, kind, report_id=None, driver_id=None, hospital_id=None):
+    """Append an event inside the caller's transaction and return its id.
+
+    Call publish() with the id once the transaction has committed.
+    """
+    cursor = conn.execute(
+        "INSERT INTO events (kind, report_id, driver_id, hospital_id, created_at) VALUES (?, ?, ?, ?, ?)",
+        (kind, report_id, driver_id, hospital_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    )
+    return cursor.lastrowid
+
+
+def publish(event_id):
+    """Wake subscribers in this and every other process."""
+    if not event_id:
+        return
+    tmp_path = f"{SIGNAL_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(event_id))
+    os.replace(tmp_path, SIGNAL_PATH)
+    get_feed().advance(event_id)
+
+
+# --- Reading ---
+def since(conn, after_id, kinds=None, driver_id=None, hospital_id=None):
+    """Events with id > after_id, oldest first, optionally filtered to one driver or hospital."""
+    clauses, params = ["id > ?"], [after_id]
+    if kinds:
+        clauses.append(f"kind IN ({','.join('?' * len(kinds))})")
+        params.extend(kinds)
+    if driver_id is not None:
+        clauses.append("driver_id = ?")
+        params.append(driver_id)
+    if hospital_id is not None:
+        clauses.append("hospital_id = ?")
+        params.append(hospital_id)
+    return conn.execute(
+        f"""SELECT id, kind, report_id, driver_id, hospital_id, created_at FROM events
+            WHERE {' AND '.join(clauses)} ORDER BY id""",
+        params,
+    ).fetchall()
+
+
+class EventFeed:
+    """The newest published event id, kept current by a background watcher thread."""
+
+    def __init__(self, signal_path=None, poll_interval=POLL_INTERVAL):
+        self.signal_path = signal_path or SIGNAL_PATH
+        self.poll_interval = poll_interval
+        self._latest = 0
+        self._mtime = None
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._check()
+                self._thread = threading.Thread(target=self._watch, name="event-feed", daemon=True)
+                self._thread.start()
+
+    def latest_id(self):
+        self.start()
+        return self._latest
+
+    def advance(self, event_id):
+        with self._cond:
+            if event_id > self._latest:
+                self._latest = event_id
+                self._cond.notify_all()
+
+    def wait(self, after_id, timeout=None):
+        """Block until an event newer than after_id is published (or timeout); returns the latest id."""
+        self.start()
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest > after_id, timeout)
+            return self._latest
+
+    def _check(self):
+        try:
+            mtime = os.stat(self.signal_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        try:
+            with open(self.signal_path) as f:
+                event_id = int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return
+        self.advance(event_id)
+
+    def _watch(self):
+        while True:
+            self._check()
+            time.sleep(self.poll_interval)
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = EventFeed()
+    return _feed
+
+
+def latest_id():
+    return get_feed().latest_id()
+
+
+def wait(after_id, timeout=None):
+    return get_feed().wait(after_id, timeout)
+
+
+# --- Streamlit ---
+def watch(key, load_events, interval=WATCH_INTERVAL):
+    """Rerun the current page when `load_events(after_id)` returns new events.
+
+    Runs as a Streamlit fragment every `interval` seconds. Between events a
+    tick only compares two integers; the database is read once per published
+    event. `key` namespaces the last-seen id in session state.
+    """
+    import streamlit as st  # imported here so the dispatcher does not need streamlit
+
+    state_key = f"events_seen_{key}"
+    if state_key not in st.session_state:
+        st.session_state[state_key] = latest_id()
+
+    @st.fragment(run_every=interval)
+    def _watch_events():
+        seen = st.session_state[state_key]
+        latest = latest_id()
+        if latest <= seen:
+            return
+        new_events = load_events(seen)
+        st.session_state[state_key] = max([latest] + [event[0] for event in new_events])
+        if new_events:
+            st.rerun()
+
+    _watch_events()
@@ -0,0 +1,187 @@
+"""Vectorized face-encoding index over old_patient_records.
+
+All stored encodings are kept in one contiguous float32 matrix that lives in
+two append-only files under INDEX_DIR (vectors.f32 and ids.i64) and is
+memory-mapped on load. A search is a single matrix-vector product against
+that matrix instead of one compare_faces call per row, and never touches the
+image blobs. New patients are appended incrementally (only the new rows' norms
+are computed); rows inserted by other processes are picked up by refresh()
+using the highest indexed id.
+
+Re-encoding existing patients (faces.py reencode) changes rows in place, which
+appending cannot see, so it ends with rebuild(). The rebuilt files replace the
+old ones by rename, and every process remaps them on its next search.
+
+For very large registries (ANN_THRESHOLD rows and up) the index switches to
+an HNSW approximate-nearest-neighbour graph when hnswlib is installed.
+"""
+import os
+import threading
+
+import numpy as np
+
+import db
+import profiling
+
+try:
+    import hnswlib
+except ImportError:  # optional, only used for very large registries
+    hnswlib = None
+
+INDEX_DIR = os.environ.get("FACE_INDEX_DIR", "face_index")
+DIM = 128
+TOLERANCE = 0.6          # same default as face_recognition.compare_faces
+ANN_THRESHOLD = 200_000
+
+
+class FaceIndex:
+    """Top-k nearest face search over the encodings in old_patient_records."""
+
+    def __init__(self, index_dir=INDEX_DIR, ann_threshold=ANN_THRESHOLD):
+        self.index_dir = index_dir
+        self.ann_threshold = ann_threshold
+        self._vectors_path = os.path.join(index_dir, "vectors.f32")
+        self._ids_path = os.path.join(index_dir, "ids.i64")
+        self._lock = threading.Lock()
+        self._ann = None
+        os.makedirs(index_dir, exist_ok=True)
+        self._map()
+        if not self._in_sync():
+            self.rebuild()
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- Storage ---
+    def _map(self, sq_norms=None):
+        """(Re)memory-map the on-disk files into self.vectors / self.ids.
+
+        `sq_norms` are the rows' squared norms when the caller already has them.
+        """
+        self._ids_inode = os.stat(self._ids_path).st_ino if os.path.exists(self._ids_path) else None
+        n_vectors = os.path.getsize(self._vectors_path) // (4 * DIM) if os.path.exists(self._vectors_path) else 0
+        n_ids = os.path.getsize(self._ids_path) // 8 if os.path.exists(self._ids_path) else 0
+        n = min(n_vectors, n_ids)
+        if n == 0:
+            self.vectors = np.empty((0, DIM), dtype=np.float32)
+            self.ids = np.empty(0, dtype=np.int64)
+        else:
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(n, DIM))
+            self.ids = np.memmap(self._ids_path, dtype=np.int64, mode="r", shape=(n,))
+        # Squared norms let a search be one matrix-vector product
+        if sq_norms is None or len(sq_norms) != n:
+            sq_norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+        self._sq_norms = sq_norms
+        self._files_consistent = n_vectors == n_ids
+
+    def _append(self, ids, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with open(self._vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self._ids_path, "ab") as f:
+            f.write(np.asarray(ids, dtype=np.int64).tobytes())
+        self._map(np.concatenate((self._sq_norms, np.einsum("ij,ij->i", vectors, vectors))))
+        if self._ann is not None:
+            self._ann.resize_index(max(len(self.ids), self._ann.get_max_elements()))
+            self._ann.add_items(vectors, ids)
+
+    def _in_sync(self):
+        if not self._files_consistent:
+            return False
+        count, max_id = db.face_encoding_stats()
+        if count == 0:
+            return len(self.ids) == 0
+        # Rows newer than the index are fine (refresh() appends them); anything
+        # else means the files belong to a different database.
+        return len(self.ids) > 0 and int(self.ids.max()) <= max_id and len(self.ids) <= count
+
+    @staticmethod
+    def _decode(rows):
+        ids, vectors = [], []
+        for row_id, blob in rows:
+            if blob is None or len(blob) != DIM * 8:
+                continue
+            ids.append(row_id)
+            vectors.append(np.frombuffer(blob, dtype=np.float64))
+        if not ids:
+            return ids, np.empty((0, DIM), dtype=np.float32)
+        return ids, np.vstack(vectors).astype(np.float32)
+
+    def _load_rows(self, after_id):
+        """Stream (ids, float32 matrix) batches for rows with id > after_id."""
+        for rows in db.iter_face_encodings(after_id):
+            yield self._decode(rows)
+
+    def rebuild(self):
+        """Rewrite the index files from scratch out of the database, then swap them in."""
+        with self._lock:
+            vectors_tmp, ids_tmp = self._vectors_path + ".tmp", self._ids_path + ".tmp"
+            with open(vectors_tmp, "wb") as vectors_file, open(ids_tmp, "wb") as ids_file:
+                for ids, vectors in self._load_rows(0):
+                    vectors_file.write(vectors.tobytes())
+                    ids_file.write(np.asarray(ids, dtype=np.int64).tobytes())
+            # Vectors first: a process that sees the new ids file remaps both
+            os.replace(vectors_tmp, self._vectors_path)
+            os.replace(ids_tmp, self._ids_path)
+            self._ann = None
+            self._map()
+
+    def refresh(self):
+        """Append rows inserted since the index was last updated."""
+        with self._lock:
+            ids_inode = os.stat(self._ids_path).st_ino if os.path.exists(self._ids_path) else None
+            if ids_inode != self._ids_inode:  # rebuilt by another process
+                self._ann = None
+                self._map()
+            last_id = int(self.ids[-1]) if len(self.ids) else 0
+            for ids, vectors in self._load_rows(last_id):
+                if ids:
+                    self._append(ids, vectors)
+
+    def add(self, patient_id, encoding):
+        """Add one newly inserted patient. `encoding` is the stored float64 bytes."""
+        if encoding is None:
+            return
+        vector = np.frombuffer(encoding, dtype=np.float64).astype(np.float32).reshape(1, DIM)
+        with self._lock:
+            if len(self.ids) and patient_id <= int(self.ids[-1]):
+                return
+            self._append([patient_id], vector)
+
+    # --- Search ---
+    def _ann_index(self):
+        if hnswlib is None or len(self.ids) < self.ann_threshold:
+            return None
+        if self._ann is None:
+            index = hnswlib.Index(space="l2", dim=DIM)
+            index.init_index(max_elements=len(self.ids), ef_construction=200, M=16)
+            index.add_items(np.asarray(self.vectors), np.asarray(self.ids))
+            index.set_ef(64)
+            self._ann = index
+        return self._ann
+
+    @profiling.timed("face_index.search")
+    def search(self, encoding, k=5, tolerance=TOLERANCE):
+        """Return up to k (patient_id, distance) pairs within `tolerance`, nearest first."""
+        if encoding is None:
+            return []
+        self.refresh()
+        query = np.frombuffer(encoding, dtype=np.float64).astype(np.float32)
+        with self._lock:
+            n = len(self.ids)
+            if n == 0:
+                return []
+            k = min(k, n)
+
+            ann = self._ann_index()
+            if ann is not None:
+                labels, sq_dists = ann.knn_query(query, k=k)
+                pairs = zip(labels[0].tolist(), np.sqrt(np.maximum(sq_dists[0], 0)).tolist())
+            else:
+                sq_dists = self._sq_norms - 2.0 * (self.vectors @ query) + float(query @ query)
+                dists = np.sqrt(np.maximum(sq_dists, 0))
+                top = np.argpartition(dists, k - 1)[:k] if k < n else np.arange(n)
+                top = top[np.argsort(dists[top])]
+                pairs = zip(self.ids[top].tolist(), dists[top].tolist())
+
+        return [(int(pid), float(dist)) for pid, dist in pairs if dist <= tolerance]
@@ -0,0 +1,209 @@
+"""Face detection and encoding in a pool of worker processes.
+
+dlib holds the GIL while it detects and encodes, so running it in the
+Streamlit server stalls every session of that app. Work is sent to a
+ProcessPoolExecutor instead and callers get futures back:
+
+    future = faces.submit(image_bytes)            # Future -> encoding bytes or None
+    futures = faces.encode_many([img1, img2])     # one future per image, encoded in parallel
+    encoding = faces.recognize_face(image_bytes)  # blocking convenience
+
+Workers decode the image, apply the EXIF orientation and shrink it so the
+longest side is at most MAX_SIDE pixels before detection (JPEGs are scaled
+while decoding). Configure with FACE_WORKERS, FACE_MAX_SIDE,
+FACE_DETECTION_MODEL (hog or cnn), FACE_UPSAMPLE and FACE_JITTERS.
+
+Victim photos are encoded once, right after the ambulance driver submits the
+medical form, and the result is stored in patient_medical_info.face_encodings.
+The hospital pages only read that column.
+
+    python faces.py reencode   # recompute old patient encodings with the current settings, rebuild the index
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import db
+import profiling
+
+WORKERS = int(os.environ.get("FACE_WORKERS", min(4, os.cpu_count() or 1)))
+MAX_SIDE = int(os.environ.get("FACE_MAX_SIDE", "1024"))          # detection resolution, longest side in pixels
+DETECTION_MODEL = os.environ.get("FACE_DETECTION_MODEL", "hog")  # "cnn" is more accurate, needs a GPU to be fast
+UPSAMPLE = int(os.environ.get("FACE_UPSAMPLE", "1"))             # finds faces down to ~40 px at 1
+JITTERS = int(os.environ.get("FACE_JITTERS", "1"))
+RESULT_TIMEOUT = 120
+
+NO_FACE = b""  # stored when the photos were processed but no face was found
+
+
+# --- Worker side (runs in the pool processes) ---
+def _warm_up():
+    import face_recognition  # noqa: F401  (loads the dlib models once per worker)
+
+
+def load_image(image_bytes, max_side=MAX_SIDE):
+    """Decode to an RGB array, upright and no larger than max_side on its longest side."""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if max_side:
+        image.draft("RGB", (max_side, max_side))  # JPEG: decode at a reduced scale, much faster
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    if max_side:
+        image.thumbnail((max_side, max_side))
+    return np.asarray(image)
+
+
+def _encode(image_bytes, max_side, model, upsample, jitters):
+    """(encoding bytes or None, {stage: seconds}) for the first face in the image."""
+    import face_recognition
+
+    timings = {}
+    start = time.perf_counter()
+    rgb_image = load_image(image_bytes, max_side)
+    timings["face.decode"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    face_locations = face_recognition.face_locations(rgb_image, number_of_times_to_upsample=upsample, model=model)
+    timings["face.detect"] = time.perf_counter() - start
+    if not face_locations:
+        return None, timings
+
+    start = time.perf_counter()
+    face_encodings = face_recognition.face_encodings(rgb_image, face_locations[:1], num_jitters=jitters)
+    timings["face.encode"] = time.perf_counter() - start
+    return (face_encodings[0].tobytes() if face_encodings else None), timings
+
+
+# --- Caller side ---
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_warm_up)
+    return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+
+
+def submit(image_bytes, max_side=None, model=None, upsample=None, jitters=None):
+    """Encode the first face of one image in a worker; returns a Future of the encoding bytes (or None)."""
+    args = (image_bytes, MAX_SIDE if max_side is None else max_side, model or DETECTION_MODEL,
+            UPSAMPLE if upsample is None else upsample, JITTERS if jitters is None else jitters)
+    pool = get_pool()
+    try:
+        inner = pool.submit(_encode, *args)
+    except BrokenProcessPool:  # a worker died (e.g. out of memory); start a fresh pool once
+        _reset_pool(pool)
+        inner = get_pool().submit(_encode, *args)
+
+    # Callers see only the encoding; the worker's stage timings go to the profiler here
+    outer, start = Future(), time.perf_counter()
+
+    def done(future):
+        try:
+            encoding, timings = future.result()
+        except BaseException as exc:
+            if isinstance(exc, BrokenProcessPool):
+                _reset_pool(pool)
+            outer.set_exception(exc)
+            return
+        for name, seconds in timings.items():
+            profiling.record(name, seconds)
+        profiling.record("face.request", time.perf_counter() - start)
+        outer.set_result(encoding)
+
+    inner.add_done_callback(done)
+    return outer
+
+
+def encode_many(images, **options):
+    """One future per image, all encoded in parallel across the workers."""
+    return [submit(image_bytes, **options) for image_bytes in images]
+
+
+def recognize_face(image_bytes, timeout=RESULT_TIMEOUT):
+    """Encoding of the first face in the image, or None (blocks the calling thread only)."""
+    return submit(image_bytes).result(timeout)
+
+
+def encode_first_face(images, timeout=RESULT_TIMEOUT):
+    """Return the encoding of the first face found in `images` (in order), or NO_FACE."""
+    for future in encode_many(images):
+        encoding = future.result(timeout)
+        if encoding:
+            return encoding
+    return NO_FACE
+
+
+def store_victim_encoding(medical_info_id, photos):
+    """Encode the victim photos and save the result on the patient_medical_info row."""
+    encoding = encode_first_face(photos)
+    db.set_victim_encoding(medical_info_id, encoding)
+    return encoding
+
+
+_waiters = ThreadPoolExecutor(max_workers=2, thread_name_prefix="face-store")
+
+
+def store_victim_encoding_async(medical_info_id, photos):
+    """Run store_victim_encoding without blocking the Streamlit thread. Returns a Future."""
+    return _waiters.submit(store_victim_encoding, medical_info_id, photos)
+
+
+# --- Maintenance ---
+def reencode_old_patients(batch_size=64):
+    """Recompute old_patient_records.face_encodings from the stored images with the current settings."""
+    updated = missing = 0
+    last_id = 0
+    while True:
+        rows = db.list_old_patient_images(last_id, batch_size)
+        if not rows:
+            return updated, missing
+        last_id = rows[-1][0]
+        futures = encode_many(image for _, image in rows)
+        values = []
+        for (patient_id, _), future in zip(rows, futures):
+            encoding = future.result(RESULT_TIMEOUT)
+            if encoding:
+                values.append((encoding, patient_id))
+            else:
+                missing += 1
+        db.set_old_patient_encodings(values)
+        updated += len(values)
+        print(f"  re-encoded {updated} patients ({missing} without a detectable face)", end="\r", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Face encoding maintenance")
+    parser.add_argument("command", choices=["reencode"])
+    args = parser.parse_args()
+
+    import face_index
+
+    start = time.perf_counter()
+    updated, missing = reencode_old_patients()
+    print(f"\nRe-encoded {updated} old patients in {time.perf_counter() - start:.0f} s with {WORKERS} workers "
+          f"({DETECTION_MODEL}, max side {MAX_SIDE}px, upsample {UPSAMPLE}); {missing} kept their old encoding.")
+    # The index only appends new ids; the re-encoded rows must replace the old ones
+    index = face_index.FaceIndex()
+    index.rebuild()
+    print(f"Rebuilt the face index ({len(index)} patients); running apps switch to it on their next search.")
@@ -0,0 +1,153 @@
+"""Small geographic helpers shared by the locator, dispatch and routing code."""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of `radius_km`."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return lat - dlat, lat + dlat, lon - dlon, lon + dlon
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat, lon, precision=7):
+    """Standard base32 geohash; 7 characters is a cell of roughly 150 m."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_decode(geohash):
+    """Centre (lat, lon) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _GEOHASH_BASE32.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if bits >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def parse_location(location):
+    """Parse the legacy 'lat, lon' text column; returns (lat, lon) or None."""
+    try:
+        lat, lon = (float(part) for part in location.split(","))
+    except (AttributeError, ValueError):
+        return None
+    return lat, lon
+
+
+# --- Line geometry (route drawing) ---
+def metres_per_pixel(lat, zoom):
+    """Ground size of one web-map pixel at `zoom` (256 px tiles)."""
+    return 2 * math.pi * EARTH_RADIUS_KM * 1000 * math.cos(math.radians(lat)) / (256 * 2 ** zoom)
+
+
+def simplify(coords, tolerance_m):
+    """Douglas-Peucker: drop points closer than `tolerance_m` to the simplified line.
+
+    Distances are measured in a local equirectangular projection, which is
+    exact enough at city scale. The first and last points are always kept.
+    """
+    if len(coords) < 3 or tolerance_m <= 0:
+        return list(coords)
+    m_per_deg_lat = KM_PER_DEGREE_LAT * 1000
+    m_per_deg_lon = m_per_deg_lat * math.cos(math.radians(coords[0][0]))
+    xs = [lon * m_per_deg_lon for _, lon in coords]
+    ys = [lat * m_per_deg_lat for lat, _ in coords]
+    keep = [False] * len(coords)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance_m * tolerance_m
+    stack = [(0, len(coords) - 1)]  # iterative: long routes would overflow the recursion limit
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_sq = None, tolerance_sq
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if length_sq:
+                t = min(1.0, max(0.0, (px * dx + py * dy) / length_sq))
+                px, py = px - t * dx, py - t * dy
+            dist_sq = px * px + py * py
+            if dist_sq > farthest_sq:
+                farthest, farthest_sq = i, dist_sq
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(coords, keep) if kept]
+
+
+def encode_polyline(coords, precision=5):
+    """Google encoded polyline (the format OSRM returns with geometries=polyline)."""
+    factor = 10 ** precision
+    chars, prev_lat, prev_lon = [], 0, 0
+    for lat, lon in coords:
+        lat, lon = round(lat * factor), round(lon * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chars.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chars.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return "".join(chars)
+
+
+def decode_polyline(polyline, precision=5):
+    """[(lat, lon)] from an encoded polyline."""
+    factor = 10 ** precision
+    coords, index, lat, lon = [], 0, 0, 0
+    while index < len(polyline):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lat / factor, lon / factor))
+    return coords
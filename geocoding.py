@@ -0,0 +1,198 @@
+"""Reverse geocoding (latitude/longitude -> place name) shared by all the apps.
+
+Every lookup goes through three levels:
+  1. an in-memory LRU (per process, microseconds),
+  2. a persistent SQLite cache file on disk (shared by every process),
+  3. Nominatim, only when both caches miss.
+
+Coordinates are quantized to PRECISION decimal places before lookup, so points
+a few metres apart share one cache entry. Disk entries expire after
+TTL_SECONDS and the table is trimmed to MAX_DISK_ENTRIES. Only real place
+names are stored; a failed or empty answer is remembered in memory for
+FAILURE_TTL_SECONDS so reruns don't retry it at once.
+
+Requests to Nominatim are spaced MIN_REQUEST_INTERVAL apart across all
+threads of the process, as its usage policy asks (at most 1 request/s).
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import requests
+
+import profiling
+from ttl_cache import TTLCache
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/reverse"
+HEADERS = {"User-Agent": "AccidentReportApp/1.0"}
+NOT_FOUND = "Location not found"
+
+CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", "geocode_cache.db")
+PRECISION = 4                     # 4 decimal places is roughly 11 m
+TTL_SECONDS = 30 * 24 * 3600      # place names rarely change; refresh monthly
+MAX_DISK_ENTRIES = 100_000
+MAX_MEMORY_ENTRIES = 4096
+REQUEST_TIMEOUT = 10
+MIN_REQUEST_INTERVAL = 1.0        # seconds between Nominatim requests
+FAILURE_TTL_SECONDS = 5 * 60      # retry a failed or empty lookup after this
+EVICT_EVERY = 500                 # run disk eviction after this many writes
+
+_memory = TTLCache(maxsize=MAX_MEMORY_ENTRIES, ttl=TTL_SECONDS)
+_session = requests.Session()
+_session.headers.update(HEADERS)
+
+_disk_lock = threading.Lock()
+_disk = None
+_writes_since_evict = 0
+
+_request_lock = threading.Lock()
+_next_request_at = 0.0
+
+
+def _quantize(lat, lon):
+    """Return the cache key for a coordinate, or None if it is not usable."""
+    try:
+        return f"{round(float(lat), PRECISION)},{round(float(lon), PRECISION)}"
+    except (TypeError, ValueError):
+        return None
+
+
+def _disk_conn():
+    global _disk
+    if _disk is None:
+        _disk = sqlite3.connect(CACHE_PATH, check_same_thread=False, timeout=5)
+        _disk.execute("PRAGMA journal_mode=WAL")
+        _disk.execute("""CREATE TABLE IF NOT EXISTS geocode_cache (
+                            key TEXT PRIMARY KEY,
+                            place TEXT,
+                            fetched_at REAL
+                        )""")
+        _disk.execute("CREATE INDEX IF NOT EXISTS idx_geocode_fetched ON geocode_cache (fetched_at)")
+        _disk.commit()
+    return _disk
+
+
+def _disk_get_many(keys):
+    """Fetch unexpired entries for `keys` from the disk cache as a dict."""
+    found = {}
+    cutoff = time.time() - TTL_SECONDS
+    keys = list(keys)
+    with _disk_lock:
+        conn = _disk_conn()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, place FROM geocode_cache WHERE key IN ({placeholders}) AND fetched_at >= ?",
+                (*chunk, cutoff),
+            ).fetchall()
+            found.update(rows)
+    return found
+
+
+def _disk_put_many(items):
+    """Store {key: place} in the disk cache and evict old entries now and then."""
+    global _writes_since_evict
+    if not items:
+        return
+    now = time.time()
+    with _disk_lock:
+        conn = _disk_conn()
+        conn.executemany(
+            "INSERT OR REPLACE INTO geocode_cache (key, place, fetched_at) VALUES (?, ?, ?)",
+            [(key, place, now) for key, place in items.items()],
+        )
+        _writes_since_evict += len(items)
+        if _writes_since_evict >= EVICT_EVERY:
+            _writes_since_evict = 0
+            conn.execute("DELETE FROM geocode_cache WHERE fetched_at < ?", (now - TTL_SECONDS,))
+            conn.execute(
+                """DELETE FROM geocode_cache WHERE key IN (
+                       SELECT key FROM geocode_cache ORDER BY fetched_at DESC LIMIT -1 OFFSET ?
+                   )""",
+                (MAX_DISK_ENTRIES,),
+            )
+        conn.commit()
+
+
+def _wait_for_turn():
+    """Block until this thread may send the next Nominatim request."""
+    global _next_request_at
+    with _request_lock:  # held while sleeping, so waiting threads go one at a time
+        delay = _next_request_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        _next_request_at = time.monotonic() + MIN_REQUEST_INTERVAL
+
+
+def _fetch(key):
+    """Ask Nominatim for the place name of a quantized key.
+
+    Returns None on network errors, error responses and answers without a name.
+    """
+    lat, lon = key.split(",")
+    _wait_for_turn()
+    try:
+        with profiling.span("nominatim.reverse"):
+            response = _session.get(
+                NOMINATIM_URL,
+                params={"lat": lat, "lon": lon, "format": "json"},
+                timeout=REQUEST_TIMEOUT,
+            )
+        response.raise_for_status()
+        return response.json().get("display_name")
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def get_place_names(coords):
+    """Convert a sequence of (lat, lon) pairs to place names, in the same order.
+
+    Duplicate and nearby coordinates are looked up once, disk hits are read in
+    a single query and only the remaining misses go to the network.
+    """
+    keys = [_quantize(lat, lon) for lat, lon in coords]
+    results = {}
+
+    missing = set()
+    for key in keys:
+        if key is None or key in results:
+            continue
+        place = _memory.get(key)
+        if place is None:
+            missing.add(key)
+        else:
+            results[key] = place
+
+    if missing:
+        on_disk = _disk_get_many(missing)
+        for key, place in on_disk.items():
+            _memory.set(key, place)
+        results.update(on_disk)
+        missing -= on_disk.keys()
+
+    fetched = {}
+    for key in missing:
+        place = _fetch(key)
+        if place is None:
+            # Kept briefly in memory only, so it is asked again later
+            results[key] = NOT_FOUND
+            _memory.set(key, NOT_FOUND, ttl=FAILURE_TTL_SECONDS)
+            continue
+        fetched[key] = place
+        _memory.set(key, place)
+    _disk_put_many(fetched)
+    results.update(fetched)
+
+    return [results.get(key, NOT_FOUND) if key is not None else NOT_FOUND for key in keys]
+
+
+def get_place_name(lat, lon):
+    """Convert latitude and longitude to a human-readable place name."""
+    key = _quantize(lat, lon)
+    if key is not None:
+        place = _memory.get(key)
+        if place is not None:
+            return place
+    return get_place_names([(lat, lon)])[0]
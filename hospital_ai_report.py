@@ -0,0 +1,51 @@
+"""AI report section of the hospital accident details page ("Ask to AI").
+
+Imported by hospitalapp.py only when the button is pressed, so the ollama
+client is not loaded for the other pages.
+"""
+import streamlit as st
+
+import triage  # AI reports: cached per vitals, prefetched by the ambulance, streamed here
+
+
+def show_ai_report(patient_medical_info):
+    # Custom CSS for box design
+    st.markdown("""
+        <style>
+            .data-box {
+                border: 2px solid #4CAF50;
+                border-radius: 12px;
+                background-color: #f0f7f4;
+                padding: 15px;
+                margin-top: 10px;
+                box-shadow: 4px 4px 10px rgba(0, 0, 0, 0.1);
+            }
+            .title {
+                font-weight: bold;
+                color: #4CAF50;
+                font-size: 18px;
+            }
+            .content {
+                color: #333;
+                font-size: 16px;
+                line-height: 1.5;
+            }
+        </style>
+    """, unsafe_allow_html=True)
+
+    # Data display, redrawn as tokens arrive (instant when the report is cached)
+    report_box = st.empty()
+    report = ""
+    try:
+        for chunk in triage.stream_report(triage.vitals_from_row(patient_medical_info)):
+            report += chunk
+            report_box.markdown(f"""
+                <div class="data-box">
+                    <div class="title">🤖 AI Recommended</div>
+                    <div class="content">
+                        {report}<br>
+                    </div>
+                </div>
+            """, unsafe_allow_html=True)
+    except triage.TriageError as exc:
+        st.error(f"AI report unavailable: {exc}")
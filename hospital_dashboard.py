@@ -0,0 +1,131 @@
+"""Dashboard pages of the hospital app: hospital status, the accidents assigned
+to it and the details of one accident.
+
+The face match and the AI report on the details page live in
+hospital_face_search.py and hospital_ai_report.py and are imported only when
+they are shown.
+"""
+from datetime import datetime
+
+import streamlit as st
+
+import db
+import events
+import lifecycle
+import media_pipeline
+import media_view  # Thumbnails first, originals on demand
+from geocoding import get_place_name, get_place_names
+from map_render import Marker, show_route_map  # Read-only route maps, rendered once
+from routing import get_route
+
+
+# --- Accident List ---
+def show_accident_list(hospital):
+    hospital_id = hospital[0]
+    st.title("🏥 Hospital Dashboard")
+    st.write(f"**Hospital Name:** {hospital[2]}")
+    st.write(f"**Status:** {hospital[4]}")
+
+    # Update Hospital Status
+    status = st.radio("Update Status", ["Ready", "Not Ready"], index=0 if hospital[4] == "Ready" else 1)
+    if st.button("Update Status", key="update_status_button"):
+        db.set_hospital_status(hospital_id, status)
+        st.success("Status updated successfully!")
+        st.rerun()
+
+    # --- Accident List with Date Selection ---
+    st.subheader("Accidents Assigned to This Hospital")
+    selected_date = st.date_input("Select Date", datetime.today())
+    accidents = db.list_hospital_reports_on_date(hospital_id, selected_date)
+    if accidents:
+        # Resolve every place name in one cached bulk lookup
+        places = get_place_names([(accident[3], accident[4]) for accident in accidents])
+        for accident, place in zip(accidents, places):
+            if st.button(f"Accident ID: {accident[0]} - Reported by: {accident[2]} - Location: {place}"):
+                st.session_state.hospital_selected_accident = accident[0]
+                st.rerun()
+    else:
+        st.info("No accidents assigned to this hospital on this date.")
+
+    # Refresh the list when an ambulance heads here or submits a patient's vitals
+    events.watch("hospital", lambda after_id: db.list_events_since(
+        after_id, [events.HOSPITAL_ASSIGNED, events.MEDICAL_INFO_SUBMITTED], hospital_id=hospital_id))
+
+
+# --- Accident Details Page ---
+def show_accident_details(hospital):
+    st.title("🚨 Accident Details")
+    accident_details = db.get_report(st.session_state.hospital_selected_accident)
+    if accident_details:
+
+        # Fetch ambulance driver details
+        if accident_details[9]:  # If an ambulance driver is assigned
+            ambulance_driver = db.get_driver(accident_details[9])
+            if ambulance_driver:
+                st.subheader("Ambulance Driver Details")
+                st.write(f"**Driver Name:** {ambulance_driver[2]}")
+                st.write(f"**Driver Phone:** {ambulance_driver[1]}")
+                st.write(f"**Driver Location:** {get_place_name(ambulance_driver[5],ambulance_driver[6])}")
+
+        # Admission is the last step of the report's lifecycle (see lifecycle.py)
+        st.write(f"**Patient Status:** {accident_details[11]}")
+        state = accident_details[15]
+        if lifecycle.can_enter(state, lifecycle.ADMITTED) and st.button("Patient Admitted"):
+            db.advance_report(accident_details[0], lifecycle.ADMITTED, current=state)
+            st.rerun()
+
+        # Fetch patient medical information
+        patient_medical_info = db.get_medical_info(st.session_state.hospital_selected_accident)
+        if patient_medical_info:
+            st.subheader("Patient Medical Information")
+            st.write(f"**Pulse Rate:** {patient_medical_info[3]}")
+            st.write(f"**Oxygen Saturation:** {patient_medical_info[4]}")
+            st.write(f"**Blood Pressure:** {patient_medical_info[5]}")
+            st.write(f"**Fractures Detected:** {patient_medical_info[6]}")
+            st.write(f"**Blood Clotting Rate:** {patient_medical_info[7]}")
+            st.write(f"**Head Injury:** {patient_medical_info[8]}")
+            st.write(f"**Burns/External Wounds:** {patient_medical_info[9]}")
+            st.write(f"**Remarks:** {patient_medical_info[10]}")
+            victim_media = db.list_patient_media(patient_medical_info[0])
+            photo_hashes = [sha256 for sha256, kind, _, _ in victim_media if kind == "photo"]
+            for sha256, kind, filename, _ in victim_media:
+                if kind == "video":
+                    st.subheader("Uploaded Video")
+                media_view.show_media(sha256, kind, filename or "Uploaded Photo", width=200,
+                                      key=f"hospital_media_{accident_details[0]}_{sha256}")
+
+            # --- Face Recognition for Previous Records ---
+            if photo_hashes:  # Check if an image is uploaded
+                from hospital_face_search import show_victim_match
+                show_victim_match(hospital, accident_details, patient_medical_info,
+                                  lambda: media_pipeline.detection_images(photo_hashes))
+
+
+        # Display the map with the route
+        acc_lat, acc_lon = accident_details[12], accident_details[13]
+        route = get_route((hospital[5], hospital[6]), (acc_lat, acc_lon))
+        eta = route.duration_s / 60  # Convert seconds to minutes
+        eta_with_delay = eta * 2  # Adding a 20% delay factor
+        st.write(f"**Estimated Time of Arrival (ETA):** {eta_with_delay:.2f} minutes (including possible delays)")
+        if route.source == "estimate":
+            st.warning("Road routing is unavailable, showing a straight-line estimate.")
+
+        # Display the route on the map
+        show_route_map(((hospital[5] + acc_lat) / 2, (hospital[6] + acc_lon) / 2),
+                       [Marker(hospital[5], hospital[6], "Hospital", "hospital", "blue"),
+                        Marker(acc_lat, acc_lon, "Accident", "ambulance", "red")],
+                       route.polyline, color="blue", weight=2.5, opacity=1)
+
+        # Display the AI recommended Department and doctor
+        if st.button("Ask to AI"):
+            if patient_medical_info:
+                from hospital_ai_report import show_ai_report
+                show_ai_report(patient_medical_info)
+            else:
+                st.error("Sorry Data is not available.")
+
+
+        # Back to Accident List
+        if st.button("Back to Accident List"):
+            st.session_state.hospital_selected_accident = None
+            st.rerun()
@@ -0,0 +1,126 @@
+"""Face search pages of the hospital app: find an old patient by photo and
+match the victim of an accident against the old patient records.
+
+Imported by hospitalapp.py only when one of these pages is opened, so the
+face stack (numpy, the face index, the face worker pool) is not loaded for
+the login or dashboard pages.
+"""
+import streamlit as st
+
+import db
+import faces
+import telegram_outbox  # Messages to relatives are queued and sent in the background
+from face_index import FaceIndex
+
+
+# --- Face index over old patient records (loaded once per server process) ---
+@st.cache_resource
+def get_face_index():
+    return FaceIndex()
+
+
+# Delivery status of the last message queued for a relative (set TELEGRAM_BOT_TOKEN to send)
+@st.fragment(run_every=1)
+def show_telegram_status(message_id):
+    message = telegram_outbox.get_message(message_id)
+    if message is None:
+        return
+    status, attempts, last_error, sent_at = message
+    if status == telegram_outbox.SENT:
+        st.success(f"Message delivered at {sent_at}.")
+    elif status == telegram_outbox.FAILED:
+        st.error(f"Message could not be delivered after {attempts} attempts: {last_error}")
+    elif attempts:
+        st.info(f"Sending message (attempt {attempts})...")
+    else:
+        st.info("Message queued.")
+
+
+# --- Find Old Patient Details Page ---
+def show_find_patient():
+    st.title("🔍 Find Old Patient Details")
+    faces.get_pool()  # start the workers (and their dlib models) while the photo is being picked
+    uploaded_image = st.file_uploader("Upload Patient Image", type=["jpg", "jpeg", "png"])
+
+    if st.button("Search in Records"):
+        if uploaded_image:
+            uploaded_image_bytes = uploaded_image.read()
+            with st.spinner("Detecting face..."):
+                uploaded_image_encoding = faces.recognize_face(uploaded_image_bytes)
+
+            if uploaded_image_encoding:
+                # Nearest stored faces with their distances; only the matches are read from the DB
+                matches = get_face_index().search(uploaded_image_encoding, k=3)
+                distances = dict(matches)
+                old_patient_details = sorted(db.get_old_patients(list(distances)), key=lambda row: distances[row[13]])
+                found = False
+
+                for patient in old_patient_details:
+                    st.image(patient[12], caption="Patient Image", width=200)  # Display patient image
+
+                    # Display details in left-aligned format
+                    st.write("### Patient Details")
+                    st.write(f"**Match Distance:** {distances[patient[13]]:.3f} (lower is closer)")
+                    st.write(f"**Name:** {patient[0]}")
+                    st.write(f"**Age:** {patient[1]}")
+                    st.write(f"**Gender:** {patient[2]}")
+                    st.write(f"**Place:** {patient[3]}")
+                    st.write(f"**Phone:** {patient[4]}")
+                    st.write(f"**Emergency Contact:** {patient[5]}")
+                    st.write(f"**Telegram ID:** {patient[6]}")
+                    st.write(f"**Medical History:** {patient[7]}")
+                    st.write(f"**Treatment:** {patient[8]}")
+                    st.write(f"**Lab Reports:** {patient[9]}")
+                    st.write(f"**Doctor Notes:** {patient[10]}")
+                    st.write(f"**Remarks:** {patient[11]}")
+                    st.write("---")
+
+                    found = True
+
+                if not found:
+                    st.warning("No matching face found in the database.")
+            else:
+                st.warning("No face detected in the uploaded image.")
+        else:
+            st.warning("Please upload a photo to search.")
+
+
+# --- Face Recognition for Previous Records (accident details page) ---
+def show_victim_match(hospital, accident_details, patient_medical_info, photos):
+    """Best old-patient match for the victim; `photos` is a callable returning the photo bytes."""
+    st.subheader("Face Recognition for Previous Records")
+
+    # Encoding is computed once when the ambulance submits the form
+    uploaded_image_encoding = patient_medical_info[12]
+    if uploaded_image_encoding is None:
+        # Older rows (or a submission still being encoded): compute once and store it
+        with st.spinner("Detecting face..."):
+            uploaded_image_encoding = faces.store_victim_encoding(patient_medical_info[0], photos())
+
+    if uploaded_image_encoding:
+        # Best match from the face index; only that row is read from the DB
+        matches = get_face_index().search(uploaded_image_encoding, k=1)
+        old_patient_detials = db.get_old_patients([matches[0][0]]) if matches else []
+        found = False
+        for patient in old_patient_detials:
+            st.write(f"**Name:** {patient[0]}")
+            st.write(f"**Age:** {patient[1]}")
+            st.write(f"**Gender:** {patient[2]}")
+            st.write(f"**Medical History:** {patient[7]}")
+            st.write(f"**Treatment:** {patient[8]}")
+            st.write(f"**Lab Reports:** {patient[9]}")
+            st.write(f"**Doctor Notes:** {patient[10]}")
+            st.write(f"**Remarks:** {patient[11]}")
+            st.image(patient[12], caption="Patient Image", width=200)
+            st.write(f"**Match Distance:** {matches[0][1]:.3f} (lower is closer)")
+            found = True
+        if not found:
+            st.warning("No matching face found in the database.")
+        if found:
+            if st.button("Send Message to relative"):
+                message = f"Dear family member, {patient[0]} has been admitted to {hospital[2]} due to an accident and is under medical care. Please visit the hospital or contact us at {hospital[1]} for details."
+                st.session_state[f"hospital_telegram_message_{accident_details[0]}"] = telegram_outbox.send(patient[6], message)
+            if st.session_state.get(f"hospital_telegram_message_{accident_details[0]}"):
+                show_telegram_status(st.session_state[f"hospital_telegram_message_{accident_details[0]}"])
+    else:
+        st.warning("No face detected in the uploaded image.")
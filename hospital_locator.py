@@ -0,0 +1,96 @@
+"""Nearest-ready-hospital lookup backed by an SQLite R*Tree.
+
+ready_hospitals_rtree holds one point per hospital whose status is 'Ready'.
+Triggers on the hospitals table keep it current when a hospital registers,
+moves or changes status, so every process sees the same index without any
+cache invalidation. A lookup searches a growing bounding box around the
+accident and ranks the candidates by haversine distance.
+"""
+import sqlite3
+
+from geo import bounding_box, haversine_km
+
+START_RADIUS_KM = 5
+MAX_RADIUS_KM = 2000
+
+
+SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS ready_hospitals_rtree
+           USING rtree(id, min_lat, max_lat, min_lon, max_lon)""",
+    """CREATE TRIGGER IF NOT EXISTS hospitals_rtree_insert AFTER INSERT ON hospitals
+       WHEN NEW.status = 'Ready' AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+       BEGIN
+           INSERT OR REPLACE INTO ready_hospitals_rtree
+           VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS hospitals_rtree_update AFTER UPDATE OF status, latitude, longitude ON hospitals
+       BEGIN
+           DELETE FROM ready_hospitals_rtree WHERE id = OLD.id;
+           INSERT INTO ready_hospitals_rtree
+           SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+           WHERE NEW.status = 'Ready' AND NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS hospitals_rtree_delete AFTER DELETE ON hospitals
+       BEGIN
+           DELETE FROM ready_hospitals_rtree WHERE id = OLD.id;
+       END""",
+)
+
+
+def ensure_index(conn):
+    """Create the R*Tree and its triggers, and fill it on first creation.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'ready_hospitals_rtree'"
+    ).fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild_index(conn)
+
+
+def rebuild_index(conn):
+    """Repopulate the R*Tree from the hospitals table."""
+    conn.execute("DELETE FROM ready_hospitals_rtree")
+    conn.execute("""INSERT INTO ready_hospitals_rtree
+                    SELECT id, latitude, latitude, longitude, longitude FROM hospitals
+                    WHERE status = 'Ready' AND latitude IS NOT NULL AND longitude IS NOT NULL""")
+
+
+def _rank(candidates, lat, lon):
+    ranked = [(row[0], row[1], row[2], haversine_km(lat, lon, row[1], row[2])) for row in candidates]
+    ranked.sort(key=lambda row: row[3])
+    return ranked
+
+
+def _scan(conn, lat, lon, k):
+    # Fallback when the R*Tree has not been created yet (or rtree is not compiled in)
+    rows = conn.execute("""SELECT id, latitude, longitude FROM hospitals
+                           WHERE status = 'Ready' AND latitude IS NOT NULL AND longitude IS NOT NULL""").fetchall()
+    return _rank(rows, lat, lon)[:k]
+
+
+def nearest_ready_hospitals(conn, lat, lon, k=1):
+    """Return up to k (hospital_id, latitude, longitude, distance_km) tuples, nearest first."""
+    radius = START_RADIUS_KM
+    try:
+        while True:
+            min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+            candidates = conn.execute(
+                """SELECT h.id, h.latitude, h.longitude
+                   FROM ready_hospitals_rtree t JOIN hospitals h ON h.id = t.id
+                   WHERE t.max_lat >= ? AND t.min_lat <= ? AND t.max_lon >= ? AND t.min_lon <= ?""",
+                (min_lat, max_lat, min_lon, max_lon),
+            ).fetchall()
+            ranked = _rank(candidates, lat, lon)
+            # Only hospitals inside the search circle are guaranteed to be the nearest ones
+            within = [row for row in ranked if row[3] <= radius]
+            if len(within) >= k or radius >= MAX_RADIUS_KM:
+                if len(within) >= k:
+                    return within[:k]
+                return _scan(conn, lat, lon, k)
+            radius *= 2
+    except sqlite3.OperationalError:
+        return _scan(conn, lat, lon, k)
@@ -0,0 +1,50 @@
+"""Patient registry page of the hospital app: add an old patient record.
+
+Imported by hospitalapp.py only when the page is opened.
+"""
+import streamlit as st
+
+import db
+import faces
+from hospital_face_search import get_face_index
+
+
+# --- Add Old Patient Details Page ---
+def show_add_patient():
+    st.title("📝 Add Old Patient Details")
+    faces.get_pool()  # start the workers (and their dlib models) while the form is being filled in
+    with st.form("add_patient_form"):
+        # Patient Details
+        name = st.text_input("Patient Name")
+        age = st.number_input("Age", min_value=0, max_value=120, step=1)
+        gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+        place = st.text_input("Place")
+        phone = st.text_input("Contact Number")
+        emergency_contact = st.text_input("Emergency Contact")
+        telegram_id = st.text_input("Telegram ID")
+
+        # Medical History & Treatment
+        medical_history = st.text_area("Medical History")
+        treatment = st.text_area("Treatment Plan")
+        lab_reports = st.text_area("Lab Reports & Diagnostics")
+        doctor_notes = st.text_area("Doctor's Notes")
+        medical_info = st.text_area("Remark")
+
+        # Face photo Capture
+        image = st.file_uploader("Upload Patient Image", type=["jpg", "jpeg", "png"])
+
+        submitted = st.form_submit_button("Add Patient")
+        if submitted:
+            if name and phone and medical_info and image:
+                # Convert image to binary data
+                image_bytes = image.read()
+                with st.spinner("Detecting face..."):
+                    image_encoding = faces.recognize_face(image_bytes)
+                # Insert into old_patient_records table
+                patient_id = db.insert_old_patient(name, age, gender, place, phone, emergency_contact, telegram_id,
+                                                   medical_history, treatment, lab_reports, doctor_notes, medical_info,
+                                                   image_bytes, image_encoding)
+                get_face_index().add(patient_id, image_encoding)
+                st.success("Patient details added successfully!")
+            else:
+                st.error("Please upload data properly.")
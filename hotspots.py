@@ -0,0 +1,240 @@
+"""Accident hotspots for the police dashboard.
+
+Report coordinates for a date range are loaded as NumPy arrays and binned
+into geohash cells of PRECISION characters (about 150 x 150 m at 7). The
+binning is done on integers: a geohash cell is a pair of lat/lon bin numbers
+with 5*precision bits between them, so a cell key is computed for every
+point at once, and a coarser cell is the same key shifted right.
+
+Per-cell aggregates (count, coordinate sums) are cached per calendar month,
+in memory and, for whole months, in the report_tiles_monthly table so they
+survive restarts. Each piece is tagged with the month's report count from
+the trigger-maintained counters (stats.py) and its count of coordinate edits
+(report_coordinate_changes, kept by a trigger too): a month where either
+changed is rebuilt from its reports, every other month is reused. A year of data is
+then a merge of twelve small arrays instead of a million-row query.
+
+Hotspots are found with grid-based density clustering: cells with at least
+min_count reports are dense, and 8-connected dense cells form one hotspot.
+The connected components are labelled with vectorized min-label propagation.
+
+    python hotspots.py [--days 365] [--min-count 5]    # timings on the configured database
+"""
+import argparse
+import itertools
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+import db
+from ttl_cache import TTLCache
+
+PRECISION = 7
+MIN_COUNT = 5
+TOP_N = 10
+MAX_HEAT_CELLS = 5000         # heatmap cells are coarsened until there are at most this many
+CACHE_TTL_SECONDS = 24 * 3600  # entries are keyed by the month versions, so this only bounds memory
+
+Tiles = namedtuple("Tiles", "precision keys counts lat_sums lon_sums")
+Hotspot = namedtuple("Hotspot", "lat lon count cells peak")
+Analysis = namedtuple("Analysis", "tiles hotspots heat")
+
+POINTS_SQL = """SELECT lat, lon FROM reports
+                WHERE timestamp >= ? AND timestamp < ? AND lat IS NOT NULL AND lon IS NOT NULL"""
+
+COORDINATE_CHANGES_SQL = "SELECT month, changes FROM report_coordinate_changes WHERE month >= ? AND month <= ?"
+
+STORED_TILES_SQL = """SELECT keys, counts, lat_sums, lon_sums FROM report_tiles_monthly
+                      WHERE month = ? AND precision = ? AND report_count = ? AND coordinate_changes = ?"""
+STORE_TILES_SQL = """INSERT OR REPLACE INTO report_tiles_monthly
+                     (month, precision, report_count, coordinate_changes, keys, counts, lat_sums, lon_sums, built_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+_cache = TTLCache(maxsize=256, ttl=CACHE_TTL_SECONDS)
+
+
+def _bits(precision):
+    """(lat bits, lon bits) of a geohash of `precision` characters; longitude gets the odd bit."""
+    lat_bits = 5 * precision // 2
+    return lat_bits, 5 * precision - lat_bits
+
+
+# --- Loading and binning ---
+def load_points(start_day, end_day):
+    """(lats, lons) of the reports created in [start_day, end_day)."""
+    with db.connection() as conn:
+        cursor = conn.execute(POINTS_SQL, (db.day_range(start_day)[0], db.day_range(end_day)[0]))
+        flat = np.fromiter(itertools.chain.from_iterable(cursor), dtype=np.float64)
+    return flat[0::2], flat[1::2]
+
+
+def bin_points(lats, lons, precision=PRECISION):
+    lat_bits, lon_bits = _bits(precision)
+    lat_bins = np.clip(((lats + 90) / 180 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    lon_bins = np.clip(((lons + 180) / 360 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    return _reduce(precision, (lat_bins << lon_bits) | lon_bins, np.ones(len(lats), dtype=np.int64), lats, lons)
+
+
+def _reduce(precision, keys, counts, lat_sums, lon_sums):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return Tiles(precision, unique,
+                 np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64),
+                 np.bincount(inverse, weights=lat_sums, minlength=len(unique)),
+                 np.bincount(inverse, weights=lon_sums, minlength=len(unique)))
+
+
+def merge(tiles_list, precision=PRECISION):
+    tiles_list = [tiles for tiles in tiles_list if len(tiles.keys)]
+    if not tiles_list:
+        return Tiles(precision, *(np.empty(0, dtype=dtype) for dtype in (np.int64, np.int64, float, float)))
+    return _reduce(precision, *(np.concatenate(column) for column in list(zip(*tiles_list))[1:]))
+
+
+def coarsen(tiles, precision):
+    """The same aggregates on the cells of a shorter geohash."""
+    lat_bits, lon_bits = _bits(tiles.precision)
+    new_lat_bits, new_lon_bits = _bits(precision)
+    lat_bins = (tiles.keys >> lon_bits) >> (lat_bits - new_lat_bits)
+    lon_bins = (tiles.keys & ((1 << lon_bits) - 1)) >> (lon_bits - new_lon_bits)
+    return _reduce(precision, (lat_bins << new_lon_bits) | lon_bins, tiles.counts, tiles.lat_sums, tiles.lon_sums)
+
+
+def _months(start_day, end_day):
+    """[start, end) split at month boundaries."""
+    chunk_start = start_day
+    while chunk_start < end_day:
+        next_month = (chunk_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        yield chunk_start, min(next_month, end_day)
+        chunk_start = next_month
+
+
+def _stored_tiles(month, precision, version):
+    with db.connection() as conn:
+        row = conn.execute(STORED_TILES_SQL, (month, precision, *version)).fetchone()
+    if row is None:
+        return None
+    return Tiles(precision, *(np.frombuffer(blob, dtype=dtype) for blob, dtype
+                              in zip(row, (np.int64, np.int64, np.float64, np.float64))))
+
+
+def _store_tiles(month, precision, version, tiles):
+    with db.connection() as conn:
+        conn.execute(STORE_TILES_SQL, (month, precision, *version, tiles.keys.tobytes(), tiles.counts.tobytes(),
+                                       tiles.lat_sums.tobytes(), tiles.lon_sums.tobytes(), time.time()))
+
+
+def _chunk_tiles(chunk, precision, version):
+    key = (chunk, precision, version)
+    tiles = _cache.get(key)
+    if tiles is None:
+        month = chunk[0].isoformat()[:7]
+        whole_month = chunk[0].day == 1 and chunk[1].day == 1  # _months() never spans more than one month
+        tiles = _stored_tiles(month, precision, version) if whole_month else None
+        if tiles is None:
+            tiles = bin_points(*load_points(*chunk), precision)
+            if whole_month:
+                _store_tiles(month, precision, version, tiles)
+        _cache.set(key, tiles)
+    return tiles
+
+
+def _chunk_versions(start_day, end_day):
+    """[(chunk, (report count, coordinate changes))] for the month pieces of the range, from the counters."""
+    daily = db.report_counts(start_day, end_day, "day")
+    chunks = list(_months(start_day, end_day))
+    with db.connection() as conn:
+        changes = dict(conn.execute(COORDINATE_CHANGES_SQL, (start_day.isoformat()[:7], end_day.isoformat()[:7])))
+    return [(chunk, (sum(count for day, count in daily if chunk[0].isoformat() <= day < chunk[1].isoformat()),
+                     changes.get(chunk[0].isoformat()[:7], 0)))
+            for chunk in chunks]
+
+
+def tile_aggregates(start_day, end_day, precision=PRECISION):
+    """Per-cell aggregates of [start_day, end_day), built from cached per-month pieces."""
+    return merge([_chunk_tiles(chunk, precision, version) for chunk, version in _chunk_versions(start_day, end_day)],
+                 precision)
+
+
+# --- Clustering ---
+def clusters(tiles, min_count=MIN_COUNT):
+    """8-connected groups of cells holding at least `min_count` reports, largest first."""
+    dense = tiles.counts >= min_count
+    keys = tiles.keys[dense]
+    if not len(keys):
+        return []
+    _, lon_bits = _bits(tiles.precision)
+    sources, targets = [], []
+    for d_lat, d_lon in itertools.product((-1, 0, 1), repeat=2):
+        if d_lat or d_lon:
+            neighbours = keys + (d_lat << lon_bits) + d_lon
+            index = np.minimum(np.searchsorted(keys, neighbours), len(keys) - 1)  # keys are sorted (np.unique)
+            found = keys[index] == neighbours
+            sources.append(np.nonzero(found)[0])
+            targets.append(index[found])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+
+    # Every cell takes the smallest label among its neighbours until nothing changes;
+    # following labels to their own label (pointer jumping) keeps the rounds few
+    labels = np.arange(len(keys))
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, sources, labels[targets])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    _, component = np.unique(labels, return_inverse=True)
+    counts = np.bincount(component, weights=tiles.counts[dense])
+    lat_sums = np.bincount(component, weights=tiles.lat_sums[dense])
+    lon_sums = np.bincount(component, weights=tiles.lon_sums[dense])
+    cells = np.bincount(component)
+    peaks = np.zeros(len(counts), dtype=np.int64)
+    np.maximum.at(peaks, component, tiles.counts[dense])
+    order = np.argsort(-counts, kind="stable")
+    return [Hotspot(lat_sums[i] / counts[i], lon_sums[i] / counts[i], int(counts[i]), int(cells[i]), int(peaks[i]))
+            for i in order]
+
+
+def heat_points(tiles, max_cells=MAX_HEAT_CELLS):
+    """[[lat, lon, count]] at the mean position of each cell, coarsened to at most `max_cells` cells."""
+    while len(tiles.keys) > max_cells and tiles.precision > 1:
+        tiles = coarsen(tiles, tiles.precision - 1)
+    return np.column_stack((tiles.lat_sums / tiles.counts, tiles.lon_sums / tiles.counts,
+                            tiles.counts)).round(5).tolist()
+
+
+def analyze(start_day, end_day, min_count=MIN_COUNT, top_n=TOP_N, precision=PRECISION):
+    """Analysis(tiles, top `top_n` hotspots, heatmap points) of reports created in [start_day, end_day).
+
+    Reruns of the dashboard with unchanged data are answered from memory.
+    """
+    chunk_versions = _chunk_versions(start_day, end_day)
+    key = ("analysis", tuple(chunk_versions), min_count, top_n, precision)
+    analysis = _cache.get(key)
+    if analysis is None:
+        tiles = merge([_chunk_tiles(chunk, precision, version) for chunk, version in chunk_versions], precision)
+        analysis = Analysis(tiles, clusters(tiles, min_count)[:top_n], heat_points(tiles))
+        _cache.set(key, analysis)
+    return analysis
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accident hotspot timings")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--min-count", type=int, default=MIN_COUNT)
+    args = parser.parse_args()
+
+    end_day = date.today() + timedelta(days=1)
+    start_day = end_day - timedelta(days=args.days)
+    for run in ("first", "restart", "rerun"):
+        if run == "restart":
+            _cache.clear()  # as after a server restart: the month tiles come from the database
+        start = time.perf_counter()
+        tiles, top, heat = analyze(start_day, end_day, args.min_count)
+        print(f"{run:<8} {(time.perf_counter() - start) * 1000:8.1f} ms: {int(tiles.counts.sum())} reports, "
+              f"{len(tiles.keys)} cells, {len(heat)} heatmap cells")
+    for spot in top:
+        print(f"  {spot.lat:.4f}, {spot.lon:.4f}: {spot.count} reports over {spot.cells} cells (peak {spot.peak})")
@@ -0,0 +1,97 @@
+"""Report lifecycle as a state machine with guarded transitions.
+
+    Waiting -> Assigned -> OnScene -> Transporting -> AtHospital -> Admitted
+
+reports.state holds the current state. A transition is one conditional
+UPDATE that names the states it may start from, so a repeated or stale
+request (a Streamlit rerun, two drivers, a retry) matches no row and changes
+nothing. The legacy status columns the pages and counters read
+(ambulance_status, hospital_status) are written by the same statement, and
+the time-to-care stage is recorded only when the state really changed.
+
+Callers read the state first and skip transitions that cannot apply
+(can_enter), so a page that is only being redrawn never opens a write
+transaction at all.
+"""
+import metrics
+
+WAITING = "Waiting"
+ASSIGNED = "Assigned"             # dispatcher matched an ambulance
+ON_SCENE = "OnScene"              # driver marked the accident location reached
+TRANSPORTING = "Transporting"     # medical form submitted, patient on board
+AT_HOSPITAL = "AtHospital"        # driver marked the hospital reached
+ADMITTED = "Admitted"             # hospital admitted the patient
+
+STATES = (WAITING, ASSIGNED, ON_SCENE, TRANSPORTING, AT_HOSPITAL, ADMITTED)
+# The assigned ambulance is busy with the report until it reaches the hospital
+BUSY_STATES = (ASSIGNED, ON_SCENE, TRANSPORTING)
+BUSY_STATES_SQL = ", ".join(f"'{state}'" for state in BUSY_STATES)
+
+# state -> states it may be entered from
+ALLOWED_FROM = {
+    ASSIGNED: (WAITING,),
+    ON_SCENE: (ASSIGNED,),
+    TRANSPORTING: (ON_SCENE,),
+    AT_HOSPITAL: (TRANSPORTING,),
+    ADMITTED: (TRANSPORTING, AT_HOSPITAL),   # the hospital may admit before the driver taps "Reached Hospital"
+}
+
+# Legacy status columns written together with the state
+STATUS_COLUMNS = {
+    TRANSPORTING: {"ambulance_status": "Done"},
+    AT_HOSPITAL: {"hospital_status": "Arrived"},
+    ADMITTED: {"hospital_status": "Admitted"},
+}
+
+# Time-to-care stage recorded on entering a state (see metrics.py)
+STAGES = {
+    ASSIGNED: metrics.ASSIGNED,
+    ON_SCENE: metrics.REACHED_SCENE,
+    TRANSPORTING: metrics.LEFT_SCENE,
+    AT_HOSPITAL: metrics.REACHED_HOSPITAL,
+    ADMITTED: metrics.ADMITTED,
+}
+
+# Current state of existing reports, from the status columns and the recorded stages
+BACKFILL_SQL = """UPDATE reports SET state = CASE
+                      WHEN hospital_status = 'Admitted' THEN 'Admitted'
+                      WHEN hospital_status = 'Arrived' THEN 'AtHospital'
+                      WHEN ambulance_status = 'Done' THEN 'Transporting'
+                      WHEN assigned_to IS NULL THEN 'Waiting'
+                      WHEN EXISTS (SELECT 1 FROM report_transitions t
+                                   WHERE t.report_id = reports.id AND t.stage = 'reached_scene') THEN 'OnScene'
+                      ELSE 'Assigned' END"""
+
+
+def ensure_schema(conn):
+    """Add reports.state and set it for existing reports; runs in the caller's transaction."""
+    if "state" not in [row[1] for row in conn.execute("PRAGMA table_info(reports)")]:
+        conn.execute("ALTER TABLE reports ADD COLUMN state TEXT NOT NULL DEFAULT 'Waiting'")
+    conn.execute(BACKFILL_SQL)
+
+
+def can_enter(current, state):
+    return current in ALLOWED_FROM[state]
+
+
+def transition(conn, report_id, state, **columns):
+    """Move a report into `state` inside the caller's transaction; returns False if it was not allowed.
+
+    `columns` are extra report columns set by the same UPDATE (e.g. assigned_to).
+    """
+    allowed = ALLOWED_FROM[state]
+    values = {"state": state, **STATUS_COLUMNS.get(state, {}), **columns}
+    assignments = ", ".join(f"{column} = ?" for column in values)
+    cursor = conn.execute(
+        f"UPDATE reports SET {assignments} WHERE id = ? AND state IN ({','.join('?' * len(allowed))})",
+        (*values.values(), report_id, *allowed),
+    )
+    if not cursor.rowcount:
+        return False
+    metrics.record(conn, report_id, STAGES[state])
+    return True
+
+
+def get_state(conn, report_id):
+    row = conn.execute("SELECT state FROM reports WHERE id = ?", (report_id,)).fetchone()
+    return row[0] if row else None
@@ -0,0 +1,34 @@
+"""Single Streamlit server for every role.
+
+    streamlit run main.py        (server.sh starts it together with the dispatcher)
+
+One process serves the citizen, ambulance, hospital and police pages, so the
+libraries, the database connection pool and the geocoding, routing and
+face-index caches are loaded once per host instead of once per role. Each
+page keeps its login and page state under its own session keys (auth.py).
+
+The pages are the former standalone apps; `streamlit run police.py` still
+works for developing one page on its own.
+"""
+import streamlit as st
+
+import profiling  # Per-rerun timing, enabled with PROFILING=1
+
+# Must be the first Streamlit call of the run, so it lives here and not in the pages
+st.set_page_config(page_title="Accident Alert System", page_icon="🚨")
+
+# profiling name -> page; the names match the per-app processes they replace
+PAGES = {
+    "app": st.Page("app.py", title="Report an Accident", icon="🚨", url_path="report", default=True),
+    "ambulance": st.Page("ambulance.py", title="Ambulance", icon="🚑", url_path="ambulance"),
+    "hospital": st.Page("hospitalapp.py", title="Hospital", icon="🏥", url_path="hospital"),
+    "police": st.Page("police.py", title="Kerala Police", icon="🚔", url_path="police"),
+}
+
+page = st.navigation(list(PAGES.values()))
+name = next(name for name, candidate in PAGES.items() if candidate.url_path == page.url_path)
+
+profiling.start_rerun(name, export_as="server")  # one metrics file for the whole process
+page.run()
+# Timings of this rerun (sidebar panel and metrics export when PROFILING=1)
+profiling.finish_rerun()
@@ -0,0 +1,111 @@
+"""Route maps rendered once and shown as static HTML.
+
+The route maps on the ambulance and hospital pages are read-only: nobody
+clicks them and the pages never use what st_folium sends back. Building a
+folium.Map and serializing it on every rerun, then mounting the two-way
+st_folium component (which reruns the script on every pan and zoom), was
+most of their cost. show_route_map() instead:
+
+  - simplifies the route for the zoom the map opens at (a pixel at
+    ZOOM_HEADROOM levels closer, so zooming in a little still looks exact),
+  - renders the map HTML once per (route, markers, view) and keeps it in an
+    in-memory TTL cache,
+  - shows it with components.html, a plain iframe with no messages back.
+
+Maps the user interacts with (picking a location) still use st_folium.
+show_heatmap() does the same for the police hotspot heatmap.
+
+    python benchmark.py maps      # payload bytes and render time, before/after
+"""
+from collections import namedtuple
+
+import profiling
+from geo import decode_polyline, metres_per_pixel, simplify
+from ttl_cache import TTLCache
+
+ZOOM_HEADROOM = 2
+CACHE_SIZE = 256
+CACHE_TTL_SECONDS = 15 * 60   # same as the routes themselves (routing.py)
+COORD_DECIMALS = 5            # about 1 m; fewer characters per point in the HTML
+
+Marker = namedtuple("Marker", "lat lon tooltip icon color")
+
+_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+
+
+def route_coords(polyline, lat, zoom):
+    """Points of an encoded route worth drawing at `zoom`."""
+    tolerance = metres_per_pixel(lat, zoom + ZOOM_HEADROOM)
+    return [(round(point[0], COORD_DECIMALS), round(point[1], COORD_DECIMALS))
+            for point in simplify(decode_polyline(polyline), tolerance)]
+
+
+def _add_markers(folium_map, markers):
+    import folium
+
+    for marker in markers:
+        folium.Marker([marker.lat, marker.lon], tooltip=marker.tooltip,
+                      icon=folium.Icon(icon=marker.icon, prefix="fa", color=marker.color)).add_to(folium_map)
+
+
+def build_map(center, markers, polyline=None, zoom=14, color="blue", weight=5, opacity=0.8):
+    import folium  # only when a map is actually rendered
+
+    route_map = folium.Map(location=list(center), zoom_start=zoom)
+    if polyline:
+        folium.PolyLine(route_coords(polyline, center[0], zoom), color=color, weight=weight,
+                        opacity=opacity).add_to(route_map)
+    _add_markers(route_map, markers)
+    return route_map
+
+
+def route_map_html(center, markers, polyline=None, zoom=14, color="blue", weight=5, opacity=0.8):
+    """Full HTML document of the map, rendered once per distinct map."""
+    center = (round(center[0], COORD_DECIMALS), round(center[1], COORD_DECIMALS))
+    key = (center, tuple(markers), polyline, zoom, color, weight, opacity)
+    html = _cache.get(key)
+    if html is None:
+        with profiling.span("map.build"):
+            html = build_map(center, markers, polyline, zoom, color, weight, opacity).get_root().render()
+        _cache.set(key, html)
+    return html
+
+
+def show_route_map(center, markers, polyline=None, zoom=14, color="blue", weight=5, opacity=0.8,
+                   height=400, width=700):
+    """Read-only map with markers and an optional route (a routing.Route polyline)."""
+    import streamlit.components.v1 as components
+
+    html = route_map_html(center, markers, polyline, zoom, color, weight, opacity)
+    with profiling.span("folium.render"):
+        components.html(html, height=height, width=width)
+
+
+def heatmap_html(center, heat, markers=(), zoom=8, radius=12):
+    """Full HTML document of a heatmap of [[lat, lon, weight]], rendered once per distinct map."""
+    center = (round(center[0], COORD_DECIMALS), round(center[1], COORD_DECIMALS))
+    key = ("heatmap", center, tuple(map(tuple, heat)), tuple(markers), zoom, radius)
+    html = _cache.get(key)
+    if html is None:
+        import folium
+        from folium.plugins import HeatMap
+
+        with profiling.span("map.build"):
+            heat_map = folium.Map(location=list(center), zoom_start=zoom)
+            if heat:
+                # Leaflet.heat saturates at a weight of 1
+                top = max(weight for _, _, weight in heat)
+                HeatMap([[lat, lon, weight / top] for lat, lon, weight in heat], radius=radius).add_to(heat_map)
+            _add_markers(heat_map, markers)
+            html = heat_map.get_root().render()
+        _cache.set(key, html)
+    return html
+
+
+def show_heatmap(center, heat, markers=(), zoom=8, radius=12, height=500, width=700):
+    """Read-only heatmap with optional markers."""
+    import streamlit.components.v1 as components
+
+    html = heatmap_html(center, heat, markers, zoom, radius)
+    with profiling.span("folium.render"):
+        components.html(html, height=height, width=width)
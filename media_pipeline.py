@@ -0,0 +1,217 @@
+"""Background preprocessing of stored photos and videos.
+
+After an upload is in the media store, process_async() renders, in a pool
+of worker processes:
+    display   normalized rendition (EXIF-rotated, RGB, at most DISPLAY_SIDE px)
+    thumb     small rendition for list views (THUMB_SIDE px)
+    detect    JPEG at the face-detection resolution (FACE_MAX_SIDE, as faces.py uses)
+    frame-NN  KEYFRAMES frames sampled evenly through a video (cv2), plus a thumb
+
+Renditions are derived files, named after the source hash under
+MEDIA_DIR/renditions/ab/cd/<sha256>/, so they need no database rows and a
+re-upload of the same file reuses them. Pages ask for a rendition with
+best_path(), which falls back to the original until it has been rendered.
+
+Configure with MEDIA_WORKERS and MEDIA_RENDITION_FORMAT (WEBP or JPEG).
+    python media_pipeline.py backfill    # render everything already in the store
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import db
+import media_store
+
+WORKERS = int(os.environ.get("MEDIA_WORKERS", "2"))
+FORMAT = os.environ.get("MEDIA_RENDITION_FORMAT", "WEBP").upper()
+DISPLAY_SIDE = 1600
+THUMB_SIDE = 320
+DETECT_SIDE = int(os.environ.get("FACE_MAX_SIDE", "1024"))
+KEYFRAME_SIDE = 640
+KEYFRAMES = 6
+
+_EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+# name -> (longest side, format, quality)
+RENDITIONS = {
+    "display": (DISPLAY_SIDE, FORMAT, 82),
+    "thumb": (THUMB_SIDE, FORMAT, 75),
+    "detect": (DETECT_SIDE, "JPEG", 95),   # fed to dlib: keep it close to lossless
+}
+
+
+def rendition_dir(sha256, media_dir=None):
+    return os.path.join(media_dir or media_store.MEDIA_DIR, "renditions", sha256[:2], sha256[2:4], sha256)
+
+
+def rendition_path(sha256, name, media_dir=None):
+    fmt = RENDITIONS[name][1] if name in RENDITIONS else FORMAT
+    return os.path.join(rendition_dir(sha256, media_dir), f"{name}.{_EXTENSIONS[fmt]}")
+
+
+def best_path(sha256, name, media_dir=None):
+    """The rendition if it has been made, else the original."""
+    rendered = rendition_path(sha256, name, media_dir)
+    return rendered if os.path.exists(rendered) else media_store.path(sha256, media_dir)
+
+
+def keyframe_paths(sha256, media_dir=None):
+    """Sampled frames of a video, in order ([] until it has been processed)."""
+    return sorted(glob.glob(os.path.join(rendition_dir(sha256, media_dir), "frame-*")))
+
+
+def detection_images(sha256s, media_dir=None):
+    """Bytes of the detection-size copy of each photo (the original if not rendered yet)."""
+    images = []
+    for sha256 in sha256s:
+        with open(best_path(sha256, "detect", media_dir), "rb") as f:
+            images.append(f.read())
+    return images
+
+
+# --- Worker side (runs in the pool processes) ---
+def _save(image, out_path, fmt, quality):
+    # Written next to the target and renamed, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(out_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, fmt, quality=quality)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _downscaled(image, side):
+    copy = image.copy()
+    copy.thumbnail((side, side))
+    return copy
+
+
+def render_photo(sha256, media_dir=None):
+    from PIL import Image, ImageOps
+
+    out_dir = rendition_dir(sha256, media_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    with Image.open(media_store.path(sha256, media_dir)) as image:
+        image.draft("RGB", (DISPLAY_SIDE, DISPLAY_SIDE))  # JPEG: decode at a reduced scale
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    for name, (side, fmt, quality) in RENDITIONS.items():
+        _save(_downscaled(image, side), rendition_path(sha256, name, media_dir), fmt, quality)
+    return list(RENDITIONS)
+
+
+def render_video(sha256, media_dir=None, keyframes=KEYFRAMES):
+    import cv2
+    from PIL import Image
+
+    out_dir = rendition_dir(sha256, media_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    capture = cv2.VideoCapture(media_store.path(sha256, media_dir))
+    try:
+        count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count <= 0:
+            return []
+        # Evenly spaced, away from the (often black) first and last frames
+        positions = sorted({int(count * (i + 0.5) / keyframes) for i in range(keyframes)})
+        names = []
+        for position in positions:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ok, frame = capture.read()
+            if not ok:
+                continue
+            image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))  # OpenCV decodes to BGR
+            name = f"frame-{len(names):02d}"
+            _save(_downscaled(image, KEYFRAME_SIDE), rendition_path(sha256, name, media_dir), FORMAT, 80)
+            if not names:
+                side, fmt, quality = RENDITIONS["thumb"]
+                _save(_downscaled(image, side), rendition_path(sha256, "thumb", media_dir), fmt, quality)
+            names.append(name)
+        return names
+    finally:
+        capture.release()
+
+
+def render(sha256, kind, media_dir=None):
+    """Make every rendition of one stored object; returns the names written."""
+    try:
+        if kind == "photo":
+            return render_photo(sha256, media_dir)
+        if kind == "video":
+            return render_video(sha256, media_dir)
+    except Exception as exc:  # a corrupt upload keeps its original and nothing else
+        print(f"Media pipeline: could not render {sha256[:12]} ({kind}): {exc}")
+    return []
+
+
+# --- Caller side ---
+_pool = None
+_pool_lock = threading.Lock()
+_waiters = ThreadPoolExecutor(max_workers=2, thread_name_prefix="media-pipeline")
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def process(items, media_dir=None):
+    """Render a list of media_store.StoredMedia in parallel; blocks until done."""
+    media_dir = media_dir or media_store.MEDIA_DIR  # workers do not inherit a changed MEDIA_DIR
+    futures = [get_pool().submit(render, item.sha256, item.kind, media_dir)
+               for item in items if item.kind in ("photo", "video")]
+    return [future.result() for future in futures]
+
+
+def process_async(items, then=None):
+    """Render in the background; `then()` runs afterwards (e.g. to encode the victim's face). Returns a Future."""
+    def run():
+        process(items)
+        if then is not None:
+            return then()
+    return _waiters.submit(run)
+
+
+# --- Backfill ---
+def backfill(media_dir=None, batch_size=64):
+    """Render every stored photo and video that has no thumbnail yet; returns (rendered, seconds)."""
+    rows = db.list_stored_media()
+    pending = [media_store.StoredMedia(sha256, size, content_type, None, media_store.kind_of(content_type))
+               for sha256, size, content_type in rows
+               if not os.path.exists(rendition_path(sha256, "thumb", media_dir))]
+    start = time.perf_counter()
+    for offset in range(0, len(pending), batch_size):
+        process(pending[offset:offset + batch_size], media_dir)
+        print(f"  rendered {min(offset + batch_size, len(pending))}/{len(pending)}", end="\r", flush=True)
+    return len(pending), time.perf_counter() - start
+
+
+def _size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Media renditions")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    rendered, seconds = backfill()
+    print(f"\nRendered {rendered} objects in {seconds:.1f} s with {WORKERS} workers.")
+    originals = thumbs = 0
+    for sha256, size, content_type in db.list_stored_media():
+        if media_store.kind_of(content_type) in ("photo", "video"):
+            originals += size
+            thumbs += _size(rendition_path(sha256, "thumb"))
+    if originals:
+        print(f"List views now send {thumbs / 1e6:.1f} MB of thumbnails instead of {originals / 1e6:.1f} MB of originals.")
@@ -0,0 +1,115 @@
+"""Content-addressed storage for uploaded photos and videos.
+
+Files live on disk under MEDIA_DIR, named by the SHA-256 of their contents
+(media/ab/cd/abcd...), so identical uploads are stored once and names never
+collide. Writes stream in CHUNK_SIZE pieces into a temp file that is renamed
+into place once complete; readers get a path, a byte range or a read-only
+memory map instead of a blob pulled through SQLite. The database only keeps
+references (see the media, patient_media and report_media tables in db.py).
+
+Set MEDIA_DIR to keep the store somewhere else.
+"""
+import hashlib
+import io
+import mimetypes
+import mmap
+import os
+import tempfile
+from collections import namedtuple
+
+MEDIA_DIR = os.environ.get("MEDIA_DIR", "media")
+CHUNK_SIZE = 1024 * 1024
+
+# What callers record in the database after a put
+StoredMedia = namedtuple("StoredMedia", "sha256 size content_type filename kind")
+
+
+def path(sha256, media_dir=None):
+    """Filesystem path of a stored object (whether or not it exists)."""
+    return os.path.join(media_dir or MEDIA_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def exists(sha256, media_dir=None):
+    return os.path.exists(path(sha256, media_dir))
+
+
+def kind_of(content_type, filename=None):
+    """'photo', 'video' or 'file', from the MIME type (or the file extension)."""
+    if not content_type and filename:
+        content_type = mimetypes.guess_type(filename)[0]
+    if content_type and content_type.startswith("image/"):
+        return "photo"
+    if content_type and content_type.startswith("video/"):
+        return "video"
+    return "file"
+
+
+# --- Writing ---
+def put_stream(stream, filename=None, content_type=None, media_dir=None):
+    """Store everything readable from a file object; returns StoredMedia.
+
+    The data is hashed while it is copied, so it is never held in memory as a
+    whole. Uploads that are already stored are discarded after hashing.
+    """
+    media_dir = media_dir or MEDIA_DIR
+    tmp_dir = os.path.join(media_dir, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        sha256 = digest.hexdigest()
+        final_path = path(sha256, media_dir)
+        if os.path.exists(final_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(tmp_path, final_path)  # atomic: readers never see a partial file
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if not content_type and filename:
+        content_type = mimetypes.guess_type(filename)[0]
+    return StoredMedia(sha256, size, content_type, filename, kind_of(content_type, filename))
+
+
+def put_bytes(data, filename=None, content_type=None, media_dir=None):
+    """Store an in-memory blob (used when migrating BLOB columns)."""
+    return put_stream(io.BytesIO(data), filename, content_type, media_dir)
+
+
+def put_upload(uploaded_file, media_dir=None):
+    """Store a Streamlit UploadedFile (any file object with .name and .type works)."""
+    uploaded_file.seek(0)
+    return put_stream(uploaded_file, getattr(uploaded_file, "name", None),
+                      getattr(uploaded_file, "type", None), media_dir)
+
+
+# --- Reading ---
+def read(sha256, media_dir=None):
+    with open(path(sha256, media_dir), "rb") as f:
+        return f.read()
+
+
+def read_range(sha256, start, length, media_dir=None):
+    """Read `length` bytes from offset `start` (e.g. for an HTTP Range request)."""
+    with open(path(sha256, media_dir), "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+def open_mmap(sha256, media_dir=None):
+    """Read-only memory map of a stored object; the caller closes it."""
+    with open(path(sha256, media_dir), "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
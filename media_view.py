@@ -0,0 +1,28 @@
+"""Showing stored photos and videos on the pages.
+
+Lists show the small renditions from media_pipeline.py; the original is
+sent to the browser only when it is asked for, so a page with several
+uploads does not transfer full-resolution photos and whole videos on every
+rerun.
+"""
+import streamlit as st
+
+import media_pipeline
+import media_store
+
+
+def show_media(sha256, kind, filename, key, width=None):
+    """One stored object; `key` must be unique on the page (prefix it with the role)."""
+    if kind == "photo":
+        if st.toggle("Full size", key=f"{key}_full"):
+            st.image(media_pipeline.best_path(sha256, "display"), caption=filename)
+        else:
+            st.image(media_pipeline.best_path(sha256, "thumb"), caption=filename, width=width)
+    elif kind == "video":
+        frames = media_pipeline.keyframe_paths(sha256)
+        if frames:
+            st.image(frames, width=160)
+        if st.toggle("Play video", key=f"{key}_play", value=not frames):  # not processed yet: just play it
+            st.video(media_store.path(sha256))
+    else:
+        st.write(f"File: {filename}")
@@ -0,0 +1,187 @@
+"""Report lifecycle transitions and time-to-care metrics.
+
+Every step a report goes through is recorded once in report_transitions with
+the time it happened. The first occurrence wins, so Streamlit reruns and
+retries never move a timestamp:
+    created -> assigned -> reached_scene -> left_scene -> reached_hospital -> admitted
+plus hospital_assigned, which happens while the ambulance is on scene.
+
+INTERVALS pairs stages into the durations that make up time-to-care;
+latencies() gives count, p50, p95, p99 and max per interval for the reports
+created in a window.
+
+    python metrics.py report [--days 7]
+    python metrics.py export [--days 30] [--format csv|json] [--output FILE]
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Stages
+CREATED = "created"                     # citizen submitted the report (app.py)
+ASSIGNED = "assigned"                   # dispatcher matched an ambulance (dispatch.py)
+REACHED_SCENE = "reached_scene"         # driver marked the accident location reached (ambulance.py)
+HOSPITAL_ASSIGNED = "hospital_assigned"
+LEFT_SCENE = "left_scene"               # medical form submitted, patient on board (ambulance.py)
+REACHED_HOSPITAL = "reached_hospital"   # driver marked the hospital reached (ambulance.py)
+ADMITTED = "admitted"                   # hospital admitted the patient (hospitalapp.py)
+
+# (name, label, from stage, to stage)
+INTERVALS = (
+    ("dispatch_wait", "Waiting for an ambulance", CREATED, ASSIGNED),
+    ("to_scene", "Ambulance to scene", ASSIGNED, REACHED_SCENE),
+    ("on_scene", "On scene", REACHED_SCENE, LEFT_SCENE),
+    ("to_hospital", "Scene to hospital", LEFT_SCENE, REACHED_HOSPITAL),
+    ("handover", "Arrival to admission", REACHED_HOSPITAL, ADMITTED),
+    ("time_to_care", "Report to hospital arrival", CREATED, REACHED_HOSPITAL),
+)
+PERCENTILES = (50, 95, 99)
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS report_transitions (
+           report_id INTEGER NOT NULL,
+           stage TEXT NOT NULL,
+           at REAL NOT NULL,            -- unix time
+           PRIMARY KEY (report_id, stage)
+       ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_report_transitions_stage_at ON report_transitions (stage, at)",
+)
+
+# Earlier history, from the report timestamps and the change feed ('utc' reads them as local time)
+BACKFILL_SQL = (
+    """INSERT OR IGNORE INTO report_transitions (report_id, stage, at)
+       SELECT id, 'created', CAST(strftime('%s', timestamp, 'utc') AS REAL) FROM reports
+       WHERE timestamp IS NOT NULL""",
+    """INSERT OR IGNORE INTO report_transitions (report_id, stage, at)
+       SELECT report_id, CASE kind WHEN 'report_assigned' THEN 'assigned'
+                                   WHEN 'hospital_assigned' THEN 'hospital_assigned'
+                                   ELSE 'left_scene' END,
+              CAST(strftime('%s', created_at, 'utc') AS REAL)
+       FROM events WHERE kind IN ('report_assigned', 'hospital_assigned', 'medical_info_submitted')
+       AND report_id IS NOT NULL ORDER BY id""",
+)
+
+
+def ensure_schema(conn):
+    """Create the transitions table and fill it from existing history; runs in the caller's transaction."""
+    for statement in SCHEMA + BACKFILL_SQL:
+        conn.execute(statement)
+
+
+# --- Recording ---
+def record(conn, report_id, stage, at=None):
+    """Record a stage inside the caller's transaction; returns False if it was already recorded."""
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO report_transitions (report_id, stage, at) VALUES (?, ?, ?)",
+        (report_id, stage, time.time() if at is None else at),
+    )
+    return cursor.rowcount == 1
+
+
+# --- Reading ---
+# Every transition of the reports created in [start, end)
+WINDOW_TRANSITIONS_SQL = """SELECT t.report_id, t.stage, t.at FROM report_transitions c
+                            JOIN report_transitions t ON t.report_id = c.report_id
+                            WHERE c.stage = 'created' AND c.at >= ? AND c.at < ?"""
+
+
+def _epoch(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time()).timestamp()
+    return float(value)
+
+
+def durations(conn, start, end):
+    """{interval name: [(report_id, seconds)]} for reports created in [start, end)."""
+    stages = {}
+    for report_id, stage, at in conn.execute(WINDOW_TRANSITIONS_SQL, (_epoch(start), _epoch(end))):
+        stages.setdefault(report_id, {})[stage] = at
+    result = {name: [] for name, _, _, _ in INTERVALS}
+    for report_id, times in sorted(stages.items()):
+        for name, _, from_stage, to_stage in INTERVALS:
+            if from_stage in times and to_stage in times:
+                result[name].append((report_id, times[to_stage] - times[from_stage]))
+    return result
+
+
+def percentile(sorted_values, p):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def latencies(conn, start, end):
+    """[{interval, label, count, p50, p95, p99, max}] in seconds, for reports created in [start, end)."""
+    rows = []
+    by_interval = durations(conn, start, end)
+    for name, label, _, _ in INTERVALS:
+        values = sorted(seconds for _, seconds in by_interval[name])
+        row = {"interval": name, "label": label, "count": len(values)}
+        for p in PERCENTILES:
+            row[f"p{p}"] = percentile(values, p)
+        row["max"] = values[-1] if values else None
+        rows.append(row)
+    return rows
+
+
+# --- Export ---
+def export(conn, start, end, out, fmt="csv"):
+    """Write the per-report durations (csv) or the summary plus durations (json) to a text file."""
+    by_interval = durations(conn, start, end)
+    if fmt == "json":
+        json.dump({
+            "window": [datetime.fromtimestamp(_epoch(start)).isoformat(),
+                       datetime.fromtimestamp(_epoch(end)).isoformat()],
+            "latencies": latencies(conn, start, end),
+            "durations": {name: [{"report_id": report_id, "seconds": seconds} for report_id, seconds in rows]
+                          for name, rows in by_interval.items()},
+        }, out, indent=2)
+        return
+    writer = csv.writer(out)
+    writer.writerow(["report_id", "interval", "seconds"])
+    for name, rows in by_interval.items():
+        for report_id, seconds in rows:
+            writer.writerow([report_id, name, f"{seconds:.3f}"])
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 120:
+        return f"{seconds:.0f} s"
+    return f"{seconds / 60:.1f} min"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-care metrics")
+    parser.add_argument("command", choices=["report", "export"])
+    parser.add_argument("--days", type=int, default=7, help="window: reports created in the last N days")
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--output", help="file to write the export to (default: stdout)")
+    args = parser.parse_args()
+
+    import db  # imported here: db imports this module for its migration
+
+    window_end = datetime.now()
+    window_start = window_end - timedelta(days=args.days)
+    with db.connection() as conn:
+        if args.command == "report":
+            print(f"Reports created {window_start:%Y-%m-%d %H:%M} - {window_end:%Y-%m-%d %H:%M}")
+            print(f"{'interval':<28}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+            for row in latencies(conn, window_start, window_end):
+                print(f"{row['label']:<28}{row['count']:>7}" +
+                      "".join(f"{format_seconds(row[key]):>10}" for key in ("p50", "p95", "p99", "max")))
+        elif args.output:
+            with open(args.output, "w", newline="") as f:
+                export(conn, window_start, window_end, f, args.format)
+        else:
+            export(conn, window_start, window_end, sys.stdout, args.format)
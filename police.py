@@ -1,41 +1,25 @@
+import io
 import streamlit as st
-import sqlite3
-from datetime import datetime
-import requests
-
-# --- Database Connection ---
-conn = sqlite3.connect("accident_reporting.db", check_same_thread=False)
-c = conn.cursor()
-
-# --- Funtion to Convert latitude and longitude into place name            
-def get_place_name(lat, lon): 
-    """Convert latitude and longitude to a human-readable place name.""" 
-    url = f"https://nominatim.openstreetmap.org/reverse?lat={lat}&lon={lon}&format=json" 
-    headers = {"User-Agent": "AccidentReportApp/1.0"} 
-    response = requests.get(url, headers=headers).json() 
-    return response.get("display_name", "Location not found") 
-
-# Configure Page
-st.set_page_config(page_title="Kerala Police Login", page_icon="🚔")
+import pandas as pd
+from datetime import datetime, timedelta
+from geocoding import get_place_name, get_place_names
+from geo import geohash_decode
+import events
+import metrics
+import profiling
+import db  # Shared database access (pooled connections, schema migrations)
+import auth  # Per-role login state (this page is the "police" role)
 
 # Initialize session state variables
-if "logged_in_user" not in st.session_state:
-    st.session_state["logged_in_user"] = None
-if "page" not in st.session_state:
-    st.session_state["page"] = "login"
-if "selected_accident" not in st.session_state:
-    st.session_state["selected_accident"] = None  # Store selected accident ID
-
-# Hide Streamlit default sidebar initially
-if not st.session_state["logged_in_user"]:
-    st.markdown("""
-        <style>
-            [data-testid="stSidebar"] { display: none; }
-        </style>
-    """, unsafe_allow_html=True)
+if "logged_in_police" not in st.session_state:
+    st.session_state["logged_in_police"] = None
+if "police_page" not in st.session_state:
+    st.session_state["police_page"] = "login"
+if "police_selected_accident" not in st.session_state:
+    st.session_state["police_selected_accident"] = None  # Store selected accident ID
 
 # --- Login Page ---
-if st.session_state["page"] == "login":
+if st.session_state["police_page"] == "login":
     st.image("https://keralapolice.gov.in/storage/headers/logo/q9mh5i5Hyy3X3vXvVaJZOuPkY.png", width=200)
     st.title("Kerala Police Admin Login")
     st.markdown("Please enter your administrator credentials to proceed.")
@@ -47,47 +31,146 @@ if st.session_state["page"] == "login":
 
     if submit_button:
         if admin_id == "administrator" and password == "password":  # Replace with real authentication
-            st.session_state["logged_in_user"] = admin_id
-            st.session_state["page"] = "dashboard"
+            auth.login("police", admin_id)
+            st.session_state["police_page"] = "dashboard"
             st.rerun()
         else:
             st.error("Invalid credentials. Please try again.")
 
 # --- Dashboard Page ---
-elif st.session_state["page"] == "dashboard":
+elif st.session_state["police_page"] == "dashboard":
     st.sidebar.title(f"Welcome, Kerala Police")
     if st.sidebar.button("Logout"):
-        st.session_state["logged_in_user"] = None
-        st.session_state["page"] = "login"
-        st.session_state["selected_accident"] = None
+        auth.logout("police")
         st.rerun()
 
-    st.subheader("Police Dashboard")
-    selected_date = st.date_input("Select Date", datetime.today())
-
-    # Query accidents for the selected date
-    c.execute("SELECT id, user_phone, name, location, timestamp FROM reports WHERE DATE(timestamp) = ?", (selected_date,))
-    accidents = c.fetchall()
-
-    if accidents:
-        for accident in accidents:
-            accident_id = accident[0]
-            lat, lon = accident[3].split(', ')
-            accident_label = f"Accident ID: {accident_id} - Reported by: {accident[2]} - Location: {get_place_name(lat, lon)}"
-            if st.button(accident_label, key=f"accident_{accident_id}"):
-                st.session_state["selected_accident"] = accident_id
-                st.session_state["page"] = "details"
-                st.rerun()
+    view = st.sidebar.radio("View", ["Accident List", "Statistics", "Hotspots", "Response Times"], key="police_view")
+
+    if view == "Statistics":
+        st.subheader("Accident Statistics")
+        today = datetime.today().date()
+        date_range = st.date_input("Date Range", (today.replace(day=1), today))
+        bucket = st.selectbox("Group By", ["day", "month", "year", "hour"])
+        if len(date_range) == 2:
+            start_day, end_day = date_range[0], date_range[1] + timedelta(days=1)
+
+            # Every query below reads the counter tables kept by stats.py, not the reports
+            counts = db.report_counts(start_day, end_day, bucket)
+            st.metric("Accidents Reported", sum(count for _, count in counts))
+            if counts:
+                st.bar_chart(pd.DataFrame(counts, columns=[bucket, "Accidents"]).set_index(bucket))
+
+                st.subheader("Ambulance Status")
+                by_status = db.report_counts(start_day, end_day, "day" if bucket == "hour" else bucket,
+                                             "ambulance_status")
+                frame = pd.DataFrame(by_status, columns=["bucket", "status", "Accidents"])
+                frame["status"] = frame["status"].replace("", "Unassigned")
+                st.bar_chart(frame.pivot(index="bucket", columns="status", values="Accidents").fillna(0))
+
+                st.subheader("Average Accidents per Hour of Day")
+                profile = db.report_hourly_profile(start_day, end_day)
+                st.line_chart(pd.DataFrame(profile, columns=["Hour", "Accidents per day"]).set_index("Hour"))
+
+                st.subheader("Busiest Areas")
+                st.caption("Areas of about 5 x 5 km, counted over the whole months in the range.")
+                areas = [(area, count) for area, count in db.report_area_counts(start_day, end_day, 10) if area]
+                places = get_place_names([geohash_decode(area) for area, _ in areas])
+                st.table(pd.DataFrame([(place, count) for place, (_, count) in zip(places, areas)],
+                                      columns=["Area", "Accidents"]))
+
+                st.subheader("Average Accidents per Hour of Day by Area")
+                top_places = dict(zip((area for area, _ in areas[:5]), places[:5]))
+                by_area = pd.DataFrame([(hour, top_places[area], average) for hour, area, average
+                                        in db.report_hourly_profile(start_day, end_day, by_area=True)
+                                        if area in top_places],
+                                       columns=["Hour", "Area", "Accidents per day"])
+                if not by_area.empty:
+                    st.line_chart(by_area.pivot_table(index="Hour", columns="Area",
+                                                      values="Accidents per day", aggfunc="sum").fillna(0))
+            else:
+                st.info("No accidents reported in this range.")
+
+    elif view == "Hotspots":
+        import hotspots  # NumPy and the map renderer load only for this view
+        from map_render import Marker, show_heatmap
+
+        st.subheader("Accident Hotspots")
+        today = datetime.today().date()
+        date_range = st.date_input("Date Range", (today - timedelta(days=364), today), key="hotspot_range")
+        min_count = st.number_input("Accidents per cell to count as dense", min_value=2, value=hotspots.MIN_COUNT,
+                                    help="Cells are about 150 x 150 m; touching dense cells form one hotspot.")
+        if len(date_range) == 2:
+            with profiling.span("hotspots.analyze"):
+                analysis = hotspots.analyze(date_range[0], date_range[1] + timedelta(days=1), min_count)
+            if analysis.heat:
+                st.metric("Accidents Reported", int(analysis.tiles.counts.sum()))
+                top = analysis.hotspots
+                center = (top[0].lat, top[0].lon) if top else tuple(analysis.heat[0][:2])
+                show_heatmap(center, analysis.heat, [Marker(spot.lat, spot.lon, f"#{rank}: {spot.count} accidents",
+                                                            "exclamation-triangle", "red")
+                                                     for rank, spot in enumerate(top, 1)])
+
+                st.subheader(f"Top {len(top)} Hotspots")
+                places = get_place_names([(spot.lat, spot.lon) for spot in top])
+                st.table(pd.DataFrame(
+                    [(rank, place, spot.count, f"{spot.cells * 0.15 * 0.15:.2f}", spot.peak)
+                     for rank, (spot, place) in enumerate(zip(top, places), 1)],
+                    columns=["Rank", "Area", "Accidents", "Area (km²)", "Most in One Cell"],
+                ).set_index("Rank"))
+            else:
+                st.info("No accidents reported in this range.")
+
+    elif view == "Response Times":
+        st.subheader("Time to Care")
+        today = datetime.today().date()
+        date_range = st.date_input("Reports Created", (today - timedelta(days=6), today), key="latency_range")
+        if len(date_range) == 2:
+            start_day, end_day = date_range[0], date_range[1] + timedelta(days=1)
+            latencies = db.report_latencies(start_day, end_day)
+            st.table(pd.DataFrame(
+                [[row["label"], row["count"]] + [metrics.format_seconds(row[key]) for key in ("p50", "p95", "p99", "max")]
+                 for row in latencies],
+                columns=["Stage", "Reports", "p50", "p95", "p99", "Max"],
+            ))
+            chart = pd.DataFrame([(row["label"], row["p50"] / 60, row["p95"] / 60) for row in latencies if row["count"]],
+                                 columns=["Stage", "p50 (min)", "p95 (min)"])
+            if not chart.empty:
+                st.bar_chart(chart.set_index("Stage"))
+
+            export = io.StringIO()
+            db.export_report_latencies(start_day, end_day, export)
+            st.download_button("Export CSV", export.getvalue(), mime="text/csv",
+                               file_name=f"time_to_care_{date_range[0]}_{date_range[1]}.csv")
+
     else:
-        st.info("No accidents reported on this date.")
+        st.subheader("Police Dashboard")
+        selected_date = st.date_input("Select Date", datetime.today())
+
+        # Query accidents for the selected date
+        accidents = db.list_reports_on_date(selected_date)
+
+        if accidents:
+            # Resolve every place name in one cached bulk lookup
+            places = get_place_names([(accident[3], accident[4]) for accident in accidents])
+            for accident, place in zip(accidents, places):
+                accident_id = accident[0]
+                accident_label = f"Accident ID: {accident_id} - Reported by: {accident[2]} - Location: {place}"
+                if st.button(accident_label, key=f"accident_{accident_id}"):
+                    st.session_state["police_selected_accident"] = accident_id
+                    st.session_state["police_page"] = "details"
+                    st.rerun()
+        else:
+            st.info("No accidents reported on this date.")
+
+        # Show new reports as soon as they are submitted
+        events.watch("police", lambda after_id: db.list_events_since(after_id, [events.REPORT_CREATED]))
 
 # --- Accident Details Page ---
-elif st.session_state["page"] == "details":
+elif st.session_state["police_page"] == "details":
     st.title("🚨 Accident Details")
     
-    if st.session_state["selected_accident"] is not None:
-        c.execute("SELECT * FROM reports WHERE id = ?", (st.session_state["selected_accident"],))
-        accident_details = c.fetchone()
+    if st.session_state["police_selected_accident"] is not None:
+        accident_details = db.get_report(st.session_state["police_selected_accident"])
 
         if accident_details:
             st.write(f"**Accident ID:** {accident_details[0]}")
@@ -99,27 +182,25 @@ elif st.session_state["page"] == "details":
 
             # Fetch and display ambulance driver details
             if accident_details[9]:
-                c.execute("SELECT * FROM ambulance_drivers WHERE id = ?", (accident_details[9],))
-                ambulance_driver = c.fetchone()
+                ambulance_driver = db.get_driver(accident_details[9])
                 if ambulance_driver:
                     st.subheader("Ambulance Driver Details")
                     st.write(f"**Driver Name:** {ambulance_driver[2]}")
                     st.write(f"**Driver Phone:** {ambulance_driver[1]}")
 
             # Fetch and display patient medical information
-            c.execute("SELECT * FROM patient_medical_info WHERE accident_id = ?", (st.session_state["selected_accident"],))
-            patient_medical_info = c.fetchone()
+            patient_medical_info = db.get_medical_info(st.session_state["police_selected_accident"])
 
             #if patient_medical_info:
-            #    if patient_medical_info[11]:
-            #        st.image(patient_medical_info[11], caption="Ambulance Driver Uploaded Photo", width=200)
-            #    if patient_medical_info[12]:
-            #        st.subheader("Uploaded Video")
-            #        st.video(patient_medical_info[12])'''
+            #    for sha256, kind, filename, _ in db.list_patient_media(patient_medical_info[0]):
+            #        if kind == "photo":
+            #            st.image(media_store.path(sha256), caption="Ambulance Driver Uploaded Photo", width=200)
+            #        elif kind == "video":
+            #            st.subheader("Uploaded Video")
+            #            st.video(media_store.path(sha256))'''
 
             # Fetch and display details of the assigned hospital
-            c.execute("SELECT * FROM hospitals WHERE id = ?",(accident_details[10],))
-            hospital_details = c.fetchone()
+            hospital_details = db.get_hospital(accident_details[10])
 
             if hospital_details:
                 st.subheader("Hospital Details")
@@ -129,9 +210,6 @@ elif st.session_state["page"] == "details":
 
         # Back button to return to the accident list
         if st.button("Back to Dashboard"):
-            st.session_state["selected_accident"] = None
-            st.session_state["page"] = "dashboard"
+            st.session_state["police_selected_accident"] = None
+            st.session_state["police_page"] = "dashboard"
             st.rerun()
-
-# --- Close Database Connection ---
-conn.close()
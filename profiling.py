@@ -0,0 +1,345 @@
+"""Timing spans for the Streamlit apps and the services behind them.
+
+Off unless PROFILING=1; disabled spans cost one function call. Instrumented
+call sites:
+    nominatim.reverse   geocoding lookups that reach the network
+    osrm.route / graph.route
+    face.decode / face.detect / face.encode (worker time), face.request (round trip), face_index.search
+    sqlite.<function>   every db.connection() block, named after the db function
+    ollama.first_token / ollama.generate
+    folium.render       st_folium calls on the pages
+    rerun.<app>         each whole script run (start_rerun() ... finish_rerun())
+
+    with profiling.span("osrm.route"):
+        ...
+
+    @profiling.timed("face_index.search")
+    def search(...): ...
+
+Durations go into per-process histograms, which are
+  - written as Prometheus text to PROFILING_DIR/<app>-<pid>.prom (node_exporter
+    textfile collector format) and served on http://localhost:PROFILING_PORT/metrics
+    if that is set;
+  - shown per session in a sidebar debug panel drawn by finish_rerun().
+
+With PROFILING_SAMPLE=1 a sampler thread records the script thread's stack
+every SAMPLE_INTERVAL seconds; reruns slower than PROFILING_SLOW_SECONDS are
+written to PROFILING_DIR as collapsed stacks (flamegraph.pl, speedscope),
+keeping the KEEP_SLOW slowest.
+
+A rerun that ends in st.rerun() or st.stop() never reaches finish_rerun(),
+so it is not counted; its spans still are.
+"""
+import bisect
+import functools
+import glob
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _flag(name):
+    return os.environ.get(name, "").lower() not in ("", "0", "false", "no")
+
+
+ENABLED = _flag("PROFILING")
+SAMPLE = _flag("PROFILING_SAMPLE")
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "profiles")
+PORT = int(os.environ.get("PROFILING_PORT", "0"))
+SLOW_RERUN_SECONDS = float(os.environ.get("PROFILING_SLOW_SECONDS", "1.0"))
+SAMPLE_INTERVAL = 0.005
+KEEP_SLOW = 20
+EXPORT_INTERVAL = 1.0    # at most one .prom rewrite per second per process
+HISTORY = 20             # reruns kept in the session debug panel
+
+# Histogram bucket upper bounds in seconds (Prometheus convention)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (an estimate, like histogram_quantile)."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_histograms = {}
+_lock = threading.Lock()
+_local = threading.local()   # the rerun running on this thread
+
+
+def record(name, seconds):
+    """Add one duration to the named histogram (and to the current rerun's spans)."""
+    if not ENABLED:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+    spans = getattr(_local, "spans", None)
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing its block under `name`."""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+
+def timed(name=None):
+    """Decorator timing every call; a no-op when profiling is off."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def caller_name(skip=(), depth=2):
+    """Name of the first calling function not in `skip`, for labelling spans (only call when ENABLED)."""
+    frame = sys._getframe(depth)
+    while frame is not None and frame.f_code.co_name in skip:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "unknown"
+
+
+# --- Prometheus export ---
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text(app=None):
+    """Every histogram in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {name: (list(h.counts), h.sum, h.count) for name, h in sorted(_histograms.items())}
+    extra = f',app="{_label(app)}",pid="{os.getpid()}"' if app else ""
+    lines = ["# HELP accident_span_seconds Duration of instrumented spans and Streamlit reruns.",
+             "# TYPE accident_span_seconds histogram"]
+    for name, (counts, total, count) in snapshot.items():
+        labels = f'span="{_label(name)}"{extra}'
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS + ("+Inf",), counts):
+            cumulative += bucket_count
+            lines.append(f'accident_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"accident_span_seconds_sum{{{labels}}} {total:.6f}")
+        lines.append(f"accident_span_seconds_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+_last_export = 0.0
+
+
+def write_textfile(app, force=False):
+    """Rewrite PROFILING_DIR/<app>-<pid>.prom, at most once per EXPORT_INTERVAL."""
+    global _last_export
+    now = time.monotonic()
+    if not force and now - _last_export < EXPORT_INTERVAL:
+        return
+    _last_export = now
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    path = os.path.join(PROFILING_DIR, f"{app}-{os.getpid()}.prom")
+    with open(path + ".tmp", "w") as f:
+        f.write(prometheus_text(app))
+    os.replace(path + ".tmp", path)   # the collector never reads a half-written file
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    app = None
+
+    def do_GET(self):
+        body = prometheus_text(self.app).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server_started = False
+
+
+def start_http_server(app, port=PORT):
+    """Serve prometheus_text() on /metrics from a daemon thread (once per process)."""
+    global _server_started
+    if _server_started or not port:
+        return
+    _server_started = True
+    handler = type("MetricsHandler", (_MetricsHandler,), {"app": app})
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    except OSError as exc:  # another app already serves this port
+        print(f"Profiling endpoint not started on port {port}: {exc}")
+        return
+    threading.Thread(target=server.serve_forever, name="profiling-http", daemon=True).start()
+
+
+# --- Sampling profiler ---
+def _stack(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Counts the stacks of watched threads every `interval` seconds."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._watched = {}    # thread ident -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, ident):
+        with self._lock:
+            self._watched[ident] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+                self._thread.start()
+
+    def unwatch(self, ident):
+        with self._lock:
+            return self._watched.pop(ident, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident in list(self._watched):
+                    frame = frames.get(ident)
+                    if frame is None:   # the script thread ended without finish_rerun()
+                        del self._watched[ident]
+                    else:
+                        self._watched[ident][_stack(frame)] += 1
+
+
+_sampler = Sampler()
+
+
+def dump_slow_rerun(app, elapsed, stacks):
+    """Write collapsed stacks of a slow rerun and keep only the KEEP_SLOW slowest files."""
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    name = f"slow-{int(elapsed * 1000):07d}ms-{app}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded"
+    with open(os.path.join(PROFILING_DIR, name), "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    for old in sorted(glob.glob(os.path.join(PROFILING_DIR, "slow-*.folded")), reverse=True)[KEEP_SLOW:]:
+        os.remove(old)
+
+
+# --- Streamlit reruns ---
+def start_rerun(app, export_as=None):
+    """Call at the top of a Streamlit script.
+
+    `export_as` names the metrics file and endpoint label when one process
+    serves several apps (main.py); it defaults to `app`.
+    """
+    if not ENABLED:
+        return
+    _local.app = app
+    _local.export_as = export_as or app
+    _local.spans = []
+    _local.start = time.perf_counter()
+    if SAMPLE:
+        _sampler.watch(threading.get_ident())
+    start_http_server(_local.export_as)
+
+
+def finish_rerun():
+    """Call at the end of a Streamlit script: record the rerun, export and draw the debug panel."""
+    if not ENABLED or getattr(_local, "spans", None) is None:
+        return
+    elapsed = time.perf_counter() - _local.start
+    app, spans, export_as = _local.app, _local.spans, _local.export_as
+    _local.spans = None
+    record(f"rerun.{app}", elapsed)
+    if SAMPLE:
+        stacks = _sampler.unwatch(threading.get_ident())
+        if stacks and elapsed >= SLOW_RERUN_SECONDS:
+            dump_slow_rerun(app, elapsed, stacks)
+    write_textfile(export_as)
+    debug_panel(app, elapsed, spans)
+
+
+def debug_panel(app, elapsed, spans):
+    """Sidebar expander with this rerun's spans, recent reruns and process-wide percentiles."""
+    import streamlit as st  # imported here so services can use profiling without streamlit
+
+    history = st.session_state.setdefault("profiling_history", [])
+    history.append(elapsed * 1000)
+    del history[:-HISTORY]
+
+    totals = {}
+    for name, seconds in spans:
+        calls, total = totals.get(name, (0, 0.0))
+        totals[name] = (calls + 1, total + seconds)
+    with _lock:
+        percentiles = [(name, h.count, h.quantile(0.5), h.quantile(0.95)) for name, h in sorted(_histograms.items())]
+
+    with st.sidebar.expander(f"Profiling: {elapsed * 1000:.0f} ms"):
+        st.caption("This rerun")
+        st.table([{"span": name, "calls": calls, "ms": round(total * 1000, 1)}
+                  for name, (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1])])
+        st.caption(f"Last {len(history)} reruns (ms)")
+        st.line_chart(history, height=120)
+        st.caption(f"Process-wide ({app}, pid {os.getpid()}), bucket upper bounds")
+        st.table([{"span": name, "count": count, "p50 ≤ ms": p50 * 1000, "p95 ≤ ms": p95 * 1000}
+                  for name, count, p50, p95 in percentiles])
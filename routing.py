@@ -0,0 +1,313 @@
+"""Route and ETA lookups with a cache in front of a pluggable routing backend.
+
+get_route(origin, destination) snaps both points to SNAP_PRECISION decimal
+places and serves repeats from an in-memory TTL/LRU cache, so reruns of the
+same view never hit the router again. Backends:
+
+  OSRMBackend   the public OSRM demo server (or any OSRM instance)
+  GraphBackend  A* over a road graph loaded from an OSM XML extract
+                (.osm, .osm.gz or .osm.bz2); runs with no network
+
+Choose one with ROUTER_BACKEND=osrm|graph and, for the graph router,
+ROUTER_OSM_FILE=/path/to/extract.osm. If the backend fails, a straight-line
+estimate is returned (route.source == "estimate") instead of raising.
+
+Route geometry is simplified (Douglas-Peucker, below a pixel at street
+zoom) and kept as an encoded polyline, a few bytes per point instead of a
+list of float tuples; route.coords decodes it. map_render.py simplifies
+further for the zoom a map is drawn at.
+
+Offline benchmark:
+    python routing.py extract.osm [number_of_routes]
+"""
+import bz2
+import gzip
+import heapq
+import math
+import os
+import random
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import requests
+
+import profiling
+from geo import decode_polyline, encode_polyline, haversine_km, simplify
+from ttl_cache import TTLCache
+
+OSRM_URL = os.environ.get("OSRM_URL", "http://router.project-osrm.org/route/v1/driving")
+ROUTER_BACKEND = os.environ.get("ROUTER_BACKEND", "osrm")
+ROUTER_OSM_FILE = os.environ.get("ROUTER_OSM_FILE", "")
+
+SNAP_PRECISION = 4            # roughly 11 m
+CACHE_TTL_SECONDS = 15 * 60
+CACHE_SIZE = 2048
+ESTIMATE_TTL_SECONDS = 30     # retry the real router soon after a failure
+REQUEST_TIMEOUT = 5
+FALLBACK_SPEED_KMH = 40
+STORE_TOLERANCE_M = 0.5       # under a pixel at zoom 18
+
+
+class Route(namedtuple("Route", "polyline duration_s distance_m source")):
+    """A route whose geometry is an encoded polyline (see geo.encode_polyline)."""
+    __slots__ = ()
+
+    @classmethod
+    def from_coords(cls, coords, duration_s, distance_m, source):
+        return cls(encode_polyline(simplify(coords, STORE_TOLERANCE_M)), duration_s, distance_m, source)
+
+    @property
+    def coords(self):
+        return decode_polyline(self.polyline)
+
+
+# --- OSRM ---
+class OSRMBackend:
+    name = "osrm"
+
+    def __init__(self, base_url=OSRM_URL, timeout=REQUEST_TIMEOUT):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def route(self, origin, destination):
+        url = f"{self.base_url}/{origin[1]},{origin[0]};{destination[1]},{destination[0]}"
+        with profiling.span("osrm.route"):
+            # Encoded polyline: about a fifth of the GeoJSON response size
+            response = self.session.get(url, params={"overview": "full", "geometries": "polyline"},
+                                        timeout=self.timeout)
+        route = response.json()["routes"][0]
+        coords = decode_polyline(route["geometry"])
+        return Route.from_coords(coords, route["duration"], route["distance"], self.name)
+
+
+# --- Offline road graph ---
+# Typical free-flow speeds (km/h) per OSM highway class
+SPEED_KMH = {
+    "motorway": 90, "motorway_link": 50, "trunk": 70, "trunk_link": 40,
+    "primary": 55, "primary_link": 35, "secondary": 45, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25, "unclassified": 30, "residential": 25,
+    "living_street": 10, "service": 15, "road": 25,
+}
+GRID_CELL_DEG = 0.01
+
+
+def _open_osm(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+class RoadGraph:
+    """Directed road graph with node coordinates and a grid for snapping."""
+
+    def __init__(self, lats, lons, adjacency):
+        self.lats = lats
+        self.lons = lons
+        self.adjacency = adjacency  # node -> [(neighbour, seconds, metres)]
+        self.max_speed_ms = max(SPEED_KMH.values()) / 3.6
+        self.grid = {}
+        for node in range(len(lats)):
+            if adjacency[node]:
+                self.grid.setdefault(self._cell(lats[node], lons[node]), []).append(node)
+
+    @staticmethod
+    def _cell(lat, lon):
+        return int(math.floor(lat / GRID_CELL_DEG)), int(math.floor(lon / GRID_CELL_DEG))
+
+    @classmethod
+    def from_osm(cls, path):
+        """Parse nodes and drivable ways out of an OSM XML extract."""
+        coords, ways = {}, []
+        with _open_osm(path) as f:
+            for _, elem in ET.iterparse(f, events=("end",)):
+                if elem.tag == "node":
+                    coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+                    elem.clear()
+                elif elem.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in elem.iter("tag")}
+                    highway = tags.get("highway")
+                    if highway in SPEED_KMH:
+                        refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                        oneway = tags.get("oneway", "yes" if highway.startswith("motorway") else "no")
+                        speed = SPEED_KMH[highway]
+                        maxspeed = tags.get("maxspeed", "").split(" ")[0]
+                        if maxspeed.isdigit():
+                            speed = min(int(maxspeed), speed)
+                        ways.append((refs, oneway, speed))
+                    elem.clear()
+
+        index, lats, lons = {}, [], []
+        adjacency = []
+
+        def node_index(osm_id):
+            if osm_id not in index:
+                index[osm_id] = len(lats)
+                lat, lon = coords[osm_id]
+                lats.append(lat)
+                lons.append(lon)
+                adjacency.append([])
+            return index[osm_id]
+
+        for refs, oneway, speed in ways:
+            refs = [ref for ref in refs if ref in coords]
+            if oneway == "-1":
+                refs.reverse()
+            forward_only = oneway in ("yes", "true", "1", "-1")
+            for a_id, b_id in zip(refs, refs[1:]):
+                a, b = node_index(a_id), node_index(b_id)
+                metres = haversine_km(lats[a], lons[a], lats[b], lons[b]) * 1000
+                seconds = metres / (speed / 3.6)
+                adjacency[a].append((b, seconds, metres))
+                if not forward_only:
+                    adjacency[b].append((a, seconds, metres))
+        return cls(lats, lons, adjacency)
+
+    def nearest_node(self, lat, lon, max_rings=50):
+        """Closest routable node to (lat, lon), searching outward ring by ring."""
+        row, col = self._cell(lat, lon)
+        best, best_dist = None, float("inf")
+        for ring in range(max_rings + 1):
+            for r in range(row - ring, row + ring + 1):
+                for c in range(col - ring, col + ring + 1):
+                    if max(abs(r - row), abs(c - col)) != ring:
+                        continue
+                    for node in self.grid.get((r, c), ()):
+                        dist = haversine_km(lat, lon, self.lats[node], self.lons[node])
+                        if dist < best_dist:
+                            best, best_dist = node, dist
+            # Anything in a further ring is at least `ring` cells away
+            if best is not None and best_dist < ring * GRID_CELL_DEG * 111.32 * math.cos(math.radians(lat)):
+                break
+        return best
+
+    def shortest_path(self, source, target):
+        """A* on travel time; returns (node_path, seconds, metres) or None."""
+        goal_lat, goal_lon = self.lats[target], self.lons[target]
+
+        def heuristic(node):
+            return haversine_km(self.lats[node], self.lons[node], goal_lat, goal_lon) * 1000 / self.max_speed_ms
+
+        best = {source: 0.0}
+        metres = {source: 0.0}
+        previous = {}
+        queue = [(heuristic(source), 0.0, source)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                return path[::-1], cost, metres[target]
+            if cost > best.get(node, float("inf")):
+                continue
+            for neighbour, seconds, length in self.adjacency[node]:
+                new_cost = cost + seconds
+                if new_cost < best.get(neighbour, float("inf")):
+                    best[neighbour] = new_cost
+                    metres[neighbour] = metres[node] + length
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (new_cost + heuristic(neighbour), new_cost, neighbour))
+        return None
+
+
+class GraphBackend:
+    name = "graph"
+    _graphs = {}
+    _lock = threading.Lock()
+
+    def __init__(self, osm_path=ROUTER_OSM_FILE):
+        if not osm_path:
+            raise ValueError("ROUTER_OSM_FILE must point to an OSM XML extract for the graph router")
+        with self._lock:
+            if osm_path not in self._graphs:
+                self._graphs[osm_path] = RoadGraph.from_osm(osm_path)
+        self.graph = self._graphs[osm_path]
+
+    @profiling.timed("graph.route")
+    def route(self, origin, destination):
+        source = self.graph.nearest_node(*origin)
+        target = self.graph.nearest_node(*destination)
+        if source is None or target is None:
+            raise LookupError("No road near the requested points")
+        found = self.graph.shortest_path(source, target)
+        if found is None:
+            raise LookupError("No road route between the requested points")
+        path, seconds, metres = found
+        coords = [(self.graph.lats[node], self.graph.lons[node]) for node in path]
+        return Route.from_coords(coords, seconds, metres, self.name)
+
+
+# --- Public API ---
+_cache = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL_SECONDS)
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = GraphBackend() if ROUTER_BACKEND == "graph" else OSRMBackend()
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the routing backend (and drop cached routes from the old one)."""
+    global _backend
+    _backend = backend
+    _cache.clear()
+
+
+def _snap(point):
+    return round(float(point[0]), SNAP_PRECISION), round(float(point[1]), SNAP_PRECISION)
+
+
+def estimate_route(origin, destination):
+    """Straight-line route at FALLBACK_SPEED_KMH, used when no router is reachable."""
+    km = haversine_km(origin[0], origin[1], destination[0], destination[1])
+    return Route.from_coords([origin, destination], km / FALLBACK_SPEED_KMH * 3600, km * 1000, "estimate")
+
+
+def get_route(origin, destination):
+    """Return a Route from origin to destination, both (lat, lon)."""
+    key = (_snap(origin), _snap(destination))
+    route = _cache.get(key)
+    if route is not None:
+        return route
+    try:
+        route = get_backend().route(*key)
+        _cache.set(key, route)
+    except Exception as error:  # network errors, bad responses, unroutable points
+        print("Routing failed, using straight-line estimate:", error)
+        route = estimate_route(*key)
+        _cache.set(key, route, ttl=ESTIMATE_TTL_SECONDS)
+    return route
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("usage: python routing.py extract.osm [number_of_routes]")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    start = time.perf_counter()
+    backend = GraphBackend(sys.argv[1])
+    graph = backend.graph
+    print(f"Loaded {len(graph.lats)} nodes in {time.perf_counter() - start:.2f} s")
+    set_backend(backend)
+    nodes = [node for node in range(len(graph.lats)) if graph.adjacency[node]]
+    pairs = [(random.choice(nodes), random.choice(nodes)) for _ in range(count)]
+    timings = []
+    for a, b in pairs:
+        start = time.perf_counter()
+        get_route((graph.lats[a], graph.lons[a]), (graph.lats[b], graph.lons[b]))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{count} cold routes: p50 {timings[len(timings) // 2]:.2f} ms, max {timings[-1]:.2f} ms")
+    start = time.perf_counter()
+    for a, b in pairs:
+        get_route((graph.lats[a], graph.lons[a]), (graph.lats[b], graph.lons[b]))
+    print(f"{count} cached routes: {(time.perf_counter() - start) / count * 1e6:.1f} us each")
@@ -1,18 +1,12 @@
 #!/bin/bash
 
-declare -A modules=(
-  ["app.py"]=8501
-  ["ambulance.py"]=8502
-  ["hospitalapp.py"]=8503
-  ["police.py"]=8504
-)
-
-
-for module in "${!modules[@]}"; do
-  port=${modules[$module]}
-  echo "Starting $module on port $port..."
-  streamlit run "$module" --server.port="$port" &
-  sleep 1
-done
+# One Streamlit process serves every role (citizen, ambulance, hospital, police) as pages of main.py
+port=${PORT:-8501}
+echo "Starting the web app on port $port..."
+streamlit run main.py --server.port="$port" &
+
+# Dispatch engine: matches waiting reports to the nearest ready ambulances
+echo "Starting dispatch engine..."
+python dispatch.py &
 
 echo "Press Ctrl+C to stop the servers."
@@ -0,0 +1,26 @@
+"""Notification sound played in the browser (login, new assignment)."""
+import base64
+import os
+
+import streamlit as st
+
+SOUND_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification", "notification.mp3")
+
+
+@st.cache_data
+def _audio_html(path):
+    with open(path, "rb") as f:
+        audio_base64 = base64.b64encode(f.read()).decode("utf-8")
+    return f"""
+        <audio autoplay="true">
+            <source src="data:audio/mp3;base64,{audio_base64}" type="audio/mp3">
+        </audio>
+    """
+
+
+def play_sound(path=SOUND_PATH):
+    # HTML audio element to play a sound (the file is read and encoded once per server)
+    if os.path.exists(path):
+        st.components.v1.html(_audio_html(path), height=0)
+    else:
+        st.warning("Notification sound file not found!")
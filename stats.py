@@ -0,0 +1,198 @@
+"""Report counts per day, hour, area and status for the police dashboard.
+
+Counters are kept in three small tables, each keyed only by the dimensions
+its views need, so the number of counter rows depends on the time range and
+not on how many reports there are:
+  - report_stats_daily:  day x ambulance_status x hospital_status
+  - report_stats_hourly: hour ('YYYY-MM-DD HH')
+  - report_stats_area_monthly: month x area x hour of day
+An area is a geohash prefix of AREA_PRECISION characters (about 5 x 5 km);
+area views therefore cover whole months.
+
+Triggers on reports keep every counter current on insert, status change and
+delete, whichever process writes.
+
+    python stats.py rebuild    # recompute the counters from reports (backfill / repair)
+"""
+import argparse
+import time
+from datetime import date
+
+AREA_PRECISION = 5
+
+# table -> ((column, expression over a reports row), ...); the first column is the time bucket
+COUNTERS = {
+    "report_stats_daily": (
+        ("bucket", "substr({row}.timestamp, 1, 10)"),
+        ("ambulance_status", "COALESCE({row}.ambulance_status, '')"),
+        ("hospital_status", "COALESCE({row}.hospital_status, '')"),
+    ),
+    "report_stats_hourly": (
+        ("bucket", "substr({row}.timestamp, 1, 13)"),
+    ),
+    "report_stats_area_monthly": (
+        ("bucket", "substr({row}.timestamp, 1, 7)"),
+        ("area", f"COALESCE(substr({{row}}.geohash, 1, {AREA_PRECISION}), '')"),
+        ("hour", "CAST(substr({row}.timestamp, 12, 2) AS INTEGER)"),
+    ),
+}
+# reports columns whose change moves a row to another counter of the table
+WATCHED_COLUMNS = {
+    "report_stats_daily": "timestamp, ambulance_status, hospital_status",
+    "report_stats_hourly": "timestamp",
+    "report_stats_area_monthly": "timestamp, geohash",
+}
+
+
+def _bump(table, row, delta):
+    columns = ", ".join(column for column, _ in COUNTERS[table])
+    values = ", ".join(expr.format(row=row) for _, expr in COUNTERS[table])
+    return (f"INSERT INTO {table} ({columns}, count) VALUES ({values}, {delta}) "
+            f"ON CONFLICT ({columns}) DO UPDATE SET count = count + {delta};")
+
+
+def _schema():
+    statements = []
+    for table, key in COUNTERS.items():
+        columns = ", ".join(column for column, _ in key)
+        statements.append(f"""CREATE TABLE IF NOT EXISTS {table} (
+                                  {', '.join(f'{column} NOT NULL' for column, _ in key)},
+                                  count INTEGER NOT NULL,
+                                  PRIMARY KEY ({columns})
+                              ) WITHOUT ROWID""")
+        statements += [
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON reports
+                WHEN NEW.timestamp IS NOT NULL
+                BEGIN {_bump(table, 'NEW', 1)} END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_update_old AFTER UPDATE OF {WATCHED_COLUMNS[table]} ON reports
+                WHEN OLD.timestamp IS NOT NULL
+                BEGIN {_bump(table, 'OLD', -1)} END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_update_new AFTER UPDATE OF {WATCHED_COLUMNS[table]} ON reports
+                WHEN NEW.timestamp IS NOT NULL
+                BEGIN {_bump(table, 'NEW', 1)} END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON reports
+                WHEN OLD.timestamp IS NOT NULL
+                BEGIN {_bump(table, 'OLD', -1)} END""",
+        ]
+    return tuple(statements)
+
+
+SCHEMA = _schema()
+
+
+def ensure_schema(conn):
+    """Create the counter tables and triggers, and fill them on first creation.
+
+    Runs inside the caller's transaction; the caller commits.
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'report_stats_daily'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Recompute every counter from the reports table (does not commit)."""
+    for table, key in COUNTERS.items():
+        columns = ", ".join(column for column, _ in key)
+        values = ", ".join(expr.format(row="r") for _, expr in key)
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""INSERT INTO {table} ({columns}, count)
+                         SELECT {values}, COUNT(*) FROM reports r
+                         WHERE r.timestamp IS NOT NULL GROUP BY {', '.join(str(i + 1) for i in range(len(key)))}""")
+
+
+# --- Range queries (days as 'YYYY-MM-DD', ranges are [start_day, end_day)) ---
+BUCKETS = {
+    "hour": ("report_stats_hourly", "bucket"),
+    "day": ("report_stats_daily", "bucket"),
+    "month": ("report_stats_daily", "substr(bucket, 1, 7)"),
+    "year": ("report_stats_daily", "substr(bucket, 1, 4)"),
+}
+STATUS_GROUPS = ("ambulance_status", "hospital_status")
+
+
+def counts(conn, start_day, end_day, bucket="day", group_by=None):
+    """[(bucket, count)], or [(bucket, status, count)] with group_by 'ambulance_status'/'hospital_status'."""
+    table, bucket_expr = BUCKETS[bucket]
+    if group_by is not None and (group_by not in STATUS_GROUPS or bucket == "hour"):
+        raise ValueError(f"group_by must be one of {STATUS_GROUPS} (day, month or year buckets)")
+    columns = bucket_expr + (f", {group_by}" if group_by else "")
+    # Hour keys ('YYYY-MM-DD HH') sort between the day strings, so one range works for both tables
+    return conn.execute(
+        f"""SELECT {columns}, SUM(count) FROM {table} WHERE bucket >= ? AND bucket < ?
+            GROUP BY {columns} HAVING SUM(count) > 0 ORDER BY {columns}""",
+        (str(start_day), str(end_day)),
+    ).fetchall()
+
+
+def _month_range(start_day, end_day):
+    # Months that overlap [start_day, end_day)
+    return str(start_day)[:7], str(end_day)[:7] + ("" if str(end_day)[8:10] == "01" else "~")
+
+
+def _days(start_day, end_day, whole_months=False):
+    start, end = date.fromisoformat(str(start_day)), date.fromisoformat(str(end_day))
+    if whole_months:
+        start = start.replace(day=1)
+        if end.day != 1:
+            end = date(end.year + end.month // 12, end.month % 12 + 1, 1)
+    return max((end - start).days, 1)
+
+
+def area_counts(conn, start_day, end_day, limit=None):
+    """[(area geohash, count)], busiest first, over the months overlapping the range."""
+    sql = """SELECT area, SUM(count) FROM report_stats_area_monthly WHERE bucket >= ? AND bucket < ?
+             GROUP BY area HAVING SUM(count) > 0 ORDER BY SUM(count) DESC"""
+    params = _month_range(start_day, end_day)
+    if limit:
+        sql += " LIMIT ?"
+        params += (limit,)
+    return conn.execute(sql, params).fetchall()
+
+
+def hourly_profile(conn, start_day, end_day, by_area=False):
+    """Average reports per day for each hour of the day: [(hour, average)] or [(hour, area, average)].
+
+    Per-area profiles cover the months overlapping the range.
+    """
+    if by_area:
+        rows = conn.execute(
+            """SELECT hour, area, SUM(count) FROM report_stats_area_monthly WHERE bucket >= ? AND bucket < ?
+               GROUP BY hour, area HAVING SUM(count) > 0 ORDER BY hour, area""",
+            _month_range(start_day, end_day),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            """SELECT CAST(substr(bucket, 12, 2) AS INTEGER), SUM(count) FROM report_stats_hourly
+               WHERE bucket >= ? AND bucket < ? GROUP BY 1 HAVING SUM(count) > 0 ORDER BY 1""",
+            (str(start_day), str(end_day)),
+        ).fetchall()
+    days = _days(start_day, end_day, whole_months=by_area)
+    return [row[:-1] + (row[-1] / days,) for row in rows]
+
+
+def status_breakdown(conn, start_day, end_day):
+    """{(ambulance_status, hospital_status): count} over the range."""
+    rows = conn.execute(
+        """SELECT ambulance_status, hospital_status, SUM(count) FROM report_stats_daily
+           WHERE bucket >= ? AND bucket < ? GROUP BY 1, 2 HAVING SUM(count) > 0""",
+        (str(start_day), str(end_day)),
+    ).fetchall()
+    return {(ambulance, hospital): count for ambulance, hospital, count in rows}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report statistics maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    import db  # imported here: db imports this module for its migration
+
+    start = time.perf_counter()
+    with db.connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild(conn)
+        rows = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in COUNTERS)
+    print(f"Rebuilt report statistics: {rows} counter rows in {(time.perf_counter() - start) * 1000:.0f} ms")
@@ -0,0 +1,218 @@
+"""Synthetic accident_reporting.db for load tests and benchmarks.
+
+Builds a scratch database with the real schema (db.migrate) and fills it with
+production-scale data around Kerala:
+  - reports clustered around the district towns, spread over DAYS days with a
+    day-time peak; old ones are finished (ambulance and hospital assigned),
+    the newest WAITING are still unassigned and some drivers have an open job,
+  - users, ambulance drivers and hospitals near the same towns,
+  - vitals rows for half of the finished reports,
+  - old_patient_records with 128-d float64 face encodings shaped like
+    face_recognition's: people sit ~0.8 apart, photos of one person ~0.3.
+
+Never point it at the live database.
+    python synthetic.py scratch.db [--reports 1000000] [--patients 100000] ...
+"""
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import db
+import stats
+from geo import geohash_encode
+
+# (town, lat, lon, share of accidents)
+TOWNS = (
+    ("Thiruvananthapuram", 8.5241, 76.9366, 0.16),
+    ("Kollam", 8.8932, 76.6141, 0.08),
+    ("Alappuzha", 9.4981, 76.3388, 0.07),
+    ("Kottayam", 9.5916, 76.5222, 0.07),
+    ("Kochi", 9.9312, 76.2673, 0.18),
+    ("Thrissur", 10.5276, 76.2144, 0.11),
+    ("Palakkad", 10.7867, 76.6548, 0.07),
+    ("Malappuram", 11.0510, 76.0711, 0.08),
+    ("Kozhikode", 11.2588, 75.7804, 0.11),
+    ("Kannur", 11.8745, 75.3704, 0.07),
+)
+SPREAD_DEG = 0.08          # standard deviation around a town (~9 km)
+
+# Relative accident rate per hour of day
+HOUR_WEIGHTS = np.array([2, 1, 1, 1, 1, 2, 4, 6, 8, 7, 6, 6, 6, 6, 6, 7, 8, 9, 9, 8, 6, 5, 4, 3], dtype=float)
+
+FACE_DIM = 128
+FACE_POPULATION_SD = 0.05   # spread of people around the mean face (distance between people ~0.8)
+FACE_PHOTO_SD = 0.02        # spread of photos of one person (distance ~0.3, under the 0.6 tolerance)
+
+
+def _points(rng, n, spread=SPREAD_DEG):
+    shares = np.array([town[3] for town in TOWNS])
+    towns = rng.choice(len(TOWNS), size=n, p=shares / shares.sum())
+    lats = np.array([town[1] for town in TOWNS])[towns] + rng.normal(0, spread, n)
+    lons = np.array([town[2] for town in TOWNS])[towns] + rng.normal(0, spread, n)
+    return towns, lats, lons
+
+
+def _timestamps(rng, n, days, end):
+    """n sorted datetimes over the `days` days before `end`, following HOUR_WEIGHTS."""
+    day = rng.integers(0, days, n)
+    hour = rng.choice(24, size=n, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    seconds = np.sort(day * 86400 + hour * 3600 + rng.integers(0, 3600, n))
+    start = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return [start + timedelta(seconds=int(s)) for s in seconds]
+
+
+def mean_face(seed=0):
+    return np.random.default_rng(seed).normal(0, 0.06, FACE_DIM)
+
+
+def face_encodings(rng, n, seed=0):
+    """n person encodings (float64, as face_recognition returns them)."""
+    return mean_face(seed) + rng.normal(0, FACE_POPULATION_SD, (n, FACE_DIM))
+
+
+def another_photo(rng, encoding):
+    """Encoding of another photo of the same person."""
+    return encoding + rng.normal(0, FACE_PHOTO_SD, FACE_DIM)
+
+
+def _drop_stats_triggers(conn):
+    # Counters are rebuilt in one pass after the load instead of per row
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'report_stats_%'"):
+        conn.execute(f"DROP TRIGGER {name}")
+
+
+def _insert_batches(conn, sql, rows, batch_size, label):
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            conn.commit()
+            total += len(batch)
+            batch = []
+            print(f"  {label}: {total}", end="\r", flush=True)
+    if batch:
+        conn.executemany(sql, batch)
+        conn.commit()
+        total += len(batch)
+    print(f"  {label}: {total}")
+
+
+def generate(path, reports=1_000_000, drivers=2_000, hospitals=1_000, patients=100_000, users=50_000,
+             days=365, waiting=200, seed=7, batch_size=50_000):
+    """Create `path` (which must not exist) and fill it; returns the elapsed seconds."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} exists; synthetic data only goes into a new scratch file")
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    for pragma in db.PRAGMAS:
+        conn.execute(pragma)
+    db.migrate(conn)
+    conn.execute("PRAGMA synchronous=OFF")   # a scratch file: speed over durability
+    _drop_stats_triggers(conn)
+
+    print(f"Generating {path}")
+    _insert_batches(conn, "INSERT INTO users (phone, name, email, pin) VALUES (?, ?, ?, ?)",
+                    ((f"9{i:09d}", f"User {i}", f"user{i}@example.com", "1234") for i in range(users)),
+                    batch_size, "users")
+
+    _, h_lats, h_lons = _points(rng, hospitals, spread=SPREAD_DEG * 1.5)
+    h_ready = rng.random(hospitals) < 0.7
+    _insert_batches(conn, "INSERT INTO hospitals (phone, name, pin, status, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((f"8{i:09d}", f"Hospital {i}", "1234", "Ready" if h_ready[i] else "Not Ready",
+                      float(h_lats[i]), float(h_lons[i])) for i in range(hospitals)),
+                    batch_size, "hospitals")
+
+    _, d_lats, d_lons = _points(rng, drivers, spread=SPREAD_DEG * 1.5)
+    d_ready = rng.random(drivers) < 0.4
+    _insert_batches(conn, "INSERT INTO ambulance_drivers (phone, name, pin, status, latitude, longitude) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((f"7{i:09d}", f"Driver {i}", "1234", "Ready" if d_ready[i] else "Not Ready",
+                      float(d_lats[i]), float(d_lons[i])) for i in range(drivers)),
+                    batch_size, "ambulance_drivers")
+
+    # Reports: finished, except the newest `waiting` and one open job for a quarter of the ready drivers
+    towns, r_lats, r_lons = _points(rng, reports)
+    timestamps = _timestamps(rng, reports, days, datetime.now())
+    user_ids = rng.integers(0, users, reports)
+    driver_ids = rng.integers(1, drivers + 1, reports)
+    hospital_ids = rng.integers(1, hospitals + 1, reports)
+    ready_drivers = np.flatnonzero(d_ready) + 1
+    open_jobs = ready_drivers[: len(ready_drivers) // 4]
+    first_open = reports - waiting - len(open_jobs)
+
+    def report_rows():
+        for i in range(reports):
+            lat, lon = float(r_lats[i]), float(r_lons[i])
+            if i >= reports - waiting:
+                state, status, driver, hospital, hospital_status = "Waiting", "Waiting", None, None, "Waiting"
+            elif i >= first_open:
+                state, status, driver, hospital, hospital_status = ("Assigned", "Waiting", int(open_jobs[i - first_open]),
+                                                                    None, "Waiting")
+            else:
+                state, status, driver, hospital, hospital_status = ("Admitted", "Done", int(driver_ids[i]),
+                                                                    int(hospital_ids[i]), "Admitted")
+            yield (f"9{user_ids[i]:09d}", f"User {user_ids[i]}", f"{lat}, {lon}", lat, lon,
+                   geohash_encode(lat, lon, db.GEOHASH_PRECISION), TOWNS[towns[i]][0], "Road accident",
+                   timestamps[i].strftime(db.TIMESTAMP_FORMAT), state, status, driver, hospital, hospital_status)
+
+    _insert_batches(conn, """INSERT INTO reports (user_phone, name, location, lat, lon, geohash, place, description,
+                                                  timestamp, state, ambulance_status, assigned_to,
+                                                  hospital_assigned_to, hospital_status)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    report_rows(), batch_size, "reports")
+
+    def vitals_rows():
+        for report_id in range(1, first_open + 1, 2):
+            yield (report_id, int(driver_ids[report_id - 1]), int(rng.integers(50, 140)), int(rng.integers(85, 100)),
+                   f"{rng.integers(90, 160)}/{rng.integers(60, 100)}", "Yes" if rng.random() < 0.2 else "No",
+                   int(rng.integers(60, 300)), int(rng.integers(0, 6)), "", "",
+                   timestamps[report_id - 1].strftime(db.TIMESTAMP_FORMAT))
+
+    _insert_batches(conn, """INSERT INTO patient_medical_info (accident_id, driver_id, pulse_rate, oxygen_saturation, bp,
+                                 fractures_detected, blood_clotting_rate, head_injury, burns_external_wounds, remarks,
+                                 timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    vitals_rows(), batch_size, "patient_medical_info")
+
+    def patient_rows():
+        for offset in range(0, patients, batch_size):
+            encodings = face_encodings(rng, min(batch_size, patients - offset), seed)
+            for i, encoding in enumerate(encodings, offset):
+                yield (f"Patient {i}", int(rng.integers(1, 90)), "M" if i % 2 else "F", TOWNS[i % len(TOWNS)][0],
+                       f"6{i:09d}", f"5{i:09d}", str(100000 + i), "", "", "", "", "", None, encoding.tobytes())
+
+    _insert_batches(conn, """INSERT INTO old_patient_records (name, age, gender, place, phone, emergency_phone, tele_id,
+                                 medical_history, treatment, lab_reports, doctor_notes, medical_info, image,
+                                 face_encodings) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    patient_rows(), batch_size, "old_patient_records")
+
+    print("  rebuilding report statistics and planner statistics")
+    for statement in stats.SCHEMA:
+        conn.execute(statement)
+    stats.rebuild(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.0f} s, {os.path.getsize(path) / 1e6:.0f} MB")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill a scratch database with synthetic data")
+    parser.add_argument("path")
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--drivers", type=int, default=2_000)
+    parser.add_argument("--hospitals", type=int, default=1_000)
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--waiting", type=int, default=200, help="unassigned reports left for the dispatcher")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    generate(args.path, args.reports, args.drivers, args.hospitals, args.patients, args.users,
+             args.days, args.waiting, args.seed)
@@ -0,0 +1,352 @@
+"""Telegram notification outbox.
+
+Messages to relatives are written to the telegram_outbox table and delivered
+by a background sender, so the hospital page never waits on the Telegram API
+and a failed send is retried instead of lost:
+  - one keep-alive requests.Session shared by MAX_CONCURRENCY sender threads,
+  - at most one message per PER_CHAT_INTERVAL to the same chat, oldest first
+    (a message waiting on a retry does not hold back the ones after it),
+  - exponential backoff with jitter on network errors, 5xx and 429 (honouring
+    Telegram's retry_after),
+  - a status per message (queued / sending / sent / failed) the UI reads back.
+
+A message being sent is leased (next_attempt_at moves LEASE_SECONDS ahead), so
+messages of a sender that died are picked up again and senders in several
+processes never send the same row twice.
+
+Set TELEGRAM_BOT_TOKEN, and TELEGRAM_API_URL to point at a stand-in server:
+    python telegram_outbox.py run                 # standalone sender
+    python telegram_outbox.py fake-server         # local Telegram stand-in
+    python telegram_outbox.py bench               # throughput/retry run against the stand-in
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import db
+import events
+
+BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+MAX_CONCURRENCY = 4
+PER_CHAT_INTERVAL = 1.0      # Telegram allows about one message per second per chat
+MAX_PER_SECOND = 30          # and about 30 per second per bot
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+LEASE_SECONDS = 60
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read)
+IDLE_WAIT = 30               # re-check interval when nothing is queued; enqueue wakes the sender
+BATCH_SIZE = 200
+
+QUEUED, SENDING, SENT, FAILED = "queued", "sending", "sent", "failed"
+
+
+# --- Outbox ---
+def enqueue(chat_id, text):
+    """Queue a message and return its outbox id; the sender picks it up immediately."""
+    with db.connection() as conn:
+        cursor = conn.execute(
+            """INSERT INTO telegram_outbox (chat_id, text, status, attempts, next_attempt_at, created_at)
+               VALUES (?, ?, ?, 0, ?, ?)""",
+            (str(chat_id), text, QUEUED, time.time(), db.now()),
+        )
+        event_id = events.record(conn, events.TELEGRAM_QUEUED)
+    events.publish(event_id)
+    return cursor.lastrowid
+
+
+def send(chat_id, text):
+    """Queue a message and make sure this process runs a sender. Returns the outbox id."""
+    message_id = enqueue(chat_id, text)
+    get_sender().start()
+    return message_id
+
+
+def get_message(message_id):
+    """(status, attempts, last_error, sent_at) of one queued message, or None."""
+    return db.get_outbox_message(message_id)
+
+
+def backoff_delay(attempts):
+    """Seconds to wait before retry number `attempts` (full jitter on an exponential cap)."""
+    return random.uniform(0.5, 1.0) * min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def _finish(message_id, status, error=None, telegram_message_id=None, retry_at=None):
+    event_id = None
+    with db.connection() as conn:
+        if status == SENT:
+            conn.execute(
+                """UPDATE telegram_outbox SET status = ?, sent_at = ?, telegram_message_id = ?, last_error = NULL
+                   WHERE id = ?""",
+                (SENT, db.now(), telegram_message_id, message_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE telegram_outbox SET status = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, retry_at, error, message_id),
+            )
+            if status == QUEUED:
+                # The sender may be asleep until this message's lease runs out; have it re-plan
+                event_id = events.record(conn, events.TELEGRAM_QUEUED)
+    events.publish(event_id)
+
+
+# --- Sender ---
+class Sender:
+    """Background delivery of the outbox with bounded concurrency and rate limits."""
+
+    def __init__(self, api_url=None, token=None, concurrency=MAX_CONCURRENCY,
+                 per_chat_interval=PER_CHAT_INTERVAL, max_per_second=MAX_PER_SECOND):
+        self.api_url = (api_url or TELEGRAM_API_URL).rstrip("/")
+        self.token = BOT_TOKEN if token is None else token
+        self.per_chat_interval = per_chat_interval
+        self.min_spacing = 1.0 / max_per_second
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"sent": 0, "retried": 0, "failed": 0}
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="telegram-send")
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = set()      # chat ids with a request on the wire
+        self._chat_next = {}         # chat id -> earliest time the next message may start
+        self._next_start = 0.0
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telegram-outbox", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        seen = events.latest_id()
+        while True:
+            try:
+                wait = self.dispatch_due()
+            except Exception as exc:  # keep the sender alive through DB hiccups
+                print("Telegram outbox error:", exc)
+                wait = 1.0
+            seen = events.wait(seen, timeout=wait)
+
+    def dispatch_due(self):
+        """Start every message that may go out now; return seconds until the next one could."""
+        now = time.time()
+        with db.connection() as conn:
+            rows = conn.execute(
+                """SELECT id, chat_id, text, attempts FROM telegram_outbox
+                   WHERE status IN (?, ?) AND next_attempt_at <= ? ORDER BY id LIMIT ?""",
+                (QUEUED, SENDING, now, BATCH_SIZE),
+            ).fetchall()
+            upcoming = conn.execute(
+                "SELECT MIN(next_attempt_at) FROM telegram_outbox WHERE status IN (?, ?) AND next_attempt_at > ?",
+                (QUEUED, SENDING, now),
+            ).fetchone()[0]
+
+        wait = IDLE_WAIT if upcoming is None else max(0.0, upcoming - now)
+        blocked_chats = set()
+        for message_id, chat_id, text, attempts in rows:
+            if chat_id not in blocked_chats:
+                with self._lock:
+                    ready_at = self._chat_next.get(chat_id, 0.0)
+                    busy = chat_id in self._in_flight
+                if busy or ready_at > time.time():
+                    blocked_chats.add(chat_id)
+            if chat_id in blocked_chats:
+                # Due but held back by the per-chat limit (or an earlier message to the same chat)
+                wait = min(wait, self.per_chat_interval)
+                continue
+
+            self._slots.acquire()  # bounded concurrency: blocks until a sender thread is free
+            if not self._lease(message_id):
+                self._slots.release()
+                continue
+            delay = self._next_start - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            with self._lock:
+                self._next_start = time.time() + self.min_spacing
+                self._in_flight.add(chat_id)
+                self._chat_next[chat_id] = time.time() + self.per_chat_interval
+            self._executor.submit(self._deliver, message_id, chat_id, text, attempts + 1)
+            blocked_chats.add(chat_id)
+        if len(rows) == BATCH_SIZE:
+            wait = 0.0
+        return wait
+
+    @staticmethod
+    def _lease(message_id):
+        now = time.time()
+        with db.connection() as conn:
+            cursor = conn.execute(
+                """UPDATE telegram_outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?
+                   WHERE id = ? AND status IN (?, ?) AND next_attempt_at <= ?""",
+                (SENDING, now + LEASE_SECONDS, message_id, QUEUED, SENDING, now),
+            )
+            return cursor.rowcount == 1
+
+    def _deliver(self, message_id, chat_id, text, attempts):
+        try:
+            try:
+                response = self.session.post(
+                    f"{self.api_url}/bot{self.token}/sendMessage",
+                    data={"chat_id": chat_id, "text": text},
+                    timeout=REQUEST_TIMEOUT,
+                )
+            except requests.RequestException as exc:
+                self._retry(message_id, attempts, f"{type(exc).__name__}: {exc}")
+                return
+
+            if response.status_code == 200:
+                try:
+                    telegram_message_id = response.json().get("result", {}).get("message_id")
+                except ValueError:
+                    telegram_message_id = None
+                _finish(message_id, SENT, telegram_message_id=telegram_message_id)
+                self.stats["sent"] += 1
+            elif response.status_code == 429 or response.status_code >= 500:
+                retry_after = 0
+                if response.status_code == 429:
+                    try:
+                        retry_after = response.json().get("parameters", {}).get("retry_after", 0)
+                    except ValueError:
+                        pass
+                    with self._lock:
+                        self._chat_next[chat_id] = time.time() + retry_after
+                self._retry(message_id, attempts, f"HTTP {response.status_code}: {response.text[:200]}", retry_after)
+            else:
+                # 400 (bad chat id), 401 (bad token), 403 (bot blocked): retrying will not help
+                _finish(message_id, FAILED, f"HTTP {response.status_code}: {response.text[:200]}")
+                self.stats["failed"] += 1
+        finally:
+            with self._lock:
+                self._in_flight.discard(chat_id)
+            self._slots.release()
+
+    def _retry(self, message_id, attempts, error, retry_after=0):
+        if attempts >= MAX_ATTEMPTS:
+            _finish(message_id, FAILED, error)
+            self.stats["failed"] += 1
+            return
+        _finish(message_id, QUEUED, error, retry_at=time.time() + max(retry_after, backoff_delay(attempts)))
+        self.stats["retried"] += 1
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = Sender()
+    return _sender
+
+
+# --- Local stand-in for the Telegram Bot API ---
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    """Answers sendMessage like Telegram, with configurable latency and failures."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+    def do_POST(self):
+        server = self.server
+        body = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+        time.sleep(server.latency)
+        roll = random.random()
+        with server.lock:
+            server.requests += 1
+            if roll < server.fail_rate:
+                status, payload = 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+            elif roll < server.fail_rate + server.throttle_rate:
+                status, payload = 429, {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                        "parameters": {"retry_after": 1}}
+            else:
+                server.delivered.append(body.get("chat_id", [""])[0])
+                status, payload = 200, {"ok": True, "result": {"message_id": len(server.delivered)}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(port=0, latency=0.05, fail_rate=0.0, throttle_rate=0.0):
+    """Run the stand-in server on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeTelegramHandler)
+    server.daemon_threads = True
+    server.latency, server.fail_rate, server.throttle_rate = latency, fail_rate, throttle_rate
+    server.lock, server.requests, server.delivered = threading.Lock(), 0, []
+    threading.Thread(target=server.serve_forever, name="fake-telegram", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def bench(messages=500, chats=50, latency=0.05, fail_rate=0.1, throttle_rate=0.02,
+          concurrency=MAX_CONCURRENCY, per_chat_interval=0.2):
+    """Deliver `messages` to a flaky stand-in server from a scratch database and report throughput."""
+    global BACKOFF_BASE
+    scratch = tempfile.mkdtemp(prefix="telegram-bench-")
+    db.DB_PATH = os.path.join(scratch, "bench.db")
+    events.SIGNAL_PATH = os.path.join(scratch, "bench.db.events")
+    BACKOFF_BASE = 0.1  # keep retries short in a benchmark
+
+    server, url = start_fake_server(latency=latency, fail_rate=fail_rate, throttle_rate=throttle_rate)
+    sender = Sender(api_url=url, token="bench", concurrency=concurrency, per_chat_interval=per_chat_interval)
+    start = time.perf_counter()
+    ids = [enqueue(f"chat-{i % chats}", f"message {i}") for i in range(messages)]
+    sender.start()
+    while True:
+        statuses = db.outbox_status_counts()
+        if not statuses.get(QUEUED) and not statuses.get(SENDING):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    print(f"{len(ids)} messages to {chats} chats, concurrency {concurrency}, "
+          f"server latency {latency * 1000:.0f} ms, 5xx {fail_rate:.0%}, 429 {throttle_rate:.0%}")
+    print(f"  sent {statuses.get(SENT, 0)}, failed {statuses.get(FAILED, 0)}, retries {sender.stats['retried']}, "
+          f"HTTP requests {server.requests}")
+    print(f"  {elapsed:.2f} s, {statuses.get(SENT, 0) / elapsed:.1f} msg/s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Telegram outbox sender and test tools")
+    parser.add_argument("command", choices=["run", "fake-server", "bench"])
+    parser.add_argument("--port", type=int, default=8081, help="fake-server port")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake-server latency in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="fraction of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.02, help="fraction of 429 responses")
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(f"Delivering the Telegram outbox via {TELEGRAM_API_URL}")
+        get_sender().start()._thread.join()
+    elif args.command == "fake-server":
+        server, url = start_fake_server(args.port, args.latency, args.fail_rate, args.throttle_rate)
+        print(f"Fake Telegram API on {url} (set TELEGRAM_API_URL={url})")
+        threading.Event().wait()
+    else:
+        bench(args.messages, args.chats, args.latency, args.fail_rate, args.throttle_rate, args.concurrency)
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import events  # noqa: E402
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """A fresh, migrated database for one test."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(events, "SIGNAL_PATH", str(tmp_path / "test.db.events"))
+    yield db
+    if db._pool is not None:
+        db._pool.close_all()
@@ -0,0 +1,41 @@
+import ast
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_main_serves_every_role_page():
+    with open(os.path.join(ROOT, "main.py")) as f:
+        tree = ast.parse(f.read())
+    scripts = [call.args[0].value for call in ast.walk(tree)
+               if isinstance(call, ast.Call) and getattr(call.func, "attr", None) == "Page"]
+    assert sorted(scripts) == ["ambulance.py", "app.py", "hospitalapp.py", "police.py"]
+    assert all(os.path.exists(os.path.join(ROOT, script)) for script in scripts)
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    st = pytest.importorskip("streamlit")
+    import auth
+    monkeypatch.setattr(st, "session_state", {})  # a plain dict behaves like one browser session
+    return auth
+
+
+def test_logout_leaves_the_other_roles_signed_in(auth):
+    auth.login("hospital", 3)
+    auth.login("driver", 7)
+    auth.st.session_state["hospital_selected_accident"] = 12
+    auth.st.session_state["driver_route"] = "abc"
+
+    auth.logout("hospital")
+    assert auth.current("hospital") is None
+    assert "hospital_selected_accident" not in auth.st.session_state
+    assert auth.current("driver") == 7 and auth.st.session_state["driver_route"] == "abc"
+
+
+def test_credential_error(auth):
+    assert auth.credential_error("98765", "1234") == "Phone number must be 10 digits."
+    assert auth.credential_error("9876543210", "12a4") == "PIN must be exactly 4 digits."
+    assert auth.credential_error("9876543210", "1234") is None
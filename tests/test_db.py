@@ -0,0 +1,86 @@
+def test_backfills_run_until_completed_once(scratch_db, monkeypatch):
+    calls = []
+    monkeypatch.setattr(scratch_db, "BACKFILLS", [("example", lambda conn: calls.append(1) or 0)])
+    with scratch_db.connection() as conn:  # the pool start runs it
+        assert conn.execute("SELECT name, rows FROM completed_backfills").fetchall() == [("example", 0)]
+        scratch_db.backfill(conn)
+    assert calls == [1]
+
+
+def test_interrupted_backfill_runs_again(scratch_db, monkeypatch):
+    def interrupted(conn):
+        raise KeyboardInterrupt
+
+    with scratch_db.connection() as conn:
+        monkeypatch.setattr(scratch_db, "BACKFILLS", [("example", interrupted)])
+        try:
+            scratch_db.backfill(conn)
+        except KeyboardInterrupt:
+            pass
+        assert conn.execute("SELECT COUNT(*) FROM completed_backfills WHERE name = 'example'").fetchone()[0] == 0
+
+
+def test_hot_queries_use_indexes(scratch_db):
+    with scratch_db.connection() as conn:
+        assert scratch_db.check_query_plans(conn) == []
+
+
+def test_full_scan_of_a_hot_query_is_reported(scratch_db):
+    with scratch_db.connection() as conn:
+        conn.execute("DROP INDEX idx_reports_timestamp")
+        problems = scratch_db.check_query_plans(conn)
+    assert "list_reports_on_date" in {name for name, _ in problems}
+
+
+def test_missing_uploads_keep_their_reference(scratch_db, tmp_path, monkeypatch):
+    import media_store
+
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "scene.jpg").write_bytes(b"photo of the scene")
+    monkeypatch.setattr(scratch_db, "LEGACY_UPLOADS_DIR", str(uploads))
+    monkeypatch.setattr(media_store, "MEDIA_DIR", str(tmp_path / "media"))
+    with scratch_db.connection() as conn:
+        report_id = conn.execute("INSERT INTO reports (media) VALUES ('scene.jpg,gone.mp4')").lastrowid
+        assert scratch_db.backfill_report_uploads(conn) == 1
+        assert conn.execute("SELECT filename FROM report_media WHERE report_id = ?", (report_id,)).fetchall() == [
+            ("scene.jpg",)]
+        assert conn.execute("SELECT media FROM reports WHERE id = ?", (report_id,)).fetchone() == ("gone.mp4",)
+        assert conn.execute("SELECT report_id, filename FROM missing_report_uploads").fetchall() == [
+            (report_id, "gone.mp4")]
+
+
+def test_pool_connections_are_reused_in_wal_mode(scratch_db):
+    with scratch_db.connection() as conn:
+        first = conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == scratch_db.MIGRATIONS[-1][0]
+    with scratch_db.connection() as conn:
+        assert conn is first
+
+
+def test_migrations_run_once(scratch_db):
+    with scratch_db.connection() as conn:
+        conn.execute("INSERT INTO users (phone, name) VALUES ('9000000000', 'Reporter')")
+        scratch_db.migrate(conn)  # every version is already applied: nothing is recreated or reset
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 1
+
+
+def test_connection_rolls_back_on_error(scratch_db):
+    try:
+        with scratch_db.connection() as conn:
+            conn.execute("INSERT INTO users (phone, name) VALUES ('9000000000', 'Reporter')")
+            raise RuntimeError("page crashed")
+    except RuntimeError:
+        pass
+    assert scratch_db.get_user("9000000000") is None
+
+
+def test_backfill_fills_numeric_coordinates(scratch_db):
+    with scratch_db.connection() as conn:
+        conn.executemany("INSERT INTO reports (location) VALUES (?)", [("8.5241, 76.9366",), ("somewhere",)])
+        assert scratch_db.backfill_report_coordinates(conn, batch_size=1) == 1
+        assert conn.execute("SELECT location, lat, lon, geohash FROM reports ORDER BY id").fetchall() == [
+            ("8.5241, 76.9366", 8.5241, 76.9366, scratch_db.geohash_encode(8.5241, 76.9366, 7)),
+            ("somewhere", None, None, None),
+        ]
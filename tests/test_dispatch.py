@@ -0,0 +1,90 @@
+import dispatch
+import lifecycle
+
+
+def _add_driver(conn, driver_id, lat, lon):
+    conn.execute("INSERT INTO ambulance_drivers (id, phone, name, pin, status, latitude, longitude) "
+                 "VALUES (?, ?, ?, '0000', 'Ready', ?, ?)", (driver_id, f"9{driver_id:09d}", f"Driver {driver_id}", lat, lon))
+
+
+def _add_report(conn, lat, lon, state=lifecycle.WAITING, assigned_to=None):
+    status = "Done" if state in (lifecycle.TRANSPORTING, lifecycle.AT_HOSPITAL, lifecycle.ADMITTED) else "Waiting"
+    cursor = conn.execute(
+        "INSERT INTO reports (user_phone, name, lat, lon, timestamp, ambulance_status, state, assigned_to) "
+        "VALUES ('9000000000', 'Reporter', ?, ?, ?, ?, ?, ?)", (lat, lon, "2026-01-01 10:00:00", status, state, assigned_to))
+    return cursor.lastrowid
+
+
+def test_transporting_driver_is_not_matched(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_driver(conn, 1, 8.52, 76.93)
+        _add_report(conn, 8.50, 76.90, lifecycle.TRANSPORTING, assigned_to=1)
+        _add_report(conn, 8.53, 76.94)
+
+    with scratch_db.connection() as conn:
+        assert dispatch.load_available_drivers(conn) == []
+        assert dispatch.claim(conn, [(2, 1)]) == []
+    assert dispatch.run_once().assignments == []
+
+
+def test_driver_is_free_again_at_the_hospital(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_driver(conn, 1, 8.52, 76.93)
+        _add_report(conn, 8.50, 76.90, lifecycle.AT_HOSPITAL, assigned_to=1)
+        waiting = _add_report(conn, 8.53, 76.94)
+
+    assert dispatch.run_once().assignments == [(waiting, 1)]
+
+
+def test_busy_checks_use_the_assigned_state_index(scratch_db):
+    with scratch_db.connection() as conn:
+        for sql, params in ((dispatch.AVAILABLE_DRIVERS_SQL, ()), (dispatch.DRIVER_BUSY_SQL, (1,))):
+            plan = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+            assert "idx_reports_assigned_state" in plan
+
+
+def test_driver_reads_only_its_own_active_assignment(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_driver(conn, 1, 8.52, 76.93)
+        _add_driver(conn, 2, 8.51, 76.92)
+        _add_report(conn, 8.50, 76.90, lifecycle.AT_HOSPITAL, assigned_to=1)
+        _add_report(conn, 8.54, 76.95, lifecycle.ASSIGNED, assigned_to=2)
+        waiting = _add_report(conn, 8.53, 76.94)
+
+    assert scratch_db.get_active_assignment(1) is None
+    dispatch.run_once()
+    assert scratch_db.get_active_assignment(1)[0] == waiting
+    with scratch_db.connection() as conn:
+        lifecycle.transition(conn, waiting, lifecycle.ON_SCENE)
+    assert scratch_db.get_active_assignment(1)[:4] == (waiting, 8.53, 76.94, lifecycle.ON_SCENE)
+
+
+def _add_hospital(conn, lat, lon):
+    cursor = conn.execute("INSERT INTO hospitals (phone, name, pin, status, latitude, longitude) "
+                          "VALUES ('9111111111', 'City Hospital', '0000', 'Ready', ?, ?)", (lat, lon))
+    return cursor.lastrowid
+
+
+def test_transport_waits_for_a_hospital(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_driver(conn, 1, 8.52, 76.93)
+        report = _add_report(conn, 8.50, 76.90, lifecycle.ON_SCENE, assigned_to=1)
+
+    assert not scratch_db.start_transport(report)
+    assert scratch_db.get_active_assignment(1)[:4] == (report, 8.50, 76.90, lifecycle.ON_SCENE)
+
+
+def test_transport_is_found_again_after_a_reload(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_driver(conn, 1, 8.52, 76.93)
+        report = _add_report(conn, 8.50, 76.90, lifecycle.ON_SCENE, assigned_to=1)
+        hospital = _add_hospital(conn, 8.55, 76.95)
+    scratch_db.assign_hospital(report, hospital, 1)
+    assert scratch_db.start_transport(report)
+
+    # A new session only has the database to go on
+    assert scratch_db.get_active_assignment(1) == (report, 8.50, 76.90, lifecycle.TRANSPORTING, hospital, 8.55, 76.95)
+    assert scratch_db.advance_report(report, lifecycle.AT_HOSPITAL)
+    assert scratch_db.get_active_assignment(1) is None
+    with scratch_db.connection() as conn:
+        assert [driver[0] for driver in dispatch.load_available_drivers(conn)] == [1]
@@ -0,0 +1,23 @@
+import events
+
+
+def test_since_filters_to_one_driver(scratch_db):
+    with scratch_db.connection() as conn:
+        events.record(conn, events.REPORT_ASSIGNED, report_id=1, driver_id=1)
+        mine = events.record(conn, events.REPORT_ASSIGNED, report_id=2, driver_id=2)
+        events.record(conn, events.HOSPITAL_ASSIGNED, report_id=2, driver_id=2, hospital_id=1)
+        assert [row[0] for row in events.since(conn, 0, [events.REPORT_ASSIGNED], driver_id=2)] == [mine]
+        assert events.since(conn, mine, [events.REPORT_ASSIGNED], driver_id=2) == []
+
+
+def test_publish_reaches_another_process_through_the_signal_file(scratch_db, monkeypatch):
+    monkeypatch.setattr(events, "_feed", None)
+    other_process = events.EventFeed(poll_interval=0.01)  # only shares the signal file
+    seen = other_process.latest_id()
+
+    with scratch_db.connection() as conn:
+        event_id = events.record(conn, events.REPORT_CREATED, report_id=1)
+    events.publish(event_id)
+
+    assert other_process.wait(seen, timeout=5) == event_id
+    assert events.latest_id() == event_id  # in-process subscribers are told directly
@@ -0,0 +1,34 @@
+import numpy as np
+
+import face_index
+
+
+def _add_patients(db, count, seed):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(scale=0.1, size=(count, face_index.DIM))
+    with db.connection() as conn:
+        conn.executemany("INSERT INTO old_patient_records (name, face_encodings) VALUES (?, ?)",
+                         [(f"Patient {i}", encoding.tobytes()) for i, encoding in enumerate(encodings)])
+    return encodings
+
+
+def test_appended_rows_get_their_own_norms(scratch_db, tmp_path):
+    _add_patients(scratch_db, 50, seed=1)
+    index = face_index.FaceIndex(str(tmp_path / "index"))
+    encodings = _add_patients(scratch_db, 20, seed=2)
+    assert index.search(encodings[-1].tobytes(), k=1)[0][0] == 70
+    assert len(index) == 70
+    full = np.einsum("ij,ij->i", index.vectors, index.vectors)
+    np.testing.assert_allclose(index._sq_norms, full, rtol=1e-6)
+
+
+def test_rebuild_replaces_reencoded_rows_in_other_processes(scratch_db, tmp_path):
+    _add_patients(scratch_db, 10, seed=1)
+    running = face_index.FaceIndex(str(tmp_path / "index"))
+    new_encoding = np.full(face_index.DIM, 0.5)
+    scratch_db.set_old_patient_encodings([(new_encoding.tobytes(), 3)])
+    assert running.search(new_encoding.tobytes(), k=1) == []  # stale until rebuilt
+
+    face_index.FaceIndex(str(tmp_path / "index")).rebuild()  # what faces.py reencode ends with
+    assert running.search(new_encoding.tobytes(), k=1)[0][0] == 3
+    assert len(running) == 10
@@ -0,0 +1,82 @@
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import faces
+
+
+def _fake_submit(encodings):
+    """submit() stand-in answering from {image bytes: encoding or None} without a worker pool."""
+    def submit(image_bytes, **options):
+        future = Future()
+        future.set_result(encodings.get(image_bytes))
+        return future
+    return submit
+
+
+def _add_medical_info(db):
+    with db.connection() as conn:
+        return conn.execute("INSERT INTO patient_medical_info (accident_id, driver_id) VALUES (1, 1)").lastrowid
+
+
+def test_victim_encoding_is_stored_at_submission(scratch_db, monkeypatch):
+    monkeypatch.setattr(faces, "submit", _fake_submit({b"crowd": None, b"victim": b"encoding"}))
+    medical_info_id = _add_medical_info(scratch_db)
+
+    assert faces.store_victim_encoding(medical_info_id, [b"crowd", b"victim"]) == b"encoding"
+    assert scratch_db.get_medical_info(1)[12] == b"encoding"  # what the hospital pages read
+
+
+def test_photos_without_a_face_are_not_encoded_again(scratch_db, monkeypatch):
+    monkeypatch.setattr(faces, "submit", _fake_submit({}))
+    medical_info_id = _add_medical_info(scratch_db)
+
+    faces.store_victim_encoding(medical_info_id, [b"blurry"])
+    stored = scratch_db.get_medical_info(1)[12]
+    assert stored == faces.NO_FACE and stored is not None  # None would mean "not encoded yet"
+
+
+class _InlinePool:
+    """Process pool stand-in that runs nothing: every job answers `result`."""
+
+    def __init__(self, result, broken=False):
+        self.result, self.broken, self.jobs = result, broken, []
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool()
+        self.jobs.append(args)
+        future = Future()
+        future.set_result(self.result)
+        return future
+
+
+def test_submit_passes_the_detection_settings_and_records_worker_timings(monkeypatch):
+    pool = _InlinePool((b"encoding", {"face.detect": 0.2}))
+    monkeypatch.setattr(faces, "_pool", pool)
+    recorded = []
+    monkeypatch.setattr(faces.profiling, "record", lambda name, seconds: recorded.append(name))
+
+    assert faces.submit(b"photo", max_side=512).result() == b"encoding"
+    assert pool.jobs == [(b"photo", 512, faces.DETECTION_MODEL, faces.UPSAMPLE, faces.JITTERS)]
+    assert recorded == ["face.detect", "face.request"]
+
+
+def test_a_broken_pool_is_replaced_once(monkeypatch):
+    fresh = _InlinePool((None, {}))
+    monkeypatch.setattr(faces, "_pool", _InlinePool(None, broken=True))
+    monkeypatch.setattr(faces, "ProcessPoolExecutor", lambda **options: fresh)
+
+    assert faces.submit(b"photo").result() is None
+    assert faces._pool is fresh and len(fresh.jobs) == 1
+
+
+def test_load_image_downscales_to_the_detection_size():
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (4000, 3000), "white").save(buffer, format="JPEG")
+
+    assert faces.load_image(buffer.getvalue(), max_side=1024).shape == (768, 1024, 3)
+    assert faces.load_image(buffer.getvalue(), max_side=0).shape == (3000, 4000, 3)
@@ -0,0 +1,34 @@
+import pytest
+
+import geo
+
+
+def test_parse_location_reads_the_legacy_text_column():
+    assert geo.parse_location("8.5241, 76.9366") == (8.5241, 76.9366)
+    assert geo.parse_location("Near the bus stand") is None
+    assert geo.parse_location(None) is None
+
+
+def test_geohash_round_trip():
+    assert geo.geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    lat, lon = geo.geohash_decode(geo.geohash_encode(8.5241, 76.9366, 7))
+    assert lat == pytest.approx(8.5241, abs=0.001) and lon == pytest.approx(76.9366, abs=0.001)
+
+
+def test_polyline_round_trip():
+    coords = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert geo.encode_polyline(coords) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"   # Google's reference example
+    assert geo.decode_polyline(geo.encode_polyline(coords)) == coords
+    assert geo.decode_polyline(geo.encode_polyline([(8.52411, 76.93662)], precision=6), precision=6) == [
+        (8.52411, 76.93662)]
+
+
+def test_simplify_drops_points_within_the_tolerance():
+    # A straight road with a 5 m wobble and one 200 m detour
+    road = [(8.5, 76.9 + i * 0.001) for i in range(20)]
+    road[5] = (8.5 + 5 / 111320, road[5][1])
+    road[12] = (8.5 + 200 / 111320, road[12][1])
+
+    assert geo.simplify(road, 20) == [road[0], road[11], road[12], road[13], road[-1]]
+    assert road[5] in geo.simplify(road, 1)   # the wobble matters at a finer tolerance
+    assert geo.simplify(road[:2], 1000) == road[:2]
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+import requests
+
+import geocoding
+from ttl_cache import TTLCache
+
+
+class _Response:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def nominatim(tmp_path, monkeypatch):
+    """Request times of a fake Nominatim that rate-limits latitude 1 and has no name for latitude 2."""
+    monkeypatch.setattr(geocoding, "CACHE_PATH", str(tmp_path / "geocode.db"))
+    monkeypatch.setattr(geocoding, "_disk", None)
+    monkeypatch.setattr(geocoding, "_memory", TTLCache())
+    monkeypatch.setattr(geocoding, "MIN_REQUEST_INTERVAL", 0.05)
+    requested = []
+
+    def get(url, params, timeout):
+        requested.append(time.monotonic())
+        if params["lat"] == "1.0":
+            return _Response(429, {"error": "Too many requests"})
+        if params["lat"] == "2.0":
+            return _Response(200, {"error": "Unable to geocode"})
+        return _Response(200, {"display_name": f"Place {params['lat']}"})
+
+    monkeypatch.setattr(geocoding._session, "get", get)
+    yield requested
+    geocoding._disk.close()
+
+
+def test_only_place_names_reach_the_disk_cache(nominatim):
+    names = geocoding.get_place_names([(1, 1), (2, 2), (3, 3)])
+    assert names == [geocoding.NOT_FOUND, geocoding.NOT_FOUND, "Place 3.0"]
+    assert geocoding._disk_get_many(["1.0,1.0", "2.0,2.0", "3.0,3.0"]) == {"3.0,3.0": "Place 3.0"}
+    assert geocoding.get_place_name(1, 1) == geocoding.NOT_FOUND  # remembered briefly, not asked again
+    assert len(nominatim) == 3
+
+
+def test_requests_are_spaced_out(nominatim):
+    geocoding.get_place_names([(3, 3), (4, 4), (5, 5)])
+    assert all(later - earlier >= 0.045 for earlier, later in zip(nominatim, nominatim[1:]))
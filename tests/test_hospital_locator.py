@@ -0,0 +1,41 @@
+import random
+
+import hospital_locator
+
+
+def _add_hospitals(conn, hospitals):
+    conn.executemany("INSERT INTO hospitals (phone, name, pin, status, latitude, longitude) VALUES (?, ?, '0000', ?, ?, ?)",
+                     [(f"9{i:09d}", f"Hospital {i}", status, lat, lon) for i, (status, lat, lon) in enumerate(hospitals)])
+
+
+def test_nearest_matches_a_full_scan(scratch_db):
+    rng = random.Random(1)
+    with scratch_db.connection() as conn:
+        _add_hospitals(conn, [(rng.choice(["Ready", "Not Ready"]), 8 + rng.uniform(0, 2), 76 + rng.uniform(0, 2))
+                              for _ in range(300)])
+        for _ in range(50):
+            lat, lon = 8 + rng.uniform(-0.5, 2.5), 76 + rng.uniform(-0.5, 2.5)
+            assert (hospital_locator.nearest_ready_hospitals(conn, lat, lon, k=3)
+                    == hospital_locator._scan(conn, lat, lon, k=3))
+
+
+def test_index_follows_status_and_moves(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_hospitals(conn, [("Ready", 8.50, 76.90), ("Not Ready", 8.51, 76.91)])
+        far, near = (row[0] for row in conn.execute("SELECT id FROM hospitals ORDER BY id"))
+        assert hospital_locator.nearest_ready_hospitals(conn, 8.51, 76.91)[0][0] == far
+
+        conn.execute("UPDATE hospitals SET status = 'Ready' WHERE id = ?", (near,))
+        assert hospital_locator.nearest_ready_hospitals(conn, 8.51, 76.91)[0][0] == near
+
+        conn.execute("UPDATE hospitals SET latitude = 12.0, longitude = 77.5 WHERE id = ?", (near,))
+        assert hospital_locator.nearest_ready_hospitals(conn, 8.51, 76.91)[0][0] == far
+
+        conn.execute("UPDATE hospitals SET status = 'Not Ready' WHERE id = ?", (far,))
+        assert hospital_locator.nearest_ready_hospitals(conn, 8.51, 76.91)[0][0] == near  # found beyond 5 km
+
+
+def test_no_ready_hospital(scratch_db):
+    with scratch_db.connection() as conn:
+        _add_hospitals(conn, [("Not Ready", 8.50, 76.90)])
+        assert hospital_locator.nearest_ready_hospitals(conn, 8.5, 76.9) == []
@@ -0,0 +1,21 @@
+from datetime import date
+
+import hotspots
+
+
+def test_coordinate_fills_invalidate_the_month_tiles(scratch_db, monkeypatch):
+    monkeypatch.setattr(hotspots, "_cache", hotspots.TTLCache())
+    with scratch_db.connection() as conn:
+        conn.executemany("INSERT INTO reports (location, lat, lon, timestamp) VALUES (?, ?, ?, ?)",
+                         [("8.5, 76.9", 8.5, 76.9, f"2026-03-{day:02d} 10:00:00") for day in range(1, 11)]
+                         + [("8.6, 77.0", None, None, "2026-03-15 10:00:00")] * 5)
+    month = (date(2026, 3, 1), date(2026, 4, 1))
+    assert int(hotspots.tile_aggregates(*month).counts.sum()) == 10
+
+    with scratch_db.connection() as conn:
+        assert scratch_db.backfill_report_coordinates(conn) == 5
+    tiles = hotspots.tile_aggregates(*month)
+    assert int(tiles.counts.sum()) == 15
+
+    hotspots._cache.clear()  # as after a restart: the stored tiles must be the new ones too
+    assert int(hotspots.tile_aggregates(*month).counts.sum()) == 15
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("face_recognition", "dlib", "ollama", "cv2", "PIL", "httpx")
+
+
+def _loaded_after(modules, tmp_path):
+    """Heavy modules present in sys.modules after importing `modules` in a fresh interpreter."""
+    code = (f"import sys\nimport {', '.join(modules)}\n"
+            f"print(' '.join(name for name in {HEAVY!r} if name in sys.modules))")
+    env = dict(os.environ, ACCIDENT_DB_PATH=str(tmp_path / "imports.db"))
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.split()
+
+
+def test_face_and_triage_modules_load_their_models_on_first_use(tmp_path):
+    assert _loaded_after(["db", "faces", "face_index", "triage"], tmp_path) == []
+
+
+def test_hospital_pages_import_without_the_heavy_stacks(tmp_path):
+    pytest.importorskip("streamlit")
+    assert _loaded_after(["hospital_dashboard", "hospital_face_search", "hospital_ai_report"], tmp_path) == []
@@ -0,0 +1,38 @@
+import geo
+import map_render
+
+
+def _wiggly_route():
+    return [(8.5 + (i % 2) * 0.00002, 76.9 + i * 0.0005) for i in range(200)]   # 2 m zigzag
+
+
+def test_route_is_simplified_for_the_zoom():
+    polyline = geo.encode_polyline(_wiggly_route())
+    city, street = map_render.route_coords(polyline, 8.5, 12), map_render.route_coords(polyline, 8.5, 20)
+
+    assert city == [(8.5, 76.9), (8.50002, 76.9995)]
+    assert len(street) == 200
+
+
+def test_map_html_is_built_once_per_map(monkeypatch):
+    built = []
+
+    class _Map:
+        def get_root(self):
+            return self
+
+        def render(self):
+            return "<html>route</html>"
+
+    def build_map(*args):
+        built.append(args)
+        return _Map()
+
+    monkeypatch.setattr(map_render, "build_map", build_map)
+    monkeypatch.setattr(map_render, "_cache", map_render.TTLCache(maxsize=4, ttl=60))
+    markers = (map_render.Marker(8.5, 76.9, "Accident", "car", "red"),)
+
+    for _ in range(3):
+        assert map_render.route_map_html((8.5000001, 76.9), markers, "_p~iF~ps|U") == "<html>route</html>"
+    map_render.route_map_html((8.5, 76.9), markers, "_p~iF~ps|U", zoom=15)
+    assert len(built) == 2
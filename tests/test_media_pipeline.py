@@ -0,0 +1,57 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import media_pipeline
+import media_store
+
+
+@pytest.fixture
+def media_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "MEDIA_DIR", str(tmp_path))
+    return str(tmp_path)
+
+
+def _jpeg(width, height):
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), "red").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_pages_fall_back_to_the_original_until_rendered(media_dir):
+    stored = media_store.put_bytes(b"not rendered yet", "a.jpg")
+    assert media_pipeline.best_path(stored.sha256, "thumb") == media_store.path(stored.sha256)
+    assert media_pipeline.detection_images([stored.sha256]) == [b"not rendered yet"]
+    assert media_pipeline.keyframe_paths(stored.sha256) == []
+
+
+def test_a_corrupt_upload_keeps_only_its_original(media_dir):
+    stored = media_store.put_bytes(b"\xff\xd8 truncated", "broken.jpg")
+    assert media_pipeline.render(stored.sha256, stored.kind) == []
+    assert media_pipeline.render(stored.sha256, "file") == []
+    assert media_pipeline.best_path(stored.sha256, "display") == media_store.path(stored.sha256)
+
+
+def test_process_renders_photos_and_videos_only(media_dir, monkeypatch):
+    rendered = []
+    monkeypatch.setattr(media_pipeline, "render", lambda sha256, kind, media_dir: rendered.append(kind) or [kind])
+    monkeypatch.setattr(media_pipeline, "_pool", ThreadPoolExecutor(max_workers=1))
+    items = [media_store.StoredMedia(str(i) * 64, 1, None, None, kind) for i, kind in enumerate(("photo", "file", "video"))]
+
+    assert media_pipeline.process(items) == [["photo"], ["video"]]
+    assert rendered == ["photo", "video"]
+
+
+def test_photo_renditions_are_downscaled(media_dir):
+    Image = pytest.importorskip("PIL.Image")
+    stored = media_store.put_bytes(_jpeg(3200, 2400), "scene.jpg")
+
+    assert media_pipeline.render(stored.sha256, "photo") == ["display", "thumb", "detect"]
+    for name, (side, _, _) in media_pipeline.RENDITIONS.items():
+        path = media_pipeline.best_path(stored.sha256, name)
+        assert path != media_store.path(stored.sha256) and os.path.dirname(path).endswith(stored.sha256)
+        with Image.open(path) as image:
+            assert max(image.size) == side
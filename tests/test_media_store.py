@@ -0,0 +1,30 @@
+import hashlib
+import io
+
+import media_store
+
+
+def test_same_content_is_stored_once(tmp_path):
+    first = media_store.put_bytes(b"crash photo", "a.jpg", media_dir=str(tmp_path))
+    second = media_store.put_stream(io.BytesIO(b"crash photo"), "b.jpg", media_dir=str(tmp_path))
+
+    assert first.sha256 == second.sha256 == hashlib.sha256(b"crash photo").hexdigest()
+    stored = [path for path in tmp_path.rglob("*") if path.is_file()]
+    assert stored == [tmp_path / first.sha256[:2] / first.sha256[2:4] / first.sha256]
+    assert media_store.read(first.sha256, str(tmp_path)) == b"crash photo"
+
+
+def test_large_uploads_are_hashed_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(media_store, "CHUNK_SIZE", 4)
+    data = bytes(range(256)) * 3
+    stored = media_store.put_bytes(data, media_dir=str(tmp_path))
+
+    assert (stored.sha256, stored.size) == (hashlib.sha256(data).hexdigest(), len(data))
+    assert media_store.read_range(stored.sha256, 250, 10, str(tmp_path)) == data[250:260]
+    assert not list((tmp_path / "tmp").iterdir())   # no temporary files left behind
+
+
+def test_kind_from_content_type_or_extension():
+    assert media_store.kind_of("image/jpeg") == "photo"
+    assert media_store.kind_of(None, "dashcam.mp4") == "video"
+    assert media_store.kind_of("application/pdf", "scan.jpg") == "file"
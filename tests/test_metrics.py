@@ -0,0 +1,39 @@
+import io
+
+import metrics
+
+
+def test_first_transition_wins(scratch_db):
+    with scratch_db.connection() as conn:
+        assert metrics.record(conn, 1, metrics.ASSIGNED, at=100.0)
+        assert not metrics.record(conn, 1, metrics.ASSIGNED, at=200.0)
+        assert conn.execute("SELECT at FROM report_transitions WHERE report_id = 1").fetchall() == [(100.0,)]
+
+
+def test_latencies_over_a_window(scratch_db):
+    with scratch_db.connection() as conn:
+        for report_id, wait in enumerate((10, 20, 30, 40), 1):
+            metrics.record(conn, report_id, metrics.CREATED, at=1000.0 + report_id)
+            metrics.record(conn, report_id, metrics.ASSIGNED, at=1000.0 + report_id + wait)
+        metrics.record(conn, 5, metrics.CREATED, at=5000.0)  # outside the window
+        metrics.record(conn, 5, metrics.ASSIGNED, at=5999.0)
+        rows = {row["interval"]: row for row in metrics.latencies(conn, 1000, 2000)}
+    assert rows["dispatch_wait"]["count"] == 4
+    assert rows["dispatch_wait"]["p50"] == 25
+    assert rows["dispatch_wait"]["max"] == 40
+    assert rows["to_scene"] == {"interval": "to_scene", "label": "Ambulance to scene", "count": 0,
+                                "p50": None, "p95": None, "p99": None, "max": None}
+
+
+def test_percentile_interpolates():
+    assert metrics.percentile([], 50) is None
+    assert metrics.percentile([1.0, 2.0, 3.0, 4.0, 5.0], 95) == 4.8
+
+
+def test_csv_export(scratch_db):
+    with scratch_db.connection() as conn:
+        metrics.record(conn, 7, metrics.CREATED, at=1000.0)
+        metrics.record(conn, 7, metrics.ASSIGNED, at=1030.0)
+        out = io.StringIO()
+        metrics.export(conn, 1000, 2000, out)
+    assert out.getvalue().splitlines() == ["report_id,interval,seconds", "7,dispatch_wait,30.000"]
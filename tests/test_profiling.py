@@ -0,0 +1,50 @@
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", True)
+    monkeypatch.setattr(profiling, "_histograms", {})
+
+
+def test_span_records_into_a_histogram(enabled):
+    with profiling.span("osrm.route"):
+        pass
+    profiling.record("osrm.route", 0.2)
+    histogram = profiling._histograms["osrm.route"]
+    assert histogram.count == 2
+    assert histogram.quantile(1.0) == 0.25
+
+
+def test_timed_keeps_the_function_and_records(enabled):
+    @profiling.timed("face_index.search")
+    def search(value):
+        return value * 2
+
+    assert search(21) == 42
+    assert search.__name__ == "search"
+    assert profiling._histograms["face_index.search"].count == 1
+
+
+def test_prometheus_text_is_cumulative(enabled):
+    profiling.record("sqlite.get_report", 0.003)
+    profiling.record("sqlite.get_report", 50.0)
+    text = profiling.prometheus_text()
+    assert 'accident_span_seconds_bucket{span="sqlite.get_report",le="0.005"} 1' in text
+    assert 'accident_span_seconds_bucket{span="sqlite.get_report",le="+Inf"} 2' in text
+
+
+def test_disabled_profiling_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(profiling, "ENABLED", False)
+    monkeypatch.setattr(profiling, "_histograms", {})
+
+    def search():
+        return 1
+
+    assert profiling.timed("face_index.search")(search) is search
+    with profiling.span("osrm.route"):
+        pass
+    profiling.record("osrm.route", 0.1)
+    assert profiling._histograms == {}
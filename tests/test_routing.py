@@ -0,0 +1,72 @@
+import pytest
+
+import routing
+
+# A square of residential streets with a one-way primary shortcut across it, from node 1 to node 3
+OSM = """<?xml version="1.0"?>
+<osm>
+  <node id="1" lat="8.500" lon="76.900"/>
+  <node id="2" lat="8.500" lon="76.910"/>
+  <node id="3" lat="8.510" lon="76.910"/>
+  <node id="4" lat="8.510" lon="76.900"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="1"/><nd ref="3"/><tag k="highway" v="primary"/><tag k="oneway" v="yes"/></way>
+</osm>
+"""
+
+
+class _CountingBackend:
+    name = "counting"
+
+    def __init__(self, fail=False):
+        self.calls = 0
+        self.fail = fail
+
+    def route(self, origin, destination):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("router down")
+        return routing.Route.from_coords([origin, destination], 60.0, 1000.0, self.name)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = _CountingBackend()
+    monkeypatch.setattr(routing, "_backend", None)
+    routing.set_backend(backend)
+    yield backend
+    routing.set_backend(None)
+
+
+def test_nearby_requests_share_one_route(backend):
+    first = routing.get_route((8.50001, 76.90001), (8.52, 76.95))
+    again = routing.get_route((8.50002, 76.90002), (8.52, 76.95))  # same ~11 m snap cell
+    assert again is first
+    assert backend.calls == 1
+
+
+def test_failure_gives_a_short_lived_estimate(backend, monkeypatch):
+    backend.fail = True
+    route = routing.get_route((8.5, 76.9), (8.6, 76.9))
+    assert route.source == "estimate"
+    assert route.distance_m == pytest.approx(11_120, rel=0.01)
+    assert routing.get_route((8.5, 76.9), (8.6, 76.9)) is route  # reruns don't hammer a failing router
+    assert backend.calls == 1
+
+    monkeypatch.setattr(routing, "ESTIMATE_TTL_SECONDS", 0)
+    routing.get_route((8.5, 76.9), (8.7, 76.9))  # a failure cached for no time at all
+    backend.fail = False
+    assert routing.get_route((8.5, 76.9), (8.7, 76.9)).source == "counting"
+
+
+def test_graph_backend_follows_one_way_streets(tmp_path):
+    path = tmp_path / "square.osm"
+    path.write_text(OSM)
+    graph_backend = routing.GraphBackend(str(path))
+
+    there = graph_backend.route((8.500, 76.900), (8.510, 76.910))
+    back = graph_backend.route((8.510, 76.910), (8.500, 76.900))
+    assert there.coords == [(8.5, 76.9), (8.51, 76.91)]  # the shortcut
+    assert len(back.coords) == 3  # around the block, the shortcut is one-way
+    assert back.distance_m > there.distance_m
@@ -0,0 +1,43 @@
+import stats
+from geo import geohash_encode
+
+
+def _counters(conn):
+    return {table: sorted(conn.execute(f"SELECT * FROM {table} WHERE count != 0").fetchall())
+            for table in stats.COUNTERS}
+
+
+def _insert(conn, timestamp, lat, status="Waiting"):
+    return conn.execute(
+        """INSERT INTO reports (lat, lon, geohash, timestamp, ambulance_status, hospital_status)
+           VALUES (?, 77.59, ?, ?, ?, 'Waiting')""",
+        (lat, geohash_encode(lat, 77.59), timestamp, status),
+    ).lastrowid
+
+
+def test_triggers_match_a_rebuild(scratch_db):
+    with scratch_db.connection() as conn:
+        first = _insert(conn, "2024-03-01 09:15:00", 12.97)
+        second = _insert(conn, "2024-03-01 09:40:00", 12.97)
+        third = _insert(conn, "2024-03-02 22:05:00", 13.10)
+        conn.execute("UPDATE reports SET ambulance_status = 'Assigned' WHERE id = ?", (first,))
+        conn.execute("UPDATE reports SET timestamp = '2024-04-01 10:00:00' WHERE id = ?", (second,))
+        conn.execute("UPDATE reports SET geohash = NULL WHERE id = ?", (third,))
+        conn.execute("DELETE FROM reports WHERE id = ?", (first,))
+        _insert(conn, "2024-03-05 01:00:00", 12.50, status="Assigned")
+        maintained = _counters(conn)
+        stats.rebuild(conn)
+        assert _counters(conn) == maintained
+
+
+def test_range_queries(scratch_db):
+    with scratch_db.connection() as conn:
+        _insert(conn, "2024-03-01 09:15:00", 12.97)
+        _insert(conn, "2024-03-01 09:40:00", 12.97, status="Assigned")
+        _insert(conn, "2024-03-02 22:05:00", 12.97)
+        assert stats.counts(conn, "2024-03-01", "2024-03-03") == [("2024-03-01", 2), ("2024-03-02", 1)]
+        assert stats.counts(conn, "2024-03-01", "2024-03-02", bucket="hour") == [("2024-03-01 09", 2)]
+        assert stats.status_breakdown(conn, "2024-03-01", "2024-03-03") == {
+            ("Waiting", "Waiting"): 2, ("Assigned", "Waiting"): 1}
+        assert stats.hourly_profile(conn, "2024-03-01", "2024-03-03") == [(9, 1.0), (22, 0.5)]
+        assert [count for _, count in stats.area_counts(conn, "2024-03-01", "2024-03-03")] == [3]
@@ -0,0 +1,47 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import synthetic
+
+SIZES = dict(reports=300, drivers=20, hospitals=10, patients=40, users=50, days=30, waiting=10, batch_size=100)
+
+
+def _build(tmp_path, name, seed=7):
+    path = str(tmp_path / name)
+    synthetic.generate(path, seed=seed, **SIZES)
+    return sqlite3.connect(path)
+
+
+def test_row_counts_and_open_work(tmp_path):
+    conn = _build(tmp_path, "scratch.db")
+    for table, expected in (("reports", 300), ("ambulance_drivers", 20), ("hospitals", 10),
+                            ("old_patient_records", 40), ("users", 50)):
+        assert conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == expected
+    assert conn.execute("SELECT COUNT(*) FROM reports WHERE state = 'Waiting' AND assigned_to IS NULL").fetchone()[0] == 10
+    busy = conn.execute("SELECT assigned_to FROM reports WHERE state = 'Assigned'").fetchall()
+    assert len(busy) == len(set(busy))   # at most one open job per driver
+    total = conn.execute("SELECT SUM(count) FROM report_stats_daily").fetchone()[0]
+    assert total == 300   # counters rebuilt after the load
+
+
+def test_same_seed_gives_the_same_data(tmp_path):
+    query = "SELECT lat, lon, geohash, state, assigned_to, hospital_assigned_to FROM reports ORDER BY id"
+    first = _build(tmp_path, "a.db").execute(query).fetchall()
+    assert _build(tmp_path, "b.db").execute(query).fetchall() == first
+    assert _build(tmp_path, "c.db", seed=8).execute(query).fetchall() != first
+
+
+def test_refuses_an_existing_file(tmp_path):
+    path = tmp_path / "live.db"
+    path.write_bytes(b"")
+    with pytest.raises(FileExistsError):
+        synthetic.generate(str(path), **SIZES)
+
+
+def test_face_encodings_separate_people_from_photos():
+    rng = np.random.default_rng(1)
+    people = synthetic.face_encodings(rng, 2)
+    photo = synthetic.another_photo(rng, people[0])
+    assert np.linalg.norm(photo - people[0]) < 0.6 < np.linalg.norm(people[1] - people[0])
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+import telegram_outbox
+
+
+def _wait_until_settled(message_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        message = telegram_outbox.get_message(message_id)
+        if message[0] != telegram_outbox.SENDING:
+            return message
+        time.sleep(0.01)
+    raise AssertionError(f"message {message_id} still being sent")
+
+
+@pytest.fixture
+def fake_telegram():
+    server, url = telegram_outbox.start_fake_server(latency=0)
+    yield server, telegram_outbox.Sender(api_url=url, token="test")
+    server.shutdown()
+
+
+def test_lease_is_exclusive_until_it_expires(scratch_db, monkeypatch):
+    message_id = telegram_outbox.enqueue("chat-1", "Your relative was admitted")
+    assert telegram_outbox.Sender._lease(message_id)
+    assert not telegram_outbox.Sender._lease(message_id)  # another sender finds it taken
+
+    with scratch_db.connection() as conn:  # the first sender died; its lease runs out
+        conn.execute("UPDATE telegram_outbox SET next_attempt_at = ? WHERE id = ?", (time.time() - 1, message_id))
+    assert telegram_outbox.Sender._lease(message_id)
+    assert telegram_outbox.get_message(message_id)[:2] == (telegram_outbox.SENDING, 2)
+
+
+def test_message_is_delivered(scratch_db, fake_telegram):
+    server, sender = fake_telegram
+    message_id = telegram_outbox.enqueue("chat-1", "Your relative was admitted")
+    sender.dispatch_due()
+    status, attempts, last_error, sent_at = _wait_until_settled(message_id)
+    assert (status, attempts, last_error) == (telegram_outbox.SENT, 1, None)
+    assert server.delivered == ["chat-1"]
+
+
+def test_server_error_is_retried_with_backoff(scratch_db, fake_telegram):
+    server, sender = fake_telegram
+    server.fail_rate = 1.0
+    message_id = telegram_outbox.enqueue("chat-1", "Your relative was admitted")
+    sender.dispatch_due()
+    status, attempts, last_error, _ = _wait_until_settled(message_id)
+    assert (status, attempts) == (telegram_outbox.QUEUED, 1)
+    assert last_error.startswith("HTTP 500")
+    with scratch_db.connection() as conn:
+        retry_at = conn.execute("SELECT next_attempt_at FROM telegram_outbox WHERE id = ?", (message_id,)).fetchone()[0]
+    assert time.time() < retry_at <= time.time() + telegram_outbox.BACKOFF_BASE
+
+
+def test_backoff_grows_and_is_capped():
+    for attempts in range(1, 20):
+        cap = min(telegram_outbox.BACKOFF_MAX, telegram_outbox.BACKOFF_BASE * 2 ** (attempts - 1))
+        assert cap / 2 <= telegram_outbox.backoff_delay(attempts) <= cap
@@ -0,0 +1,58 @@
+import events
+import tracking
+
+T0 = 1_699_999_800.0   # a multiple of every downsampling bucket used below
+
+
+def _driver(db):
+    db.insert_driver("9000000001", "Driver", "1234")
+    return db.get_driver_by_phone("9000000001")[0]
+
+
+def test_pings_are_written_in_one_group_commit(scratch_db):
+    driver_id = _driver(scratch_db)
+    tracker = tracking.Tracker()
+    for i in range(5):
+        tracker.ping(driver_id, 8.5 + i * 0.001, 76.9, recorded_at=T0 + i)
+    assert scratch_db.count_driver_positions() == 0   # pings only touch memory
+
+    assert tracker.flush() == 5 and tracker.stats["flushes"] == 1
+    assert [point[2] for point in tracking.get_track(driver_id, T0)] == [T0 + i for i in range(5)]
+    assert scratch_db.get_driver(driver_id)[5:7] == (8.504, 76.9)
+    with scratch_db.connection() as conn:
+        assert len(events.since(conn, 0, [events.DRIVER_UPDATED], driver_id=driver_id)) == 1   # first fix only
+
+
+def test_stationary_and_out_of_order_pings_are_not_stored(scratch_db):
+    tracker = tracking.Tracker()
+    assert tracker.ping(1, 8.5, 76.9, recorded_at=T0)
+    assert tracker.ping(1, 8.50001, 76.9, recorded_at=T0 + 5)           # ~1 m: latest only
+    assert not tracker.ping(1, 8.6, 76.9, recorded_at=T0 + 2)           # older than the latest fix
+    assert tracker.ping(1, 8.50001, 76.9, recorded_at=T0 + tracking.MIN_INTERVAL)
+
+    assert tracker.latest(1).recorded_at == T0 + tracking.MIN_INTERVAL
+    assert tracker.flush() == 2
+
+
+def test_with_latest_prefers_fresh_fixes(monkeypatch):
+    tracker = tracking.Tracker()
+    tracker.ping(2, 8.7, 77.0, recorded_at=T0)
+    monkeypatch.setattr(tracking, "_tracker", tracker)
+    assert tracking.with_latest([(1, 8.0, 76.0), (2, 8.1, 76.1)]) == [(1, 8.0, 76.0), (2, 8.7, 77.0)]
+
+
+def test_downsample_thins_old_tracks_and_drops_expired_ones(scratch_db):
+    tracker = tracking.Tracker()
+    now = T0 + 10 * 86400
+    for i in range(120):   # two days ago, one fix every 30 s for an hour
+        tracker.ping(1, 8.5 + i * 0.001, 76.9, recorded_at=now - 2 * 86400 + i * 30)
+    tracker.ping(1, 8.7, 76.9, recorded_at=now - 60)
+    tracker.flush()
+    with scratch_db.connection() as conn:
+        conn.execute("INSERT INTO driver_positions (driver_id, lat, lon, recorded_at) VALUES (1, 8.5, 76.9, ?)",
+                     (now - 100 * 86400,))
+
+    tracking.downsample(now=now, every=600)
+    track = tracking.get_track(1, 0, now)
+    assert len(track) == 7   # one per 10 minutes of the old hour, plus the recent fix
+    assert track[-1][2] == now - 60
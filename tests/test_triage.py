@@ -0,0 +1,42 @@
+import pytest
+
+import triage
+
+VITALS = (88, 97, "120/80", "No", 120, 0, "")
+
+
+@pytest.fixture
+def stub_model(scratch_db, monkeypatch):
+    monkeypatch.setattr(triage, "stats", {"hits": 0, "misses": 0, "joined": 0})
+    monkeypatch.setattr(triage, "_running", {})
+    backend = triage.StubBackend(first_token=0, tokens_per_second=10000, length=5)
+    monkeypatch.setattr(triage, "_backend", backend)
+    return backend
+
+
+def test_claim_refuses_a_second_claimant(stub_model):
+    key = triage.cache_key(VITALS)
+    assert triage._claim(key, triage.MODEL)
+    assert not triage._claim(key, triage.MODEL)
+    assert triage._load(key)[0] == triage.GENERATING
+
+
+def test_failed_report_can_be_claimed_again(stub_model):
+    key = triage.cache_key(VITALS)
+    assert triage._claim(key, triage.MODEL)
+    triage._save(key, triage.FAILED, "", "TimeoutError")
+    assert triage._claim(key, triage.MODEL)
+
+
+def test_cached_report_is_reused(stub_model):
+    first = triage.get_report(VITALS)
+    second = triage.get_report(VITALS)
+    assert first == second and len(first.split()) == 5
+    assert triage.stats == {"hits": 1, "misses": 1, "joined": 0}
+    assert triage._load(triage.cache_key(VITALS))[:2] == (triage.DONE, first)
+
+
+def test_cache_key_changes_with_the_model_and_vitals():
+    key = triage.cache_key(VITALS)
+    assert triage.cache_key(VITALS, model="other") != key
+    assert triage.cache_key(VITALS[:-1] + ("Yes",)) != key
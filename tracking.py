@@ -0,0 +1,266 @@
+"""Ambulance GPS tracking.
+
+The ambulance page pings the driver's position every few seconds. ping()
+only touches memory: it updates the latest-position table (what the
+in-process dispatcher reads) and appends to a pending buffer. A background
+writer group-commits the buffer every FLUSH_INTERVAL seconds, or sooner when
+MAX_BATCH pings are waiting, in one transaction:
+  - the track points go to driver_positions with one executemany,
+  - ambulance_drivers.latitude/longitude is updated once per driver that
+    moved, so a dispatcher in another process sees positions at most
+    FLUSH_INTERVAL old,
+  - a driver's first fix is published on the change feed so dispatch can
+    match it (later movement creates no new matches and wakes nobody).
+The reports table is never written.
+
+A ping that is within MIN_MOVE_M and MIN_INTERVAL of the last stored point
+only refreshes the latest position (a parked ambulance adds no rows). Tracks
+older than DOWNSAMPLE_AFTER are thinned to one point per DOWNSAMPLE_EVERY
+seconds and deleted after RETENTION_DAYS; the writer does this once an hour.
+
+    python tracking.py bench [--drivers 500] [--seconds 10] [--rate 5000]
+    python tracking.py downsample
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+import db
+import events
+from geo import haversine_km
+
+FLUSH_INTERVAL = 1.0
+MAX_BATCH = 5000
+MIN_MOVE_M = 10
+MIN_INTERVAL = 30             # seconds; a stationary ambulance still leaves a point this often
+DOWNSAMPLE_AFTER = 24 * 3600
+DOWNSAMPLE_EVERY = 60
+DOWNSAMPLE_INTERVAL = 3600    # how often the writer thins old tracks
+RETENTION_DAYS = 90
+
+Position = namedtuple("Position", "lat lon accuracy recorded_at")
+
+# driver_positions is created by db migration 12
+INSERT_SQL = "INSERT INTO driver_positions (driver_id, lat, lon, accuracy, recorded_at) VALUES (?, ?, ?, ?, ?)"
+DRIVER_LOCATION_SQL = "UPDATE ambulance_drivers SET latitude = ?, longitude = ? WHERE id = ?"
+
+# Keeps the first point of each driver per DOWNSAMPLE_EVERY bucket in [since, until)
+DOWNSAMPLE_SQL = """DELETE FROM driver_positions
+                    WHERE recorded_at >= :since AND recorded_at < :until
+                    AND id NOT IN (SELECT MIN(id) FROM driver_positions
+                                   WHERE recorded_at >= :since AND recorded_at < :until
+                                   GROUP BY driver_id, CAST(recorded_at / :every AS INTEGER))"""
+
+
+# --- Tracker ---
+class Tracker:
+    """Latest position per driver in memory, track history written in batches."""
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.stats = {"pings": 0, "stored": 0, "flushes": 0}
+        self._latest = {}      # driver id -> Position
+        self._stored = {}      # driver id -> last Position appended to the track
+        self._pending = []     # rows for INSERT_SQL
+        self._moved = {}       # driver id -> Position to write to ambulance_drivers
+        self._new = set()      # drivers seen for the first time by this process
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._downsampled_until = 0.0
+        self._next_downsample = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gps-tracking", daemon=True)
+                self._thread.start()
+        return self
+
+    def ping(self, driver_id, lat, lon, accuracy=None, recorded_at=None):
+        """Record one fix; returns False if it is older than the latest one already known."""
+        position = Position(float(lat), float(lon), accuracy, time.time() if recorded_at is None else recorded_at)
+        with self._lock:
+            self.stats["pings"] += 1
+            previous = self._latest.get(driver_id)
+            if previous is not None and previous.recorded_at > position.recorded_at:
+                return False  # delivered out of order
+            self._latest[driver_id] = position
+            if previous is None:
+                self._new.add(driver_id)
+            stored = self._stored.get(driver_id)
+            if (stored is None or position.recorded_at - stored.recorded_at >= MIN_INTERVAL
+                    or haversine_km(stored.lat, stored.lon, position.lat, position.lon) * 1000 >= MIN_MOVE_M):
+                self._stored[driver_id] = position
+                self._moved[driver_id] = position
+                self._pending.append((driver_id, position.lat, position.lon, accuracy, position.recorded_at))
+                if len(self._pending) >= self.max_batch:
+                    self._wake.set()
+        return True
+
+    def latest(self, driver_id):
+        return self._latest.get(driver_id)
+
+    def latest_positions(self, driver_ids=None):
+        """{driver id: Position} from memory (drivers that pinged this process only)."""
+        with self._lock:
+            if driver_ids is None:
+                return dict(self._latest)
+            return {driver_id: self._latest[driver_id] for driver_id in driver_ids if driver_id in self._latest}
+
+    def flush(self):
+        """Group-commit everything pending; returns the number of track points written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                moved, self._moved = self._moved, {}
+                new, self._new = self._new, set()
+            if not pending:
+                return 0
+            try:
+                with db.connection() as conn:
+                    conn.executemany(INSERT_SQL, pending)
+                    conn.executemany(DRIVER_LOCATION_SQL,
+                                     [(position.lat, position.lon, driver_id) for driver_id, position in moved.items()])
+                    event_ids = [events.record(conn, events.DRIVER_UPDATED, driver_id=driver_id) for driver_id in new]
+            except Exception:
+                with self._lock:  # keep the batch for the next attempt, in order
+                    self._pending[:0] = pending
+                    for driver_id, position in moved.items():
+                        self._moved.setdefault(driver_id, position)
+                    self._new |= new
+                raise
+            if event_ids:
+                events.publish(max(event_ids))
+            self.stats["stored"] += len(pending)
+            self.stats["flushes"] += 1
+            return len(pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                if time.time() >= self._next_downsample:
+                    self._downsampled_until = downsample(since=self._downsampled_until)
+                    self._next_downsample = time.time() + DOWNSAMPLE_INTERVAL
+            except Exception as exc:  # keep the writer alive through DB hiccups
+                print("GPS tracking error:", exc)
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_tracker():
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = Tracker()
+    return _tracker
+
+
+def ping(driver_id, lat, lon, accuracy=None, recorded_at=None):
+    """Record a fix and make sure this process runs the writer."""
+    return get_tracker().start().ping(driver_id, lat, lon, accuracy, recorded_at)
+
+
+def with_latest(drivers):
+    """[(driver_id, lat, lon)] with the coordinates replaced by this process's newest fixes."""
+    if _tracker is None:
+        return drivers
+    latest = _tracker.latest_positions([driver[0] for driver in drivers])
+    return [(driver_id, *(latest[driver_id][:2] if driver_id in latest else (lat, lon)))
+            for driver_id, lat, lon in drivers]
+
+
+# --- History ---
+def get_track(driver_id, since, until=None):
+    """[(lat, lon, recorded_at)] of one driver, oldest first."""
+    return db.get_driver_track(driver_id, since, until or time.time() + 1)
+
+
+def downsample(since=0.0, now=None, after=DOWNSAMPLE_AFTER, every=DOWNSAMPLE_EVERY, retention_days=RETENTION_DAYS):
+    """Thin tracks in [since, now - after) and drop those past retention; returns the new `since`."""
+    now = time.time() if now is None else now
+    until = now - after
+    with db.connection() as conn:
+        conn.execute("DELETE FROM driver_positions WHERE recorded_at < ?", (now - retention_days * 86400,))
+        if until > since:
+            # Start on a bucket boundary so a bucket is never split between two runs
+            since = since - since % every
+            until = until - until % every
+            conn.execute(DOWNSAMPLE_SQL, {"since": since, "until": until, "every": every})
+    return max(since, until)
+
+
+# --- Benchmark ---
+def bench(drivers=500, seconds=10.0, rate=5000):
+    """Ping a simulated fleet at `rate` pings/s for `seconds` against a scratch database."""
+    scratch = tempfile.mkdtemp(prefix="bench-tracking-")
+    db.DB_PATH = os.path.join(scratch, "tracking.db")
+    events.SIGNAL_PATH = os.path.join(scratch, "tracking.db.events")
+    with db.connection() as conn:
+        conn.executemany("INSERT INTO ambulance_drivers (id, phone, name, pin, status) VALUES (?, ?, ?, '0000', 'Ready')",
+                         [(i, f"9{i:09d}", f"Driver {i}") for i in range(1, drivers + 1)])
+    rng = random.Random(1)
+    fleet = {i: [8.5241 + rng.uniform(-0.2, 0.2), 76.9366 + rng.uniform(-0.2, 0.2)] for i in range(1, drivers + 1)}
+    tracker = get_tracker().start()
+    flush_times = []
+    original_flush = tracker.flush
+
+    def timed_flush():
+        start = time.perf_counter()
+        written = original_flush()
+        if written:
+            flush_times.append((time.perf_counter() - start) * 1000)
+        return written
+
+    tracker.flush = timed_flush
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < seconds:
+        driver_id = rng.randrange(1, drivers + 1)
+        position = fleet[driver_id]
+        position[0] += rng.uniform(-1e-4, 1e-4)  # about 10 m per ping at most
+        position[1] += rng.uniform(-1e-4, 1e-4)
+        tracker.ping(driver_id, position[0], position[1], accuracy=5)
+        sent += 1
+        behind = start + sent * interval - time.perf_counter()
+        if behind > 0:
+            time.sleep(behind)
+    elapsed = time.perf_counter() - start
+    tracker.flush()
+    rows = db.count_driver_positions()
+    flush_times.sort()
+    print(f"{sent} pings from {drivers} drivers in {elapsed:.1f} s ({sent / elapsed:.0f}/s), "
+          f"{rows} track points stored in {tracker.stats['flushes']} group commits")
+    if flush_times:
+        print(f"Group commit: p50 {flush_times[len(flush_times) // 2]:.1f} ms, max {flush_times[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ambulance GPS tracking")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench_parser = sub.add_parser("bench")
+    bench_parser.add_argument("--drivers", type=int, default=500)
+    bench_parser.add_argument("--seconds", type=float, default=10.0)
+    bench_parser.add_argument("--rate", type=int, default=5000, help="pings per second")
+    sub.add_parser("downsample")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.drivers, args.seconds, args.rate)
+    else:
+        start = time.perf_counter()
+        downsample()
+        print(f"Old tracks downsampled in {time.perf_counter() - start:.1f} s.")
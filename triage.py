@@ -0,0 +1,325 @@
+"""AI triage reports for the hospital page.
+
+A report is keyed by a hash of the vitals, the model and PROMPT_VERSION and
+stored in triage_reports, so identical vitals are generated once. Generation
+starts in the background as soon as the ambulance submits the medical form
+(prefetch()); the hospital page then either shows the cached text at once or
+streams tokens from the generation already under way (stream_report()).
+
+The generating process writes the partial text to the row every
+FLUSH_INTERVAL seconds, so a page in another process can stream it too
+instead of starting a second generation.
+
+Backends: "ollama" (default) and "stub", a canned local model for offline
+benchmarks. Configure with TRIAGE_BACKEND, TRIAGE_MODEL, TRIAGE_TIMEOUT,
+TRIAGE_KEEP_ALIVE and OLLAMA_HOST.
+    python triage.py bench     # latency and cache hit rate against the stub
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import profiling
+
+BACKEND = os.environ.get("TRIAGE_BACKEND", "ollama")
+MODEL = os.environ.get("TRIAGE_MODEL", "gemma3:1b")
+TIMEOUT = float(os.environ.get("TRIAGE_TIMEOUT", "60"))   # seconds without a new token before giving up
+KEEP_ALIVE = os.environ.get("TRIAGE_KEEP_ALIVE", "30m")   # how long ollama keeps the weights loaded after a request
+PROMPT_VERSION = 1      # bump when the prompt changes; old cache rows are then ignored
+FLUSH_INTERVAL = 0.5    # how often partial text is written for followers in other processes
+POLL_INTERVAL = 0.25    # how often such a follower re-reads the row
+MAX_PARALLEL = 2
+
+GENERATING, DONE, FAILED = "generating", "done", "failed"
+
+stats = {"hits": 0, "misses": 0, "joined": 0}
+
+
+class TriageError(Exception):
+    """The model failed or timed out."""
+
+
+# --- Prompt ---
+def vitals_from_row(medical_info):
+    """The vitals that drive the report, from a db.get_medical_info row."""
+    return tuple(medical_info[3:10])
+
+
+def build_prompt(vitals):
+    pulse_rate, oxygen_saturation, bp, fractures_detected, blood_clotting_rate, head_injury, burns = vitals
+    return f"""
+        Based on the patient's details below, determine the most suitable doctor and department:
+
+        ### Current Patient Details:
+        - Pulse Rate: {pulse_rate}
+        - Oxygen Saturation: {oxygen_saturation}
+        - Blood Pressure: {bp}
+        - Fractures Detected: {fractures_detected}
+        - Blood Clotting Rate: {blood_clotting_rate}
+        - Head Injury: {head_injury}
+        - Burns/External Wounds: {burns}
+
+        ### Task:
+        Based on the details what is condition of the patient in two line and suggest the treatment plan.
+    """
+
+
+def cache_key(vitals, model=None):
+    payload = json.dumps([PROMPT_VERSION, model or MODEL, [str(value) for value in vitals]])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# --- Backends ---
+class OllamaBackend:
+    def __init__(self, model=None, timeout=TIMEOUT, host=None, keep_alive=KEEP_ALIVE):
+        try:
+            import ollama  # imported on first use: the client pulls in httpx and pydantic
+        except ImportError:
+            raise TriageError("The ollama package is not installed (or set TRIAGE_BACKEND=stub).") from None
+        self.model = model or MODEL
+        self.keep_alive = keep_alive
+        self.client = ollama.Client(host=host or os.environ.get("OLLAMA_HOST"), timeout=timeout)
+
+    def stream(self, prompt):
+        for chunk in self.client.generate(model=self.model, prompt=prompt, stream=True, keep_alive=self.keep_alive):
+            yield chunk["response"]
+
+
+class StubBackend:
+    """Deterministic canned model: `first_token` seconds, then `tokens_per_second`."""
+
+    def __init__(self, first_token=0.3, tokens_per_second=40, length=60):
+        self.first_token = first_token
+        self.tokens_per_second = tokens_per_second
+        self.length = length
+
+    def stream(self, prompt):
+        rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+        words = ["patient", "stable", "monitor", "orthopaedics", "trauma", "surgery", "oxygen",
+                 "observation", "refer", "emergency", "department", "fluids", "imaging", "review"]
+        time.sleep(self.first_token)
+        for i in range(self.length):
+            if i:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield rng.choice(words) + " "
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = StubBackend() if BACKEND == "stub" else OllamaBackend()
+    return _backend
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+# --- Cache rows ---
+def _load(key):
+    """(status, report, error, started_at) for a cache key, or None."""
+    return db.get_triage_row(key)
+
+
+def _claim(key, model):
+    """Mark the key as being generated by us; False if someone else is already on it."""
+    now = time.time()
+    with db.connection() as conn:
+        cursor = conn.execute(
+            """INSERT INTO triage_reports (key, model, prompt_version, status, report, started_at, updated_at)
+               VALUES (?, ?, ?, ?, '', ?, ?)
+               ON CONFLICT (key) DO UPDATE SET status = excluded.status, report = '', error = NULL,
+                   started_at = excluded.started_at, updated_at = excluded.updated_at
+               WHERE triage_reports.status = ? OR (triage_reports.status = ? AND triage_reports.updated_at < ?)""",
+            (key, model, PROMPT_VERSION, GENERATING, now, now, FAILED, GENERATING, now - 2 * TIMEOUT),
+        )
+        return cursor.rowcount == 1
+
+
+def _save(key, status, report, error=None):
+    now = time.time()
+    with db.connection() as conn:
+        conn.execute(
+            """UPDATE triage_reports SET status = ?, report = ?, error = ?, updated_at = ?,
+                   generation_ms = CASE WHEN ? = 'generating' THEN NULL ELSE (? - started_at) * 1000 END
+               WHERE key = ?""",
+            (status, report, error, now, status, now, key),
+        )
+
+
+# --- Generation ---
+class _Generation:
+    """Tokens of one running generation, shared by every follower in this process."""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def follow(self, timeout=TIMEOUT):
+        sent = 0
+        while True:
+            with self.cond:
+                if sent == len(self.chunks) and not self.done:
+                    if not self.cond.wait_for(lambda: len(self.chunks) > sent or self.done, timeout):
+                        raise TriageError(f"No response from the model for {timeout:.0f} s.")
+                new, done, error = self.chunks[sent:], self.done, self.error
+            sent += len(new)
+            yield from new
+            if done:
+                if error:
+                    raise TriageError(error)
+                return
+
+
+_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL, thread_name_prefix="triage")
+_running = {}
+_running_lock = threading.Lock()
+
+
+def _generate(key, prompt, generation):
+    text, last_flush = "", time.monotonic()
+    start, first_token = time.perf_counter(), True
+    try:
+        for chunk in get_backend().stream(prompt):
+            if first_token:
+                profiling.record("ollama.first_token", time.perf_counter() - start)
+                first_token = False
+            text += chunk
+            with generation.cond:
+                generation.chunks.append(chunk)
+                generation.cond.notify_all()
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                _save(key, GENERATING, text)
+                last_flush = time.monotonic()
+        _save(key, DONE, text)
+        profiling.record("ollama.generate", time.perf_counter() - start)
+    except Exception as exc:
+        generation.error = f"{type(exc).__name__}: {exc}"
+        _save(key, FAILED, text, generation.error)
+    finally:
+        with generation.cond:
+            generation.done = True
+            generation.cond.notify_all()
+        with _running_lock:
+            _running.pop(key, None)
+
+
+def _start(key, vitals):
+    """Local generation for key (joining one already running), or None if another process has it."""
+    with _running_lock:
+        generation = _running.get(key)
+        if generation is not None:
+            return generation, True
+        if not _claim(key, MODEL):
+            return None, False
+        generation = _running[key] = _Generation()
+    _executor.submit(_generate, key, build_prompt(vitals), generation)
+    return generation, False
+
+
+def prefetch(vitals):
+    """Start generating the report for these vitals in the background, unless it is cached."""
+    key = cache_key(vitals)
+    row = _load(key)
+    if row is None or row[0] == FAILED:
+        _start(key, vitals)
+
+
+def _follow_row(key, timeout=TIMEOUT):
+    """Stream a report another process is generating by re-reading its partial text."""
+    sent, last_progress = 0, time.monotonic()
+    while True:
+        status, report, error, _ = _load(key)
+        if len(report or "") > sent:
+            yield report[sent:]
+            sent, last_progress = len(report), time.monotonic()
+        if status == DONE:
+            return
+        if status == FAILED:
+            raise TriageError(error)
+        if time.monotonic() - last_progress > timeout:
+            raise TriageError(f"No response from the model for {timeout:.0f} s.")
+        time.sleep(POLL_INTERVAL)
+
+
+def stream_report(vitals):
+    """Yield the report text for these vitals: cached at once, otherwise token by token."""
+    key = cache_key(vitals)
+    row = _load(key)
+    if row is not None and row[0] == DONE:
+        stats["hits"] += 1
+        yield row[1]
+        return
+    generation, joined = _start(key, vitals)
+    stats["joined" if joined or generation is None else "misses"] += 1
+    if generation is None:
+        yield from _follow_row(key)
+    else:
+        yield from generation.follow()
+
+
+def get_report(vitals):
+    """The whole report (blocking)."""
+    return "".join(stream_report(vitals))
+
+
+# --- Benchmark ---
+def bench(requests=200, distinct=40, clients=8, first_token=0.3, tokens_per_second=40):
+    """Simulate `clients` pages asking for reports over `distinct` vitals with the stub model."""
+    scratch = tempfile.mkdtemp(prefix="triage-bench-")
+    db.DB_PATH = os.path.join(scratch, "bench.db")
+    set_backend(StubBackend(first_token, tokens_per_second))
+    rng = random.Random(7)
+    pool = [(rng.randint(40, 160), rng.randint(80, 100), f"{rng.randint(90, 160)}/{rng.randint(50, 100)}",
+             rng.choice(["Yes", "No"]), rng.randint(60, 300), rng.randint(0, 5), "") for _ in range(distinct)]
+    first_token_ms, total_ms = [], []
+
+    def ask(vitals):
+        start = time.perf_counter()
+        stream = stream_report(vitals)
+        next(stream)
+        first_token_ms.append((time.perf_counter() - start) * 1000)
+        for _ in stream:
+            pass
+        total_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool_executor:
+        list(pool_executor.map(ask, (rng.choice(pool) for _ in range(requests))))
+    elapsed = time.perf_counter() - start
+
+    def pct(values, p):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+    print(f"{requests} requests over {distinct} distinct vitals, {clients} clients, "
+          f"stub model {first_token * 1000:.0f} ms to first token, {tokens_per_second} tok/s")
+    print(f"  cache hits {stats['hits']}, joined in-flight {stats['joined']}, generated {stats['misses']} "
+          f"(hit rate {(stats['hits'] + stats['joined']) / requests:.0%})")
+    print(f"  first token p50 {pct(first_token_ms, 50):.1f} ms, p95 {pct(first_token_ms, 95):.1f} ms; "
+          f"full report p50 {pct(total_ms, 50):.1f} ms, p95 {pct(total_ms, 95):.1f} ms; {elapsed:.1f} s total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AI triage report tools")
+    parser.add_argument("command", choices=["bench"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--first-token", type=float, default=0.3)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+    bench(args.requests, args.distinct, args.clients, args.first_token, args.tokens_per_second)